@@ -0,0 +1,187 @@
+# backend/batch_scheduler.py
+"""
+Micro-batching de inferencia entre peticiones concurrentes.
+
+Los hilos de detección llaman a ``scheduler.infer(frame)`` y se bloquean. Un
+único hilo dueño del modelo junta los frames que lleguen durante como máximo
+``max_wait_ms`` (o hasta ``max_batch`` imágenes), ejecuta un solo
+``model([...])`` y devuelve a cada petición su entrada de ``Results``.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from model_registry import registry
+
+BATCH_MAX_SIZE = int(os.getenv("DETECTION_BATCH_SIZE", "1"))
+BATCH_MAX_WAIT_MS = float(os.getenv("DETECTION_BATCH_WAIT_MS", "10"))
+# Segundos máximos que un hilo de detección espera su resultado
+BATCH_RESULT_TIMEOUT = float(os.getenv("DETECTION_BATCH_TIMEOUT", "60"))
+
+
+class BatchInferenceScheduler:
+    """Agrupa frames de distintas peticiones en un único forward pass"""
+
+    def __init__(self, max_batch=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS,
+                 predict_kwargs=None, model_getter=None):
+        self.max_batch = max(1, max_batch)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self.predict_kwargs = predict_kwargs or {}
+        self._model_getter = model_getter or registry.get
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.frames = 0
+        self.max_batch_seen = 0
+        self._infer_total_ms = 0.0
+
+    @property
+    def enabled(self):
+        return self.max_batch > 1
+
+    def start(self, warmup=None):
+        """
+        Arranca el hilo dueño del modelo; ``warmup`` se ejecuta dentro de él.
+        Si el modelo no carga se relanza el error y el scheduler queda sin hilo.
+        """
+        if self._thread is not None:
+            return
+        ready = threading.Event()
+        failure = []
+
+        def _run():
+            try:
+                self._model_getter()
+                if warmup is not None:
+                    warmup()
+            except Exception as e:
+                failure.append(e)
+                return
+            finally:
+                ready.set()
+            self._loop()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=_run, name="detect-batch", daemon=True)
+        self._thread.start()
+        ready.wait()
+        if failure:
+            self._thread = None
+            raise failure[0]
+
+    def stop(self):
+        self._stop.set()
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        # Lo que quedó en cola no se va a procesar
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                self._fail([item[2]], RuntimeError("El scheduler de inferencia se detuvo"))
+
+    def submit(self, frame, **kwargs):
+        """Encola un frame y devuelve un Future con su ``Results``"""
+        if self._thread is None:
+            self.start()
+        future = Future()
+        self._queue.put((frame, kwargs, future))
+        return future
+
+    def infer(self, frame, timeout=BATCH_RESULT_TIMEOUT, **kwargs):
+        """Versión bloqueante de ``submit`` para los hilos de detección"""
+        future = self.submit(frame, **kwargs)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Si todavía no entró en un lote ya no se procesa
+            future.cancel()
+            raise
+
+    @staticmethod
+    def _fail(futures, error):
+        for future in futures:
+            if not future.done():
+                future.set_exception(error)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._stop.set()
+                break
+            batch.append(item)
+        return batch
+
+    def _run_batch(self, batch):
+        # Solo se agrupan frames con los mismos parámetros de predicción
+        groups = {}
+        for frame, kwargs, future in batch:
+            # Los futures cancelados (timeout en ``infer``) se descartan
+            if not future.set_running_or_notify_cancel():
+                continue
+            key = tuple(sorted(kwargs.items()))
+            groups.setdefault(key, []).append((frame, future))
+        if not groups:
+            return
+
+        try:
+            model = self._model_getter()
+        except Exception as e:
+            self._fail([future for items in groups.values() for _, future in items], e)
+            return
+        for key, items in groups.items():
+            params = {**self.predict_kwargs, **dict(key)}
+            start = time.perf_counter()
+            try:
+                results = model([frame for frame, _ in items], verbose=False, **params)
+            except Exception as e:
+                self._fail([future for _, future in items], e)
+                continue
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            for (_, future), result in zip(items, results):
+                future.set_result(result)
+            with self._lock:
+                self.batches += 1
+                self.frames += len(items)
+                self.max_batch_seen = max(self.max_batch_seen, len(items))
+                self._infer_total_ms += elapsed_ms
+
+    def _loop(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._run_batch(batch)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait_ms,
+                "pending": self._queue.qsize(),
+                "batches": self.batches,
+                "frames": self.frames,
+                "avg_batch_size": round(self.frames / self.batches, 2) if self.batches else 0.0,
+                "max_batch_seen": self.max_batch_seen,
+                "avg_batch_ms": round(self._infer_total_ms / self.batches, 2) if self.batches else 0.0,
+            }
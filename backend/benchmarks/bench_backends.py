@@ -0,0 +1,180 @@
+# backend/benchmarks/bench_backends.py
+"""
+Comparación de backends de inferencia (torch, onnx, onnx-int8, openvino) sobre CPU.
+
+Cada backend corre en un subproceso propio para medir su RSS sin mezclarlo
+con los demás. Se reportan tiempo de carga, latencia por imagen (p50/p95),
+throughput en lote, RSS y paridad de cajas contra torch: mismas ``all_objects``
+(post-proceso de detection.py) emparejadas por clase con IoU >= 0.9.
+
+Uso (desde backend/):
+    python benchmarks/bench_backends.py --backends torch onnx openvino --repeat 30
+"""
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+import numpy as np
+
+
+def load_images(patterns, width, height):
+    import cv2
+
+    images = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            image = cv2.imread(path)
+            if image is not None:
+                images.append(image)
+    if not images:
+        # Sin imágenes en disco: frames sintéticos con algo de estructura
+        rng = np.random.default_rng(0)
+        for _ in range(4):
+            frame = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+            images.append(cv2.GaussianBlur(frame, (9, 9), 0))
+    return images
+
+
+def worker(args):
+    """Mide un backend y escribe el resultado como JSON en stdout"""
+    import psutil
+
+    os.environ["YOLO_BACKEND"] = args.worker
+    with contextlib.redirect_stdout(io.StringIO()):
+        from model_registry import ModelRegistry
+        from detection import DETECTION_CONFIG, extract_objects
+
+        config = dict(DETECTION_CONFIG, verbose=False)
+        if args.conf is not None:
+            config["conf"] = args.conf
+
+        images = load_images(args.images, args.width, args.height)
+        registry = ModelRegistry(backend=args.worker)
+
+        start = time.perf_counter()
+        model = registry.load()
+        load_ms = (time.perf_counter() - start) * 1000
+        registry.warmup(**DETECTION_CONFIG)
+
+        latencies = []
+        for i in range(args.repeat):
+            image = images[i % len(images)]
+            start = time.perf_counter()
+            model(image, **config)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        batch = [images[i % len(images)] for i in range(args.batch)]
+        start = time.perf_counter()
+        rounds = max(1, args.repeat // args.batch)
+        for _ in range(rounds):
+            model(batch, **config)
+        throughput = rounds * len(batch) / (time.perf_counter() - start)
+
+        objects = []
+        for image in images:
+            result = model(image, **config)[0]
+            objects.append([
+                {"bbox": [float(v) for v in obj["bbox"]], "class": obj["class"], "confidence": float(obj["confidence"])}
+                for obj in extract_objects(result, apply_filter=True)
+            ])
+
+    print(json.dumps({
+        "backend": args.worker,
+        "artifact": registry.artifact_path,
+        "load_ms": load_ms,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "throughput_ips": throughput,
+        "rss_mb": psutil.Process().memory_info().rss / 1024 / 1024,
+        "objects": objects,
+    }))
+
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def box_parity(reference, candidate, threshold=0.9):
+    """Fracción de cajas de referencia con pareja (misma clase, IoU >= umbral) y desvío máximo"""
+    total = matched = 0
+    max_delta = 0.0
+    for ref_objs, cand_objs in zip(reference, candidate):
+        used = set()
+        total += max(len(ref_objs), len(cand_objs))
+        for ref in ref_objs:
+            best, best_iou = None, threshold
+            for j, cand in enumerate(cand_objs):
+                if j in used or cand["class"] != ref["class"]:
+                    continue
+                score = iou(ref["bbox"], cand["bbox"])
+                if score >= best_iou:
+                    best, best_iou = j, score
+            if best is not None:
+                used.add(best)
+                matched += 1
+                delta = np.abs(np.subtract(ref["bbox"], cand_objs[best]["bbox"])).max()
+                max_delta = max(max_delta, float(delta))
+    return (matched / total if total else 1.0), total, max_delta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8", "openvino"])
+    parser.add_argument("--images", nargs="+",
+                        default=[str(BACKEND_DIR / "images" / "estacionamientos" / "*.jpg"),
+                                 str(BACKEND_DIR / "images" / "*.jpg")])
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--conf", type=float, default=None,
+                        help="Confianza mínima (por defecto la de DETECTION_CONFIG)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    results = {}
+    for backend in args.backends:
+        cmd = [sys.executable, __file__, "--worker", backend, "--repeat", str(args.repeat),
+               "--batch", str(args.batch), "--width", str(args.width), "--height", str(args.height),
+               "--images", *args.images]
+        if args.conf is not None:
+            cmd += ["--conf", str(args.conf)]
+        proc = subprocess.run(cmd, capture_output=True, text=True, cwd=BACKEND_DIR)
+        lines = [line for line in proc.stdout.splitlines() if line.startswith("{")]
+        if proc.returncode != 0 or not lines:
+            print(f"✗ {backend}: {(proc.stderr or proc.stdout).strip().splitlines()[-1:]}")
+            continue
+        results[backend] = json.loads(lines[-1])
+
+    reference = results.get("torch")
+    print(f"{'backend':>9} {'carga_ms':>9} {'p50_ms':>8} {'p95_ms':>8} {'img/s':>7} {'rss_mb':>7} {'paridad':>8} {'cajas':>6} {'max_dpx':>8}")
+    for backend, r in results.items():
+        if reference is not None:
+            parity, boxes, delta = box_parity(reference["objects"], r["objects"])
+            parity_str = f"{parity:>8.3f} {boxes:>6} {delta:>8.2f}"
+        else:
+            parity_str = f"{'-':>8} {'-':>6} {'-':>8}"
+        print(f"{backend:>9} {r['load_ms']:>9.0f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['throughput_ips']:>7.1f} {r['rss_mb']:>7.0f} {parity_str}")
+
+
+if __name__ == "__main__":
+    main()
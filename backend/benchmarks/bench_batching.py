@@ -0,0 +1,91 @@
+# backend/benchmarks/bench_batching.py
+"""
+Benchmark de micro-batching en CPU: throughput vs latencia.
+
+Lanza N clientes concurrentes que envían el mismo frame al
+BatchInferenceScheduler con distintas combinaciones de tamaño de lote y
+espera máxima, e imprime imágenes/s y latencias p50/p95 por combinación.
+
+Uso (desde backend/):
+    python benchmarks/bench_batching.py --image images/estacionamientos/1.jpg \\
+        --clients 8 --requests 64 --batch 1 2 4 8 --wait 0 5 10 20
+"""
+import argparse
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import cv2
+import numpy as np
+
+from batch_scheduler import BatchInferenceScheduler
+from model_registry import registry
+
+DETECTION_CONFIG = {"conf": 0.2, "iou": 0.4}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def run_case(frame, batch, wait_ms, clients, requests):
+    scheduler = BatchInferenceScheduler(max_batch=batch, max_wait_ms=wait_ms,
+                                        predict_kwargs=DETECTION_CONFIG)
+    scheduler.start(warmup=lambda: registry.warmup(**DETECTION_CONFIG))
+
+    def one(_):
+        start = time.perf_counter()
+        scheduler.infer(frame)
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+    scheduler.stop()
+
+    stats = scheduler.stats()
+    return {
+        "batch": batch,
+        "wait_ms": wait_ms,
+        "throughput": requests / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": percentile(latencies, 95),
+        "avg_batch": stats["avg_batch_size"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", default=None, help="Imagen de prueba (por defecto un frame sintético 1280x720)")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--wait", type=float, nargs="+", default=[0, 5, 10, 20])
+    args = parser.parse_args()
+
+    if args.image:
+        frame = cv2.imread(args.image)
+        if frame is None:
+            raise SystemExit(f"No se pudo leer la imagen: {args.image}")
+    else:
+        frame = np.random.default_rng(0).integers(0, 255, (720, 1280, 3), dtype=np.uint8)
+
+    print(f"Frame: {frame.shape}, clientes: {args.clients}, peticiones: {args.requests}")
+    print(f"{'batch':>5} {'wait_ms':>8} {'img/s':>8} {'p50_ms':>8} {'p95_ms':>8} {'lote_medio':>10}")
+    for batch in args.batch:
+        waits = [0] if batch == 1 else args.wait
+        for wait_ms in waits:
+            r = run_case(frame, batch, wait_ms, args.clients, args.requests)
+            print(f"{r['batch']:>5} {r['wait_ms']:>8.1f} {r['throughput']:>8.2f} "
+                  f"{r['p50']:>8.1f} {r['p95']:>8.1f} {r['avg_batch']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# backend/benchmarks/bench_color.py
+"""
+Benchmark del análisis de color: versión anterior (máscara y Canny de frame
+completo por zona) contra la versión por ROI, variando la cantidad de zonas.
+
+También verifica que ambas devuelvan exactamente los mismos puntajes.
+
+Uso (desde backend/):
+    python benchmarks/bench_color.py --width 1920 --height 1080 --zones 8 32 128 512
+"""
+import argparse
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import cv2
+import numpy as np
+
+from detection import detect_by_color_analysis
+from zone_geometry import get_zone_index
+
+
+def legacy_color_analysis(image_cv2, parking_zones):
+    """Implementación anterior, solo para comparar"""
+    hsv = cv2.cvtColor(image_cv2, cv2.COLOR_BGR2HSV)
+    lab = cv2.cvtColor(image_cv2, cv2.COLOR_BGR2LAB)
+    gray = cv2.cvtColor(image_cv2, cv2.COLOR_BGR2GRAY)
+    potential_objects = []
+    for i, zone in enumerate(parking_zones):
+        mask = np.zeros(image_cv2.shape[:2], dtype=np.uint8)
+        points = np.array(zone['points'], np.int32)
+        cv2.fillPoly(mask, [points], 255)
+        zone_gray = cv2.bitwise_and(gray, gray, mask=mask)
+        zone_hsv = cv2.bitwise_and(hsv, hsv, mask=mask)
+        masked_pixels = gray[mask > 0]
+        if len(masked_pixels) > 0:
+            variability_score = np.std(masked_pixels) / 255.0
+            edges = cv2.Canny(zone_gray, 50, 150)
+            zone_area = cv2.countNonZero(mask)
+            edge_density = cv2.countNonZero(edges) / zone_area if zone_area > 0 else 0
+            zone_hsv_masked = zone_hsv[mask > 0]
+            saturation_score = np.mean(zone_hsv_masked[:, 1]) / 255.0 if len(zone_hsv_masked) > 0 else 0
+            combined_score = variability_score * 0.4 + edge_density * 0.4 + saturation_score * 0.2
+            if combined_score > 0.15:
+                potential_objects.append({
+                    'zone_id': i,
+                    'combined_score': combined_score,
+                    'confidence_score': min(combined_score * 2.0, 0.9),
+                    'variability_score': variability_score,
+                    'edge_density': edge_density,
+                    'saturation_score': saturation_score
+                })
+    return potential_objects
+
+
+def grid_zones(count, width, height):
+    """Cajones en rejilla ocupando la mitad inferior del frame"""
+    cols = int(np.ceil(np.sqrt(count * 2)))
+    rows = int(np.ceil(count / cols))
+    cell_w = width / cols
+    cell_h = (height / 2) / rows
+    zones = []
+    for k in range(count):
+        r, c = divmod(k, cols)
+        x1 = int(c * cell_w + 2)
+        y1 = int(height / 2 + r * cell_h + 2)
+        x2 = int((c + 1) * cell_w - 2)
+        y2 = int(height / 2 + (r + 1) * cell_h - 2)
+        zones.append({"points": [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]})
+    return zones
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--zones", type=int, nargs="+", default=[8, 32, 128, 512])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frame = cv2.GaussianBlur(rng.integers(0, 255, (args.height, args.width, 3), dtype=np.uint8), (7, 7), 0)
+
+    print(f"Frame: {frame.shape}")
+    print(f"{'zonas':>6} {'anterior_ms':>12} {'roi_ms':>8} {'speedup':>8} {'iguales':>8}")
+    for count in args.zones:
+        zones = grid_zones(count, args.width, args.height)
+        zone_index = get_zone_index(zones, frame.shape)
+        legacy_ms, legacy = timed(lambda: legacy_color_analysis(frame, zones), args.repeat)
+        roi_ms, current = timed(lambda: detect_by_color_analysis(frame, zones, zone_index), args.repeat)
+        print(f"{count:>6} {legacy_ms:>12.1f} {roi_ms:>8.1f} {legacy_ms / roi_ms:>7.1f}x {str(legacy == current):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# backend/benchmarks/bench_decode.py
+"""
+Decodificación completa + resize contra decodificación reducida (image_decode.py).
+
+Genera un JPEG grande a partir de una imagen del repo (o uno sintético) y
+mide, para cada ancho objetivo, el tiempo de ``cv2.imdecode`` + ``cv2.resize``
+frente a ``decode_image`` con ``IMREAD_REDUCED_COLOR_*``.
+
+Uso (desde backend/):
+    python benchmarks/bench_decode.py --width 4000 --targets 640 960 1280
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+import cv2
+import numpy as np
+
+from image_decode import decode_image, resize_to_width
+
+
+def make_jpeg(path, width):
+    image = cv2.imread(str(path)) if path else None
+    if image is None:
+        rng = np.random.default_rng(0)
+        image = cv2.GaussianBlur(rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8), (9, 9), 0)
+    height = round(image.shape[0] * width / image.shape[1])
+    ok, buffer = cv2.imencode(".jpg", cv2.resize(image, (width, height)), [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return buffer.tobytes()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.percentile(samples, 50))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", default=str(BACKEND_DIR / "images" / "estacionamientos" / "1.jpg"))
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--targets", type=int, nargs="+", default=[640, 960, 1280])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    data = make_jpeg(args.image, args.width)
+    buffer = np.frombuffer(data, np.uint8)
+    print(f"JPEG de {args.width} px ({len(data) / 1024:.0f} KB)")
+    print(f"{'objetivo':>9} {'completa_ms':>12} {'reducida_ms':>12} {'mejora':>7}")
+    for target in args.targets:
+        full = timed(lambda: resize_to_width(cv2.imdecode(buffer, cv2.IMREAD_COLOR), target), args.repeat)
+        reduced = timed(lambda: decode_image(data, target), args.repeat)
+        print(f"{target:>9} {full:>12.1f} {reduced:>12.1f} {full / reduced:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+# backend/benchmarks/bench_process_pool.py
+"""
+Escalado del pool de procesos con ring de frames (inference_pool.py).
+
+Genera frames sintéticos (asfalto con autos dibujados sobre algunas zonas de
+bounding_boxes.json, escaladas al tamaño del frame), los codifica en JPEG y
+mide frames/s para:
+
+- ``threads``: ``DetectionPipeline.run`` en un pool de N hilos, un modelo
+  por hilo (el camino actual con DETECTION_SLOTS = N).
+- ``pickle``: N procesos que reciben el frame decodificado serializado.
+- ``ring``: ProcessInferencePool, el frame viaja por memoria compartida.
+
+Antes de medir comprueba que el pool devuelve la misma ocupación por zona
+que el pipeline en proceso para cada frame sintético.
+
+Uso (desde backend/):
+    python benchmarks/bench_process_pool.py --workers 1 2 4 --frames 64 --width 1920
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+os.chdir(BACKEND_DIR)
+
+import cv2
+import numpy as np
+
+DETECTION_CONFIG = {"conf": 0.2, "iou": 0.4}
+STAGES = ("decode", "infer", "filter", "color", "fuse")
+
+
+def synthetic_frames(parking_zones, count, width, height, seed=0):
+    """JPEGs con ruido de asfalto y rectángulos de colores sobre zonas al azar"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(count):
+        image = np.full((height, width, 3), 90, dtype=np.uint8)
+        image += rng.integers(0, 25, image.shape, dtype=np.uint8)
+        for zone in parking_zones:
+            if rng.random() < 0.5:
+                continue
+            points = np.asarray(zone["points"], dtype=np.float64)
+            x1, y1 = points.min(axis=0).astype(int)
+            x2, y2 = points.max(axis=0).astype(int)
+            color = tuple(int(c) for c in rng.integers(0, 255, 3))
+            cv2.rectangle(image, (x1 + (x2 - x1) // 6, y1 + (y2 - y1) // 6),
+                          (x2 - (x2 - x1) // 6, y2 - (y2 - y1) // 6), color, -1)
+        ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        frames.append(buffer.tobytes())
+    return frames
+
+
+def occupancy(ctx):
+    return [bool(zone["occupied"]) for zone in ctx["zone_details"]]
+
+
+# --- Línea base con pickle: el frame decodificado viaja serializado ---
+
+_pickle_worker = {}
+
+
+def _init_pickle_worker(threads):
+    cv2.setNumThreads(threads)
+    import torch
+    torch.set_num_threads(threads)
+    from detection import DetectionPipeline
+    from model_registry import registry, get_model
+    registry.load()
+    registry.warmup(**DETECTION_CONFIG)
+    _pickle_worker["pipeline"] = DetectionPipeline(
+        STAGES, infer=lambda image: get_model()(image, **DETECTION_CONFIG)[0])
+
+
+def _pickle_detect(image, parking_zones):
+    return occupancy(_pickle_worker["pipeline"].run(image, parking_zones))
+
+
+def _ping():
+    return os.getpid()
+
+
+def run_threads(frames, zones, workers, target_width):
+    from detection import DetectionPipeline
+    from model_registry import registry, get_model
+    registry.thread_local = True
+
+    def init():
+        registry.load()
+        registry.warmup(**DETECTION_CONFIG)
+
+    pipe = DetectionPipeline(STAGES, infer=lambda image: get_model()(image, **DETECTION_CONFIG)[0])
+    with ThreadPoolExecutor(workers, initializer=init) as pool:
+        detect = lambda f: occupancy(pipe.run(f, zones, target_width=target_width))
+        list(pool.map(detect, frames[:workers]))
+        start = time.perf_counter()
+        list(pool.map(detect, frames))
+        return time.perf_counter() - start
+
+
+def run_pickle(frames, zones, workers, target_width, threads):
+    from image_decode import decode_image
+    from zone_geometry import scale_zones
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_pickle_worker, initargs=(threads,)) as pool:
+        for f in [pool.submit(_ping) for _ in range(workers)]:
+            f.result()
+        start = time.perf_counter()
+        futures = []
+        for f in frames:
+            image, original_size = decode_image(f, target_width)
+            futures.append(pool.submit(_pickle_detect, image, scale_zones(
+                zones, image.shape[1] / original_size[0], image.shape[0] / original_size[1])))
+        for f in futures:
+            f.result()
+        return time.perf_counter() - start
+
+
+def run_ring(frames, zones, workers, target_width, threads):
+    from inference_executor import DetectionBusyError
+    from inference_pool import ProcessInferencePool
+    pool = ProcessInferencePool(processes=workers, threads=threads)
+    pool.start()
+    try:
+        start = time.perf_counter()
+        pending, futures = list(frames), []
+        while pending:
+            try:
+                futures.append(pool.submit(pending[0], zones, target_width))
+                pending.pop(0)
+            except DetectionBusyError:
+                # Ring lleno: se espera al frame más viejo
+                next(f for f in futures if not f.done()).result()
+        for f in futures:
+            f.result()
+        return time.perf_counter() - start
+    finally:
+        pool.stop()
+
+
+def check_ring(frames, zones, target_width):
+    """La ocupación del pool coincide con la del pipeline en proceso"""
+    from detection import DetectionPipeline
+    from inference_pool import ProcessInferencePool
+    from model_registry import get_model
+    pipe = DetectionPipeline(STAGES, infer=lambda image: get_model()(image, **DETECTION_CONFIG)[0])
+    expected = [occupancy(pipe.run(f, zones, target_width=target_width)) for f in frames]
+    pool = ProcessInferencePool(processes=1, threads=1)
+    pool.start()
+    try:
+        got = [occupancy(pool.submit(f, zones, target_width).result()) for f in frames]
+    finally:
+        pool.stop()
+    mismatches = sum(1 for a, b in zip(expected, got) if a != b)
+    occupied = sum(sum(o) for o in expected)
+    if mismatches:
+        print(f"✗ {mismatches}/{len(frames)} frames con ocupación distinta entre pool y pipeline")
+    else:
+        print(f"✓ Misma ocupación en {len(frames)} frames sintéticos ({occupied} zonas ocupadas)")
+    return mismatches == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--frames", type=int, default=64)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--target-width", type=int, default=None, help="Ancho de entrada (None = original)")
+    parser.add_argument("--threads", type=int, default=1, help="Hilos de torch/OpenCV por proceso")
+    parser.add_argument("--modes", nargs="+", default=["threads", "pickle", "ring"],
+                        choices=["threads", "pickle", "ring"])
+    args = parser.parse_args()
+
+    from detection import load_parking_zones
+    from zone_geometry import scale_zones
+    # Las zonas están calibradas sobre la imagen de referencia del repo
+    reference = cv2.imread(str(BACKEND_DIR / "images" / "estacionamientos" / "1.jpg"))
+    ref_height, ref_width = reference.shape[:2]
+    zones = scale_zones(load_parking_zones(), args.width / ref_width, args.height / ref_height)
+    frames = synthetic_frames(zones, args.frames, args.width, args.height)
+    print(f"{len(frames)} frames sintéticos de {args.width}x{args.height}, {os.cpu_count()} núcleos")
+    if "ring" in args.modes and not check_ring(frames[:8], zones, args.target_width):
+        return 1
+
+    print(f"{'modo':>8} {'workers':>8} {'frames/s':>9} {'escala':>7}")
+    for mode in args.modes:
+        base = None
+        for workers in args.workers:
+            if mode == "threads":
+                elapsed = run_threads(frames, zones, workers, args.target_width)
+            elif mode == "pickle":
+                elapsed = run_pickle(frames, zones, workers, args.target_width, args.threads)
+            else:
+                elapsed = run_ring(frames, zones, workers, args.target_width, args.threads)
+            fps = len(frames) / elapsed
+            base = base or fps
+            print(f"{mode:>8} {workers:>8} {fps:>9.1f} {fps / base:>6.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+# backend/camera_registry.py
+"""
+Registro en memoria de las cámaras de cada estacionamiento.
+
+Un estacionamiento grande tiene varias cámaras (tabla ``camaras``) y cada una
+su propio polígono por cajón (tabla ``camara_zonas``), en coordenadas de su
+imagen. Igual que ZoneRegistry, todo se lee de la base una vez, se valida y
+queda por estacionamiento; ``camara_router`` invalida al escribir.
+
+Un estacionamiento sin cámaras registradas devuelve None y la detección
+sigue con una sola imagen y las zonas de ``zone_registry``.
+"""
+import hashlib
+import json
+import os
+
+from zone_geometry import ParkingZones
+from zone_registry import ZoneRegistry, parse_coordenadas
+
+
+def default_camera_image(estacionamiento_id, camara_id):
+    return os.path.join("images", "estacionamientos", str(estacionamiento_id), f"{camara_id}.jpg")
+
+
+class LotCamera:
+    """Una cámara activa con sus zonas ya parseadas"""
+
+    __slots__ = ("camara_id", "nombre", "image_path", "zones")
+
+    def __init__(self, camara_id, nombre, image_path, zones):
+        self.camara_id = camara_id
+        self.nombre = nombre
+        self.image_path = image_path
+        self.zones = zones
+
+    def to_dict(self):
+        return {
+            "camara_id": self.camara_id,
+            "nombre": self.nombre,
+            "image_path": self.image_path,
+            "zones": len(self.zones),
+        }
+
+
+def build_camera(camara):
+    """LotCamera a partir de una fila de ``camaras`` (None si no tiene zonas válidas)"""
+    zones = []
+    invalid = 0
+    for zona in sorted(camara.zonas, key=lambda z: z.cajon_id):
+        try:
+            points = parse_coordenadas(zona.coordenadas)
+        except (ValueError, TypeError) as e:
+            invalid += 1
+            print(f"⚠️ Cámara {camara.id}, cajón {zona.cajon_id}: coordenadas inválidas: {e}")
+            continue
+        numero = zona.cajon.numero_cajon if zona.cajon is not None else None
+        zones.append({"points": points, "cajon_id": zona.cajon_id, "numero_cajon": numero})
+    if not zones:
+        return None, invalid
+    payload = json.dumps([camara.id, [[z["cajon_id"], z["points"]] for z in zones]])
+    version = hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+    image_path = camara.imagen or default_camera_image(camara.estacionamiento_id, camara.id)
+    return LotCamera(camara.id, camara.nombre, image_path, ParkingZones(zones, version=version)), invalid
+
+
+def build_lot_cameras(camaras):
+    """Cámaras de un estacionamiento (ordenadas por id) o None si ninguna sirve"""
+    cameras = []
+    invalid = 0
+    for camara in sorted(camaras, key=lambda c: c.id):
+        camera, bad = build_camera(camara)
+        invalid += bad
+        if camera is not None:
+            cameras.append(camera)
+    return (cameras or None), invalid
+
+
+class CameraRegistry(ZoneRegistry):
+    """Cámaras activas por estacionamiento, cargadas desde camaras/camara_zonas"""
+
+    label = "cámaras"
+    source = "camaras"
+    table = "camaras"
+
+    def _query(self, db, estacionamiento_id=None):
+        from sqlalchemy.orm import selectinload
+        from models.camara import Camara, CamaraZona
+        query = (
+            db.query(Camara)
+            .filter(Camara.activo.is_(True))
+            .options(selectinload(Camara.zonas).selectinload(CamaraZona.cajon))
+        )
+        if estacionamiento_id is not None:
+            query = query.filter(Camara.estacionamiento_id == estacionamiento_id)
+        return query.all()
+
+    def _build(self, rows):
+        return build_lot_cameras(rows)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "lots": len(self._lots),
+                "cameras": sum(len(c) for c in self._lots.values()),
+                "complete": self._complete,
+                "stale": len(self._stale),
+                "loads": self.loads,
+                "invalid_zones": self.invalid_cajones,
+                "last_error": self.last_error,
+            }
+
+
+camera_registry = CameraRegistry()
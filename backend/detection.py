@@ -1,68 +1,1102 @@
-# backend/app/detection.py
-from pathlib import Path
+# backend/detection.py
+"""
+Pipeline de detección compartido por todos los endpoints de /detect.
+
+Las etapas son: decode → infer → filter → color → fuse → annotate → encode.
+Cada una puede desactivarse y reporta su propio tiempo de ejecución, así que
+una optimización en una etapa beneficia a todos los endpoints y quien solo
+necesita conteos puede saltarse las etapas caras (anotación y codificación).
+Para cámaras en vivo ``run_gated`` antepone a la inferencia una compuerta de
+movimiento (ver motion_gate.py).
+
+Con un ancho de entrada (``DETECTION_INPUT_WIDTH`` o ``target_width``) la
+imagen se decodifica ya reducida (ver image_decode.py) y las zonas se escalan
+a ese espacio; inferencia, color y fusión trabajan sobre la imagen chica.
+Con ``DETECTION_TILING`` la inferencia se limita a la región de las zonas
+(ver tiled_inference.py). Con ``INFERENCE_PROCESSES`` los frames en vivo se
+procesan en un pool de procesos a través de memoria compartida (ver
+inference_pool.py).
+"""
+import base64
+import copy
+import hashlib
+import json
+import os
 import tempfile
+import threading
+import time
+from pathlib import Path
 from typing import Dict, Any
 
-# Si ya tienes una función detect_by_path(path) en tu proyecto,
-# cámbiala por la import siguiente (descomenta).
-try:
-    # from app.your_existing_module import detect_by_path as _existing_detect
-    # def detect_from_path(path: str, **kwargs) -> Dict[str, Any]:
-    #     return _existing_detect(path, **kwargs)
-    raise ImportError("Use fallback")
-except Exception:
-    # Fallback minimal usando ultralytics (si tienes instalado).
-    # Ajusta conforme a tu pipeline real (zonas, color, etc.).
+import cv2
+import numpy as np
+
+from model_registry import registry, get_model, EXPORT_IMGSZ
+from inference_executor import InferenceExecutor, DETECTION_SLOTS
+from batch_scheduler import BatchInferenceScheduler
+from zone_geometry import ParkingZones, get_zone_index, zones_version, scale_zones
+from image_decode import decode_image
+from zone_artifact import load_zone_artifact, ZoneArtifactError
+from tiled_inference import zone_inference, crop_region, DETECTION_TILING, TILING_MODES
+from image_store import image_store, image_url, MEDIA_TYPES
+from result_cache import result_cache
+from motion_gate import motion_gate
+from occupancy_scanner import OccupancyScanner
+from occupancy_history import OccupancyHistory
+from occupancy_writer import OccupancyWriter
+from occupancy_merge import merge_camera_responses
+from inference_pool import ProcessInferencePool
+from zone_assignment import (
+    point_in_polygon, calculate_overlap_percentage,
+    assign_objects_to_zones, best_object_for_zone,
+)
+
+# Configuración de detección simplificada
+DETECTION_CONFIG = {"conf": 0.2, "iou": 0.4}  # Más sensible para detectar cualquier objeto
+
+STAGES = ("decode", "infer", "filter", "color", "fuse", "annotate", "encode")
+
+# Ancho al que se reduce cada imagen antes de inferir (0 = tamaño original).
+# "imgsz" usa el tamaño de entrada del modelo: más ancho no aporta detalle a YOLO
+_input_width = os.getenv("DETECTION_INPUT_WIDTH", "0")
+DETECTION_INPUT_WIDTH = EXPORT_IMGSZ if _input_width == "imgsz" else int(_input_width)
+
+# Formato de la imagen anotada (.jpg o .webp) y si por defecto se incrusta
+# como data URI en el JSON (modo de compatibilidad)
+ANNOTATED_IMAGE_FORMAT = os.getenv("ANNOTATED_IMAGE_FORMAT", ".jpg")
+INLINE_IMAGES_DEFAULT = os.getenv("DETECTION_INLINE_IMAGES", "0") == "1"
+
+# Micro-batching entre peticiones (DETECTION_BATCH_SIZE > 1 lo activa).
+# Para que se formen lotes DETECTION_SLOTS debe ser >= al tamaño de lote.
+batch_scheduler = BatchInferenceScheduler(predict_kwargs=DETECTION_CONFIG)
+
+# Con más de un slot cada hilo necesita su propio modelo, salvo que solo
+# el hilo del scheduler lo use
+registry.thread_local = DETECTION_SLOTS > 1 and not batch_scheduler.enabled
+
+def _init_detection_worker():
+    """Carga y calienta el modelo dentro de cada hilo de inferencia"""
+    if batch_scheduler.enabled:
+        return
+    registry.load()
+    registry.warmup(**DETECTION_CONFIG)
+
+# YOLO/OpenCV corren fuera del event loop, con admisión acotada
+detection_executor = InferenceExecutor(initializer=_init_detection_worker)
+
+def run_inference(image):
+    """Ejecuta YOLO sobre un frame y devuelve su ``Results``"""
+    if batch_scheduler.enabled:
+        return batch_scheduler.infer(image)
+    return get_model()(image, **DETECTION_CONFIG)[0]
+
+# Máximo de imágenes por forward pass en las inferencias en lote
+DETECTION_BATCH_CHUNK = int(os.getenv("DETECTION_BATCH_CHUNK", "16"))
+
+def run_inference_batch(images):
+    """Inferencia de varias imágenes; devuelve un ``Results`` por imagen"""
+    if not images:
+        return []
+    if batch_scheduler.enabled:
+        futures = [batch_scheduler.submit(image) for image in images]
+        return [future.result() for future in futures]
+    model = get_model()
+    results = []
+    for i in range(0, len(images), DETECTION_BATCH_CHUNK):
+        results.extend(model(images[i:i + DETECTION_BATCH_CHUNK], **DETECTION_CONFIG))
+    return results
+
+# Escaneo periódico de los estacionamientos (lo arranca main.py)
+occupancy_history = OccupancyHistory()
+occupancy_writer = OccupancyWriter()
+occupancy_scanner = OccupancyScanner(detection_executor, history=occupancy_history, writer=occupancy_writer)
+
+# Procesos de inferencia con ring de frames compartido (INFERENCE_PROCESSES > 0)
+inference_pool = ProcessInferencePool()
+
+def start_detection_services():
+    """Carga, fusiona y calienta el modelo una sola vez por worker"""
+    if batch_scheduler.enabled:
+        batch_scheduler.start(warmup=lambda: registry.warmup(**DETECTION_CONFIG))
+    detection_executor.prestart()
+    occupancy_history.start()
+    occupancy_writer.start()
+    inference_pool.start()
+
+def stop_detection_services():
+    occupancy_scanner.stop()
+    occupancy_history.stop()
+    occupancy_writer.stop()
+    inference_pool.stop()
+    batch_scheduler.stop()
+    detection_executor.shutdown()
+
+class ImageDecodeError(ValueError):
+    """La imagen recibida no se pudo decodificar"""
+
+# Zonas ya parseadas por archivo: {ruta: (mtime_ns, tamaño, ParkingZones)}
+_zones_file_cache = {}
+_zones_file_lock = threading.Lock()
+
+# Archivo de zonas globales. Sin variable de entorno se prefiere el artefacto
+# calibrado (select_parking.py) y si no existe el JSON
+PARKING_ZONES_FILE = os.getenv("PARKING_ZONES_FILE")
+ZONES_ARTIFACT_DEFAULT = "bounding_boxes.npz"
+
+def default_zones_file():
+    if PARKING_ZONES_FILE:
+        return PARKING_ZONES_FILE
+    return ZONES_ARTIFACT_DEFAULT if os.path.exists(ZONES_ARTIFACT_DEFAULT) else "bounding_boxes.json"
+
+# Función para leer el archivo JSON de bounding boxes
+def load_parking_zones(json_file=None):
+    """
+    Lee las zonas del JSON o del artefacto ``.npz``; solo se vuelve a leer si
+    el archivo cambió. El artefacto trae las máscaras ya compiladas.
+    """
+    json_file = json_file or default_zones_file()
     try:
-        from ultralytics import YOLO
-        MODEL_PATH = str(Path(__file__).resolve().parents[1] / "yolo11n.pt")
-        model = YOLO(MODEL_PATH)
-    except Exception:
-        model = None
+        st = os.stat(json_file)
+        with _zones_file_lock:
+            cached = _zones_file_cache.get(json_file)
+            if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                return cached[2]
+        if json_file.endswith(".npz"):
+            data, index = load_zone_artifact(json_file)
+            print(f"✓ Zonas calibradas cargadas de {json_file} ({len(data)} zonas, {index.shape[1]}x{index.shape[0]})")
+        else:
+            with open(json_file, 'rb') as f:
+                raw = f.read()
+            data = ParkingZones(json.loads(raw), version=hashlib.sha1(raw).hexdigest()[:16])
+        with _zones_file_lock:
+            _zones_file_cache[json_file] = (st.st_mtime_ns, st.st_size, data)
+        return data
+    except FileNotFoundError:
+        print(f"Archivo {json_file} no encontrado. Usando zonas por defecto.")
+        return DEFAULT_PARKING_ZONES
+    except ZoneArtifactError as e:
+        print(f"❌ {e}. Usando zonas por defecto.")
+        return DEFAULT_PARKING_ZONES
+
+# Zonas por defecto para 8 cajones
+DEFAULT_PARKING_ZONES = ParkingZones([
+    {"points": [[30, 200], [120, 200], [120, 310], [30, 310]]},    # Cajón 1
+    {"points": [[140, 200], [230, 200], [230, 310], [140, 310]]},  # Cajón 2 
+    {"points": [[250, 200], [340, 200], [340, 310], [250, 310]]},  # Cajón 3
+    {"points": [[360, 200], [450, 200], [450, 310], [360, 310]]},  # Cajón 4
+    {"points": [[30, 330], [120, 330], [120, 440], [30, 440]]},    # Cajón 5
+    {"points": [[140, 330], [230, 330], [230, 440], [140, 440]]},  # Cajón 6
+    {"points": [[250, 330], [340, 330], [340, 440], [250, 440]]},  # Cajón 7
+    {"points": [[360, 330], [450, 330], [450, 440], [360, 440]]},  # Cajón 8
+])
+
+def is_significant_object(confidence, bbox_area, bbox, area_scale=1.0):
+    """
+    Determina si un objeto es lo suficientemente significativo para considerarlo.
+    ``area_scale`` ajusta el área mínima cuando la imagen se redujo (sx * sy).
+    """
+    
+    # Confianza mínima muy baja para capturar más objetos
+    if confidence < 0.15:
+        return False, f"Confianza muy baja: {confidence:.3f}"
+    
+    # Área mínima muy pequeña para no filtrar objetos válidos
+    min_area = 500 * area_scale  # Reducido significativamente
+    if bbox_area < min_area:
+        return False, f"Área muy pequeña: {bbox_area:.0f} < {min_area}"
+    
+    # Verificar que no sea demasiado alargado (posible línea o borde)
+    x1, y1, x2, y2 = bbox
+    width = x2 - x1
+    height = y2 - y1
+    aspect_ratio = width / height if height > 0 else 0
+    
+    # Rango muy amplio de aspect ratio
+    if not (0.2 <= aspect_ratio <= 8.0):
+        return False, f"Aspecto extremo: {aspect_ratio:.2f}"
+    
+    return True, "Objeto significativo detectado"
+
+# Ceros entre recortes del mosaico de Canny (el gradiente 3x3 no los cruza)
+CANNY_MOSAIC_GAP = 4
+
+def _zone_edge_counts(gray, origin, zone_index, frame_shape):
+    """
+    Píxeles de borde (Canny) de cada zona con una sola llamada a Canny.
+
+    El Canny anterior corría sobre el frame completo enmascarado por zona: la
+    zona rodeada de ceros. El recorte enmascarado de cada zona se pega en un
+    mosaico separado por ``CANNY_MOSAIC_GAP`` ceros, que es el mismo entorno,
+    así los bordes no cambian. Las zonas cuya ROI toca el borde del frame
+    dependen del borde de la imagen y conservan su propio Canny.
+    """
+    counts = [0] * len(zone_index)
+    height, width = frame_shape[:2]
+    gap = CANNY_MOSAIC_GAP
+    tiles = []
+    for i, compiled in enumerate(zone_index):
+        if compiled.area == 0:
+            continue
+        roi = compiled.roi_slice_in(origin)
+        rx1, ry1, rx2, ry2 = compiled.roi
+        if rx1 == 0 or ry1 == 0 or rx2 == width or ry2 == height:
+            zone_gray = cv2.bitwise_and(gray[roi], gray[roi], mask=compiled.mask)
+            counts[i] = cv2.countNonZero(cv2.Canny(zone_gray, 50, 150))
+        else:
+            tiles.append((i, roi, compiled.mask))
+    if not tiles:
+        return counts
+
+    # Estantes de ancho fijo: cada recorte a la derecha del anterior
+    shelf_width = max(gray.shape[1], max(mask.shape[1] for _, _, mask in tiles)) + 2 * gap
+    placed = []
+    x = y = gap
+    shelf_height = 0
+    for i, roi, mask in tiles:
+        h, w = mask.shape
+        if x + w + gap > shelf_width:
+            x, y = gap, y + shelf_height + gap
+            shelf_height = 0
+        placed.append((i, roi, mask, x, y))
+        x += w + gap
+        shelf_height = max(shelf_height, h)
 
-    def detect_from_path(path: str, resize_width: int = None) -> Dict[str, Any]:
+    mosaic = np.zeros((y + shelf_height + gap, shelf_width), dtype=np.uint8)
+    for i, roi, mask, x, y in placed:
+        h, w = mask.shape
+        cv2.bitwise_and(gray[roi], gray[roi], dst=mosaic[y:y + h, x:x + w], mask=mask)
+    edges = cv2.Canny(mosaic, 50, 150)
+    # Un borde puede caer a un píxel fuera del recorte, nunca más lejos
+    half = gap // 2
+    for i, roi, mask, x, y in placed:
+        h, w = mask.shape
+        counts[i] = cv2.countNonZero(edges[y - half:y + h + half, x - half:x + w + half])
+    return counts
+
+def detect_by_color_analysis(image_cv2, parking_zones, zone_index=None):
+    """
+    Detección complementaria basada en análisis de color mejorado.
+
+    Gris y HSV se calculan una sola vez sobre el rectángulo que cubre todas las
+    zonas y Canny una sola vez sobre el mosaico de zonas (``_zone_edge_counts``);
+    cada zona trabaja solo sobre su ROI recortada con su máscara precompilada
+    (mismos puntajes que con máscaras de frame completo).
+    """
+    if zone_index is None:
+        zone_index = get_zone_index(parking_zones, image_cv2.shape)
+
+    potential_objects = []
+
+    ux1, uy1, ux2, uy2 = zone_index.union_roi
+    if ux2 <= ux1 or uy2 <= uy1:
+        return potential_objects
+
+    # Convertir solo la región con zonas (LAB no se usa)
+    region = image_cv2[uy1:uy2, ux1:ux2]
+    gray = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+    saturation = cv2.cvtColor(region, cv2.COLOR_BGR2HSV)[:, :, 1]
+    origin = (ux1, uy1)
+    edge_counts = _zone_edge_counts(gray, origin, zone_index, image_cv2.shape)
+    
+    for i, compiled in enumerate(zone_index):
+        if compiled.area == 0:
+            continue
+
+        # Recorte de la zona y su máscara
+        roi = compiled.roi_slice_in(origin)
+        zone_gray_roi = gray[roi]
+        inside = compiled.mask_bool
+        
+        # Análisis 1: Variabilidad de intensidad (objetos vs asfalto vacío)
+        masked_pixels = zone_gray_roi[inside]
+        intensity_std = np.std(masked_pixels)
+        
+        # El asfalto vacío tiende a ser más uniforme
+        # Los objetos (coches) tienen más variabilidad
+        variability_score = intensity_std / 255.0
+        
+        # Análisis 2: Detección de bordes (Canny del mosaico de zonas)
+        edge_pixels = edge_counts[i]
+        zone_area = compiled.area
+        edge_density = edge_pixels / zone_area
+        
+        # Análisis 3: Saturación de color (coches suelen tener colores más saturados)
+        saturation_mean = np.mean(saturation[roi][inside])
+        saturation_score = saturation_mean / 255.0
+        
+        # Combinar todas las métricas
+        combined_score = (
+            variability_score * 0.4 +      # 40% variabilidad de intensidad
+            edge_density * 0.4 +           # 40% densidad de bordes
+            saturation_score * 0.2         # 20% saturación de color
+        )
+        
+        # Umbral para considerar que hay un objeto
+        if combined_score > 0.15:  # Umbral ajustable
+            confidence_score = min(combined_score * 2.0, 0.9)
+            potential_objects.append({
+                'zone_id': i,
+                'combined_score': combined_score,
+                'confidence_score': confidence_score,
+                'variability_score': variability_score,
+                'edge_density': edge_density,
+                'saturation_score': saturation_score
+            })
+            
+            print(f"  Zona #{i+1} - Análisis de color:")
+            print(f"    Variabilidad: {variability_score:.3f}")
+            print(f"    Densidad bordes: {edge_density:.3f}")
+            print(f"    Saturación: {saturation_score:.3f}")
+            print(f"    Score combinado: {combined_score:.3f}")
+    
+    return potential_objects
+
+def analyze_parking_zones_simple(all_objects, color_detections, parking_zones, zone_index=None):
+    """Analiza cada zona de estacionamiento de forma simplificada"""
+    occupied_zones = set()
+    zone_details = []
+    
+    print(f"\n--- ANÁLISIS SIMPLIFICADO DE ZONAS ---")
+
+    # La asignación solo usa la geometría vectorial, no las máscaras
+    if zone_index is None:
+        zone_index = get_zone_index(parking_zones, (0, 0))
+
+    # Matrices zona × objeto: centro dentro y porcentaje de overlap
+    center_matrix, overlap_matrix = assign_objects_to_zones(all_objects, zone_index)
+    
+    for zone_idx, zone in enumerate(parking_zones):
+        is_occupied = False
+        occupying_object = None
+        best_overlap = 0
+        detection_method = "none"
+        confidence_score = 0.0
+        
+        # 1. Verificar cualquier objeto detectado por YOLO
+        # Criterios más flexibles - centro dentro o más de 15% de overlap
+        best_idx, overlap_percentage = best_object_for_zone(
+            center_matrix[zone_idx], overlap_matrix[zone_idx], 0.15
+        )
+        if best_idx is not None:
+            is_occupied = True
+            occupying_object = all_objects[best_idx]
+            best_overlap = overlap_percentage
+            detection_method = "object_detection"
+            confidence_score = occupying_object['confidence']
+        
+        # 2. Verificar detección por análisis de color
+        color_confidence = 0.0
+        for cd in color_detections:
+            if cd['zone_id'] == zone_idx:
+                color_confidence = cd['confidence_score']
+                
+                # Usar color si no hay detección YOLO o para confirmar
+                if not is_occupied and cd['confidence_score'] > 0.3:
+                    is_occupied = True
+                    detection_method = "color_analysis"
+                    confidence_score = cd['confidence_score']
+                    occupying_object = {
+                        'class': 'object_by_analysis',
+                        'confidence': cd['confidence_score'],
+                        'method': 'color_analysis'
+                    }
+                elif is_occupied and cd['confidence_score'] > 0.2:
+                    detection_method = "dual_detection"  # Confirmación dual
+                break
+        
+        # 3. Registrar resultado
+        if is_occupied:
+            occupied_zones.add(zone_idx)
+        
+        # 4. Logging
+        status = "OCUPADA" if is_occupied else "LIBRE"
+        method_str = f" [{detection_method.upper()}]"
+        confidence_str = f" (conf: {confidence_score:.3f})" if confidence_score > 0 else ""
+        
+        print(f"Zona #{zone_idx+1}: {status}{confidence_str}{method_str}")
+        
+        if is_occupied and occupying_object:
+            if detection_method == "object_detection" or detection_method == "dual_detection":
+                print(f"  -> Overlap: {best_overlap:.3f}")
+            if color_confidence > 0:
+                print(f"  -> Análisis color: {color_confidence:.3f}")
+        
+        # 5. Guardar detalles
+        details = {
+            'id': zone_idx + 1,
+            'occupied': is_occupied,
+            'confidence': float(confidence_score),
+            'detection_method': detection_method,
+            'overlap_percentage': float(best_overlap),
+            'color_confidence': float(color_confidence)
+        }
+        # Zonas del registro por estacionamiento: id estable del cajón
+        if 'cajon_id' in zone:
+            details['cajon_id'] = zone['cajon_id']
+            details['numero_cajon'] = zone.get('numero_cajon')
+        zone_details.append(details)
+    
+    return occupied_zones, zone_details
+
+def draw_simple_annotations(image, parking_zones, occupied_zones, zone_details, all_objects,
+                            zone_index=None, max_width=None):
+    """
+    Dibuja anotaciones simplificadas en la imagen sin texto.
+
+    Todos los rellenos se pintan en un único overlay que se mezcla una sola vez
+    (solo sobre el rectángulo que cubre las zonas). Con ``max_width`` la imagen
+    se reduce antes de dibujar y las coordenadas se escalan.
+    """
+    if zone_index is None:
+        zone_index = get_zone_index(parking_zones, image.shape)
+
+    height, width = image.shape[:2]
+    scale = 1.0
+    if max_width and width > max_width:
+        scale = max_width / width
+        size = (int(max_width), max(1, int(round(height * scale))))
+        annotated_image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    else:
+        annotated_image = image.copy()
+
+    def scaled(points):
+        if scale == 1.0:
+            return points
+        return np.round(points * scale).astype(np.int32)
+
+    box_thickness = max(1, int(round(2 * scale)))
+    zone_thickness = max(1, int(round(4 * scale)))
+    
+    # 1. Dibujar bounding boxes de objetos detectados (sin etiquetas)
+    for obj in all_objects:
+        x1, y1, x2, y2 = (int(v * scale) for v in obj['bbox'])
+        cv2.rectangle(annotated_image, (x1, y1), (x2, y2), (0, 255, 255), box_thickness)
+    
+    # 2. Rellenar todas las zonas en un solo overlay según su estado
+    contours = []
+    overlay = annotated_image.copy()
+    for i, compiled in enumerate(zone_index):
+        points = scaled(compiled.contour)
+        color = (0, 0, 255) if i in occupied_zones else (0, 255, 0)
+        cv2.fillPoly(overlay, [points], color)
+        contours.append((points, color))
+
+    # 3. Una sola mezcla con transparencia, limitada a la región con zonas
+    ux1, uy1, ux2, uy2 = (int(round(v * scale)) for v in zone_index.union_roi)
+    region = (slice(uy1, uy2 + 1), slice(ux1, ux2 + 1))
+    if annotated_image[region].size:
+        annotated_image[region] = cv2.addWeighted(overlay[region], 0.3, annotated_image[region], 0.7, 0)
+
+    # 4. Contornos encima de la mezcla
+    for points, color in contours:
+        cv2.polylines(annotated_image, [points], True, color, zone_thickness)
+    
+    return annotated_image
+
+class DetectionPipeline:
+    """
+    Pipeline de detección por etapas.
+
+    ``stages`` indica qué etapas están activas; ``run`` acepta bytes, una ruta
+    o un ndarray BGR y devuelve un contexto con los resultados intermedios y
+    ``timings`` (ms por etapa).
+    """
+
+    def __init__(self, stages=STAGES, infer=None, zones_loader=None, annotate_max_width=None,
+                 input_width=DETECTION_INPUT_WIDTH, tiling=DETECTION_TILING, infer_many=None):
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            raise ValueError(f"Etapas desconocidas: {sorted(unknown)}")
+        if tiling not in TILING_MODES:
+            raise ValueError(f"tiling debe ser uno de {TILING_MODES}")
+        self.stages = tuple(s for s in STAGES if s in stages)
+        self.infer = infer or run_inference
+        if infer_many is None:
+            infer_many = run_inference_batch if infer is None else (lambda images: [self.infer(i) for i in images])
+        self.infer_many = infer_many
+        self.tiling = tiling
+        self.zones_loader = zones_loader or load_parking_zones
+        self.annotate_max_width = annotate_max_width
+        self.input_width = input_width or None
+
+    def _replace(self, **overrides):
+        """Copia del pipeline con algunos argumentos del constructor cambiados"""
+        kwargs = {
+            "stages": self.stages,
+            "infer": self.infer,
+            "zones_loader": self.zones_loader,
+            "annotate_max_width": self.annotate_max_width,
+            "input_width": self.input_width,
+            "tiling": self.tiling,
+            "infer_many": self.infer_many,
+        }
+        kwargs.update(overrides)
+        return DetectionPipeline(**kwargs)
+
+    def without(self, *stages):
+        """Copia del pipeline con algunas etapas desactivadas"""
+        return self._replace(stages=[s for s in self.stages if s not in stages])
+
+    def with_annotation_width(self, max_width):
+        """Copia del pipeline que dibuja la imagen anotada a un ancho máximo"""
+        return self._replace(annotate_max_width=max_width)
+
+    def with_tiling(self, tiling):
+        """Copia del pipeline con otro modo de inferencia por zonas (off | crop | tile)"""
+        return self._replace(tiling=tiling)
+
+    def target_width(self, target_width=None):
+        """Ancho de entrada efectivo: el pedido o el del pipeline (None = original)"""
+        return (target_width if target_width is not None else self.input_width) or None
+
+    def _new_ctx(self, parking_zones, target_width=None):
+        return {
+            "image": None,
+            "target_width": self.target_width(target_width),
+            "original_size": None,
+            "scale": (1.0, 1.0),
+            "result": None,
+            "parking_zones": parking_zones if parking_zones is not None else self.zones_loader(),
+            "zone_index": None,
+            "all_objects": [],
+            "color_detections": [],
+            "occupied_zones": set(),
+            "zone_details": [],
+            "annotated_image": None,
+            "encoded_image": None,
+            "encoded_media_type": None,
+            "timings": {},
+        }
+
+    def _run_stages(self, ctx, source, enabled, stages):
+        for stage in stages:
+            if stage not in enabled and stage != "decode":
+                continue
+            start = time.perf_counter()
+            getattr(self, f"_stage_{stage}")(ctx, source, enabled)
+            ctx["timings"][stage] = round((time.perf_counter() - start) * 1000, 2)
+
+            if stage == "decode":
+                # Zonas en el espacio de la imagen reducida y su geometría
+                # compilada para este tamaño de frame (ambas cacheadas)
+                start = time.perf_counter()
+                ctx["parking_zones"] = scale_zones(ctx["parking_zones"], *ctx["scale"])
+                ctx["zone_index"] = get_zone_index(ctx["parking_zones"], ctx["image"].shape)
+                ctx["timings"]["zones"] = round((time.perf_counter() - start) * 1000, 2)
+
+    def run(self, source, parking_zones=None, stages=None, target_width=None, original_size=None):
+        """
+        ``original_size`` (ancho, alto) indica que un ndarray ya viene
+        reducido (ring de frames): las zonas se escalan desde ese tamaño.
         """
-        Retorna un dict con keys:
-          - detections: lista (puedes extender)
-          - annotated_path: path a imagen anotada
+        enabled = set(self.stages if stages is None else stages)
+        ctx = self._new_ctx(parking_zones, target_width)
+        ctx["original_size"] = original_size
+        self._run_stages(ctx, source, enabled, STAGES)
+        ctx["timings"]["total"] = round(sum(ctx["timings"].values()), 2)
+        return ctx
+
+    def run_gated(self, source, gate_key, parking_zones=None, stages=None, gate=None, target_width=None):
         """
-        if model is None:
-            # si no hay ultralytics, devolvemos placeholder
-            annotated_tmp = Path(tempfile.gettempdir()) / (Path(path).stem + "_annotated.jpg")
-            # simplemente copia la imagen original a annotated_tmp
-            with open(path, "rb") as src, open(annotated_tmp, "wb") as dst:
-                dst.write(src.read())
-            return {"detections": [], "annotated_path": str(annotated_tmp)}
-
-        # correr detección
-        results = model(path)  # Ajusta parámetros (conf, imgsz) según necesites
-        # Guardar imagen anotada — la API concreta puede variar por versión
-        annotated_tmp = Path(tempfile.gettempdir()) / (Path(path).stem + "_annotated.jpg")
-        try:
-            # algunos resultados permiten results[0].plot() o save()
-            im = results[0].plot()  # puede ser un PIL.Image o similar en algunas versiones
-            im.save(annotated_tmp)
-        except Exception:
-            # fallback: si la lib tiene save
+        Igual que ``run`` pero con la compuerta de movimiento delante de la
+        inferencia. ``gate_key`` identifica la cámara: si ninguna zona cambió
+        respecto a su referencia se reutiliza el estado anterior sin correr
+        YOLO; si cambiaron algunas, YOLO corre solo sobre el recorte de esas
+        zonas y las demás conservan su estado anterior.
+        """
+        gate = gate or motion_gate
+        if not gate.enabled:
+            return self.run(source, parking_zones, stages, target_width)
+
+        enabled = set(self.stages if stages is None else stages)
+        ctx = self._new_ctx(parking_zones, target_width)
+        self._run_stages(ctx, source, enabled, ("decode",))
+
+        start = time.perf_counter()
+        decision = gate.evaluate(gate_key, ctx["image"], ctx["zone_index"])
+        ctx["timings"]["gate"] = round((time.perf_counter() - start) * 1000, 2)
+        ctx["gate"] = decision.to_dict()
+
+        previous = gate.previous(gate_key)
+        if previous is None and decision.mode != "full":
+            # El estado se desalojó (LRU) o se reinició el stream desde evaluate
+            decision = decision.as_full("sin_referencia")
+            ctx["gate"] = decision.to_dict()
+        if decision.skip:
+            print(f"✓ Sin cambios en las zonas, se reutiliza el estado anterior")
+            ctx["all_objects"] = previous["all_objects"]
+            ctx["color_detections"] = previous["color_detections"]
+            ctx["zone_details"] = copy.deepcopy(previous["zone_details"])
+            ctx["occupied_zones"] = set(previous["occupied_zones"])
+        else:
+            if decision.mode == "partial":
+                ctx["infer_zones"] = decision.changed
+            self._run_stages(ctx, source, enabled, STAGES[1:5])
+            if decision.mode == "partial":
+                changed = set(decision.changed)
+                _restore_zone_state(ctx, previous, [i for i in range(len(ctx["zone_details"])) if i not in changed])
+                # Los objetos fuera del recorte inferido siguen siendo los anteriores
+                region = ctx.get("infer_region")
+                if region is not None:
+                    ctx["all_objects"] = ctx["all_objects"] + [
+                        obj for obj in previous["all_objects"] if not _bbox_intersects(obj["bbox"], region)
+                    ]
+        self._run_stages(ctx, source, enabled, STAGES[5:])
+
+        gate.commit(gate_key, decision, ctx["image"].shape, ctx["zone_index"], {
+            "all_objects": ctx["all_objects"],
+            "color_detections": ctx["color_detections"],
+            "occupied_zones": set(ctx["occupied_zones"]),
+            "zone_details": copy.deepcopy(ctx["zone_details"]),
+        })
+        ctx["timings"]["total"] = round(sum(ctx["timings"].values()), 2)
+        return ctx
+
+    def run_many(self, sources, parking_zones=None, stages=None, infer_many=None, zones_per_source=None,
+                 target_width=None):
+        """
+        Igual que ``run`` para varias imágenes, pero con una sola inferencia
+        en lote. Devuelve un contexto por fuente; si una imagen no se puede
+        decodificar su contexto trae ``error`` en lugar de resultados.
+        ``zones_per_source`` permite usar zonas distintas para cada fuente.
+        """
+        enabled = set(self.stages if stages is None else stages)
+        infer_many = infer_many or self.infer_many
+        if zones_per_source is None:
+            zones_per_source = [parking_zones] * len(sources)
+
+        contexts = []
+        for source, zones in zip(sources, zones_per_source):
+            ctx = self._new_ctx(zones, target_width)
+            ctx["error"] = None
             try:
-                results.save(annotated_tmp)
-            except Exception:
-                # copia original
-                with open(path, "rb") as src, open(annotated_tmp, "wb") as dst:
-                    dst.write(src.read())
-
-        # parse detections (ejemplo simplificado)
-        detections = []
-        try:
-            for r in results:
-                # r.boxes puede cambiar; este es un ejemplo
-                for b in getattr(r, "boxes", []):
-                    detections.append({
-                        "xyxy": getattr(b, "xyxy", []).tolist() if hasattr(b, "xyxy") else None,
-                        "conf": float(getattr(b, "conf", 0)),
-                        "class": int(getattr(b, "cls", -1))
-                    })
-        except Exception:
-            detections = []
-
-        return {"detections": detections, "annotated_path": str(annotated_tmp)}
+                self._run_stages(ctx, source, enabled, ("decode",))
+            except ImageDecodeError as e:
+                ctx["error"] = str(e)
+            contexts.append(ctx)
+
+        valid = [ctx for ctx in contexts if ctx["error"] is None]
+        if "infer" in enabled and valid and self.tiling != "off":
+            # Cada imagen infiere sus propios parches en un lote
+            for ctx, source in zip(contexts, sources):
+                if ctx["error"] is None:
+                    self._run_stages(ctx, source, enabled, ("infer",))
+        elif "infer" in enabled and valid:
+            print(f"\n1. Detectando objetos con YOLO en lote ({len(valid)} imágenes)...")
+            start = time.perf_counter()
+            results = infer_many([ctx["image"] for ctx in valid])
+            elapsed = round((time.perf_counter() - start) * 1000, 2)
+            for ctx, result in zip(valid, results):
+                ctx["result"] = result
+                ctx["timings"]["infer"] = elapsed
+
+        for ctx, source in zip(contexts, sources):
+            if ctx["error"] is None:
+                self._run_stages(ctx, source, enabled - {"infer"}, STAGES[2:])
+            ctx["timings"]["total"] = round(sum(ctx["timings"].values()), 2)
+        return contexts
+
+    # --- Etapas ---
+
+    def _stage_decode(self, ctx, source, enabled):
+        # Sin etapa decode solo se aceptan ndarrays ya decodificados
+        if not isinstance(source, np.ndarray) and "decode" not in enabled:
+            raise ImageDecodeError("La etapa decode está desactivada y la entrada no es un ndarray")
+        image, original_size = decode_image(source, ctx["target_width"])
+        if image is None:
+            raise ImageDecodeError("No se pudo decodificar la imagen")
+        if ctx["original_size"] is not None and isinstance(source, np.ndarray):
+            original_size = ctx["original_size"]
+        ctx["image"] = image
+        ctx["original_size"] = original_size
+        height, width = image.shape[:2]
+        ctx["scale"] = (width / original_size[0], height / original_size[1])
+
+    def _stage_infer(self, ctx, source, enabled):
+        if ctx.get("infer_zones") is not None:
+            # Compuerta parcial: solo la región de las zonas que cambiaron
+            zone_index = ctx["zone_index"].subset(ctx["infer_zones"])
+            mode = "crop" if self.tiling == "off" else self.tiling
+            ctx["infer_region"] = crop_region(zone_index, ctx["image"].shape)
+            ctx["result"], ctx["tiles"] = zone_inference(
+                ctx["image"], zone_index, mode, self.infer, self.infer_many, DETECTION_CONFIG["iou"],
+            )
+            print(f"\n1. Detectando objetos con YOLO sobre {len(ctx['infer_zones'])} zonas cambiadas...")
+            return
+        if self.tiling == "off":
+            print(f"\n1. Detectando objetos con YOLO...")
+            ctx["result"] = self.infer(ctx["image"])
+            return
+        ctx["result"], ctx["tiles"] = zone_inference(
+            ctx["image"], ctx["zone_index"], self.tiling, self.infer, self.infer_many, DETECTION_CONFIG["iou"],
+        )
+        print(f"\n1. Detectando objetos con YOLO sobre las zonas ({self.tiling}, {ctx['tiles']} parches)...")
+
+    def _stage_filter(self, ctx, source, enabled):
+        sx, sy = ctx["scale"]
+        ctx["all_objects"] = extract_objects(ctx["result"], apply_filter=True, area_scale=sx * sy)
+        print(f"Total objetos válidos: {len(ctx['all_objects'])}")
+
+    def _stage_color(self, ctx, source, enabled):
+        print(f"\n2. Análisis complementario por color...")
+        ctx["color_detections"] = detect_by_color_analysis(
+            ctx["image"], ctx["parking_zones"], ctx["zone_index"]
+        )
+        print(f"Zonas con actividad detectada: {len(ctx['color_detections'])}")
+
+    def _stage_fuse(self, ctx, source, enabled):
+        # Sin etapa filter se usan todas las cajas que devolvió YOLO
+        if "filter" not in enabled and ctx["result"] is not None:
+            ctx["all_objects"] = extract_objects(ctx["result"], apply_filter=False)
+        print(f"\n3. Analizando ocupación de zonas...")
+        ctx["occupied_zones"], ctx["zone_details"] = analyze_parking_zones_simple(
+            ctx["all_objects"], ctx["color_detections"], ctx["parking_zones"], ctx["zone_index"]
+        )
+
+    def _stage_annotate(self, ctx, source, enabled):
+        ctx["annotated_image"] = draw_simple_annotations(
+            ctx["image"], ctx["parking_zones"], ctx["occupied_zones"],
+            ctx["zone_details"], ctx["all_objects"], ctx["zone_index"],
+            max_width=self.annotate_max_width,
+        )
+
+    def _stage_encode(self, ctx, source, enabled):
+        if ctx["annotated_image"] is None:
+            return
+        ok, buffer = cv2.imencode(ANNOTATED_IMAGE_FORMAT, ctx["annotated_image"])
+        if ok:
+            ctx["encoded_image"] = buffer.tobytes()
+            ctx["encoded_media_type"] = MEDIA_TYPES.get(ANNOTATED_IMAGE_FORMAT, "image/jpeg")
+
+def _bbox_intersects(bbox, region):
+    x1, y1, x2, y2 = bbox
+    rx1, ry1, rx2, ry2 = region
+    return x1 < rx2 and rx1 < x2 and y1 < ry2 and ry1 < y2
+
+def _restore_zone_state(ctx, previous, zone_ids):
+    """Copia al contexto el estado guardado de las zonas que no cambiaron"""
+    for i in zone_ids:
+        ctx["zone_details"][i] = dict(previous["zone_details"][i])
+        if i in previous["occupied_zones"]:
+            ctx["occupied_zones"].add(i)
+        else:
+            ctx["occupied_zones"].discard(i)
+
+def extract_objects(result, apply_filter=True, area_scale=1.0):
+    """Convierte las cajas de YOLO en la lista ``all_objects``"""
+    all_objects = []
+    if result is None or result.boxes is None:
+        return all_objects
+
+    for box in result.boxes:
+        class_id = int(box.cls[0])
+        confidence = float(box.conf[0])
+        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
+        bbox_area = (x2 - x1) * (y2 - y1)
+        class_name = result.names[class_id]
+
+        # Verificar si es un objeto significativo (sin filtrar por clase)
+        if apply_filter:
+            is_significant, reason = is_significant_object(confidence, bbox_area, (x1, y1, x2, y2), area_scale)
+        else:
+            is_significant, reason = True, "Sin filtro"
+
+        if is_significant:
+            center_x = (x1 + x2) / 2
+            center_y = (y1 + y2) / 2
+
+            all_objects.append({
+                'center': (float(center_x), float(center_y)),
+                'bbox': (float(x1), float(y1), float(x2), float(y2)),
+                'class': class_name,
+                'confidence': float(confidence),
+                'reason': reason
+            })
+            print(f"✓ OBJETO DETECTADO: {class_name} (conf: {confidence:.3f}, área: {bbox_area:.0f})")
+        else:
+            print(f"✗ Objeto rechazado: {class_name} (conf: {confidence:.3f}) - {reason}")
+
+    return all_objects
+
+def summarize(ctx):
+    """Estadísticas de ocupación a partir del contexto del pipeline"""
+    total_zones = len(ctx["parking_zones"])
+    occupied_count = len(ctx["occupied_zones"])
+    available_count = total_zones - occupied_count
+    occupancy_rate = (occupied_count / total_zones) * 100 if total_zones > 0 else 0
+    return {
+        "total": int(total_zones),
+        "occupied": int(occupied_count),
+        "available": int(available_count),
+        "occupancy_rate": round(occupancy_rate, 1)
+    }
+
+def store_annotated_image(ctx):
+    """Guarda la imagen anotada en el image_store y devuelve su id (o None)"""
+    if ctx["encoded_image"] is None:
+        return None
+    return image_store.put(ctx["encoded_image"], ctx["encoded_media_type"])
+
+def to_data_uri(data, media_type="image/jpeg"):
+    encoded_image = base64.b64encode(data).decode("utf-8")
+    return f"data:{media_type};base64,{encoded_image}"
+
+def input_info(ctx):
+    """Tamaño original y de análisis de la imagen (solo si se redujo)"""
+    if ctx["scale"] == (1.0, 1.0) or ctx["original_size"] is None:
+        return {}
+    height, width = ctx["image"].shape[:2]
+    return {
+        "original_size": list(ctx["original_size"]),
+        "input_size": [width, height],
+        "input_scale": [round(v, 5) for v in ctx["scale"]],
+    }
+
+def to_original_bbox(bbox, scale):
+    """Lleva una caja del espacio reducido al de la imagen original"""
+    sx, sy = scale
+    x1, y1, x2, y2 = bbox
+    return [x1 / sx, y1 / sy, x2 / sx, y2 / sy]
+
+def build_detection_response(ctx, extra=None, info_extra=None, inline_image=INLINE_IMAGES_DEFAULT):
+    """
+    Arma la respuesta JSON común de los endpoints de detección.
+
+    La imagen anotada se devuelve como ``image_id``/``image_url`` (se descarga
+    aparte con ETag); con ``inline_image`` también va como data URI en
+    ``image_annotated``, como antes.
+    """
+    stats = summarize(ctx)
+
+    image_id = store_annotated_image(ctx)
+    data_uri = to_data_uri(ctx["encoded_image"], ctx["encoded_media_type"]) if inline_image and image_id else None
+
+    # === RESUMEN FINAL ===
+    print(f"\n=== RESUMEN FINAL ===")
+    print(f"Total zonas: {stats['total']}")
+    print(f"Zonas ocupadas: {stats['occupied']}")
+    print(f"Zonas disponibles: {stats['available']}")
+    print(f"Tasa de ocupación: {stats['occupancy_rate']:.1f}%")
+    print(f"Objetos detectados: {len(ctx['all_objects'])}")
+    print(f"Análisis de color: {len(ctx['color_detections'])} zonas")
+    print(f"Tiempos (ms): {ctx['timings']}")
+    print("================================\n")
+
+    response = {"success": True}
+    response.update(extra or {})
+    response.update({
+        "image_id": image_id,
+        "image_url": image_url(image_id) if image_id else None,
+        "image_annotated": data_uri,
+        **stats,
+        "statistics": dict(stats),
+        "detection_info": {
+            "objects_detected": int(len(ctx["all_objects"])),
+            "color_analysis_zones": int(len(ctx["color_detections"])),
+            "detection_method": "simplified_any_object",
+            **input_info(ctx),
+            **({"tiles": ctx["tiles"]} if "tiles" in ctx else {}),
+            **(info_extra or {}),
+            "timings_ms": ctx["timings"],
+        },
+        "zones": ctx["zone_details"]
+    })
+    return response
+
+pipeline = DetectionPipeline()
+
+# Modos de imagen anotada que pueden pedir los clientes (?annotate=...)
+ANNOTATE_MODES = ("false", "thumbnail", "full")
+THUMBNAIL_WIDTH = int(os.getenv("DETECTION_THUMBNAIL_WIDTH", "480"))
+
+_pipelines_by_mode = {
+    "full": pipeline,
+    "thumbnail": pipeline.with_annotation_width(THUMBNAIL_WIDTH),
+    # Solo conteos: sin dibujar ni codificar
+    "false": pipeline.without("annotate", "encode"),
+}
+
+def pipeline_for(annotate="full"):
+    """Pipeline según el modo de anotación pedido (false | thumbnail | full)"""
+    if annotate not in _pipelines_by_mode:
+        raise ValueError(f"annotate debe ser uno de {ANNOTATE_MODES}")
+    return _pipelines_by_mode[annotate]
+
+def _cache_key(pipe, source, annotate, extra, parking_zones=None, target_width=None):
+    if parking_zones is None:
+        parking_zones = pipe.zones_loader()
+    key = result_cache.make_key(
+        source, zones_version(parking_zones), DETECTION_CONFIG, registry.model_id,
+        variant={"annotate": annotate, "format": ANNOTATED_IMAGE_FORMAT, "extra": extra,
+                 "input_width": pipe.target_width(target_width), "tiling": pipe.tiling},
+    )
+    return key, parking_zones
+
+def _frame_id(key):
+    """Identidad opaca del frame y sus zonas (la misma en los aciertos de caché)"""
+    return hashlib.sha1(f"{key[0]}|{key[1]}".encode("utf-8")).hexdigest()[:16]
+
+def _response_from_entry(entry, cache_status, inline_image):
+    response = copy.deepcopy(entry.response)
+    if entry.image is not None:
+        # Si el image_store ya la desalojó se vuelve a guardar (mismo id)
+        image_store.put(entry.image, entry.media_type)
+        if inline_image:
+            response["image_annotated"] = to_data_uri(entry.image, entry.media_type)
+    response["detection_info"]["cache"] = cache_status
+    return response
+
+def lookup_cached(source, annotate="full", inline_image=INLINE_IMAGES_DEFAULT, extra=None, parking_zones=None,
+                  target_width=None):
+    """
+    Respuesta cacheada o None, sin correr el pipeline. Es barato, así que los
+    endpoints lo consultan antes de pasar por la cola. Un fallo no se cuenta:
+    lo cuenta ``detect_cached`` al correr la detección.
+    """
+    key, _ = _cache_key(pipeline_for(annotate), source, annotate, extra, parking_zones, target_width)
+    entry = result_cache.get(key, count_miss=False)
+    if entry is None:
+        return None
+    return _response_from_entry(entry, "hit", inline_image)
+
+def detect_cached(source, annotate="full", inline_image=INLINE_IMAGES_DEFAULT, extra=None, info_extra=None,
+                  parking_zones=None, target_width=None):
+    """
+    Corre el pipeline y arma la respuesta, reutilizando el resultado si la
+    misma imagen ya se analizó con las mismas zonas, configuración y modelo.
+    Sin ``parking_zones`` se usan las zonas globales de bounding_boxes.json.
+    """
+    pipe = pipeline_for(annotate)
+    key, parking_zones = _cache_key(pipe, source, annotate, extra, parking_zones, target_width)
+
+    entry = result_cache.get(key)
+    if entry is not None:
+        print(f"✓ Resultado de detección servido desde caché")
+        return _response_from_entry(entry, "hit", inline_image)
+
+    ctx = pipe.run(source, parking_zones=parking_zones, target_width=target_width)
+    response = build_detection_response(ctx, extra, info_extra, inline_image=False)
+    response["detection_info"]["frame_id"] = _frame_id(key)
+    entry = result_cache.put(key, response, ctx["encoded_image"], ctx["encoded_media_type"])
+    return _response_from_entry(entry, "miss", inline_image)
+
+def detect_many_cached(items, annotate="false", inline_image=False):
+    """
+    Versión en lote de ``detect_cached``. ``items`` es una lista de
+    ``(source, extra, info_extra, parking_zones)``; las que no están en caché
+    se procesan con una sola inferencia en lote. Devuelve una respuesta por
+    item, en orden.
+    """
+    pipe = pipeline_for(annotate)
+    responses = [None] * len(items)
+    pending = []
+    for i, (source, extra, info_extra, parking_zones) in enumerate(items):
+        key, parking_zones = _cache_key(pipe, source, annotate, extra, parking_zones)
+        entry = result_cache.get(key)
+        if entry is not None:
+            responses[i] = _response_from_entry(entry, "hit", inline_image)
+        else:
+            pending.append((i, key, parking_zones))
+
+    if pending:
+        contexts = pipe.run_many(
+            [items[i][0] for i, _, _ in pending],
+            zones_per_source=[zones for _, _, zones in pending],
+        )
+        for (i, key, _), ctx in zip(pending, contexts):
+            _, extra, info_extra, _ = items[i]
+            if ctx["error"] is not None:
+                responses[i] = {"success": False, "error": ctx["error"], **(extra or {})}
+                continue
+            response = build_detection_response(ctx, extra, info_extra, inline_image=False)
+            response["detection_info"]["frame_id"] = _frame_id(key)
+            entry = result_cache.put(key, response, ctx["encoded_image"], ctx["encoded_media_type"])
+            responses[i] = _response_from_entry(entry, "miss", inline_image)
+
+    return responses
+
+def detect_lots_multicam(lots, annotate="false", inline_image=False):
+    """
+    Detección de estacionamientos con varias cámaras. ``lots`` es una lista
+    de ``(extra, cameras)`` con las ``LotCamera`` de cada uno; las cámaras de
+    todos los estacionamientos se infieren en un solo lote (las que están en
+    caché no pasan por YOLO) y la ocupación por cajón se fusiona por
+    estacionamiento. Devuelve una respuesta por estacionamiento, en orden.
+    """
+    items = []
+    slots = []
+    for lot_index, (extra, cameras) in enumerate(lots):
+        for camera in cameras:
+            if not os.path.exists(camera.image_path):
+                slots.append((lot_index, None))
+                continue
+            slots.append((lot_index, len(items)))
+            items.append((
+                camera.image_path,
+                {**(extra or {}), "camara_id": camera.camara_id},
+                {"image_source": camera.image_path, "zones_source": "camaras"},
+                camera.zones,
+            ))
+
+    print(f"\n=== DETECCIÓN MULTICÁMARA: {len(lots)} estacionamientos, {len(items)} cámaras ===")
+    camera_responses = detect_many_cached(items, annotate, inline_image) if items else []
+
+    per_lot = [[] for _ in lots]
+    for lot_index, item_index in slots:
+        if item_index is None:
+            per_lot[lot_index].append({"success": False, "error": "Imagen de la cámara no encontrada"})
+        else:
+            per_lot[lot_index].append(camera_responses[item_index])
+
+    return [
+        merge_camera_responses(cameras, responses, extra)
+        for (extra, cameras), responses in zip(lots, per_lot)
+    ]
+
+def detect_image(source, resize_width: int = None, gate_key: str = None) -> Dict[str, Any]:
+    """
+    Detección sobre una imagen en memoria (bytes, memoryview o ndarray BGR)
+    o una ruta. Retorna un dict con keys:
+      - detections: lista de objetos detectados (bbox, conf, clase)
+      - annotated_bytes / annotated_media_type: imagen anotada ya codificada
+      - statistics / zones: ocupación de las zonas
+      - gate: decisión de la compuerta de movimiento (solo con ``gate_key``)
+
+    Con ``resize_width`` la imagen se analiza reducida a ese ancho; las cajas
+    de ``detections`` se devuelven en coordenadas de la imagen original.
+    """
+    if gate_key:
+        ctx = pipeline.run_gated(source, gate_key, target_width=resize_width)
+    else:
+        ctx = pipeline.run(source, target_width=resize_width)
+
+    detections = [
+        {"xyxy": to_original_bbox(obj["bbox"], ctx["scale"]), "conf": obj["confidence"], "class": obj["class"]}
+        for obj in ctx["all_objects"]
+    ]
+    return {
+        "detections": detections,
+        "annotated_bytes": ctx["encoded_image"],
+        "annotated_media_type": ctx["encoded_media_type"],
+        "statistics": summarize(ctx),
+        "zones": ctx["zone_details"],
+        "timings_ms": ctx["timings"],
+        **input_info(ctx),
+        "gate": ctx.get("gate"),
+    }
+
+def detect_from_path(path: str, resize_width: int = None, gate_key: str = None) -> Dict[str, Any]:
+    """
+    ``detect_image`` sobre un archivo, que además escribe la imagen anotada
+    junto a las temporales y devuelve su ruta en ``annotated_path`` (el
+    llamador es responsable de borrarla). Los endpoints usan ``detect_image``.
+    """
+    result = detect_image(path, resize_width=resize_width, gate_key=gate_key)
+    annotated_bytes = result.pop("annotated_bytes")
+    result.pop("annotated_media_type")
+
+    annotated_tmp = Path(tempfile.gettempdir()) / (Path(path).stem + "_annotated" + ANNOTATED_IMAGE_FORMAT)
+    with open(annotated_tmp, "wb") as f:
+        f.write(annotated_bytes or b"")
+    result["annotated_path"] = str(annotated_tmp)
+    return result
@@ -0,0 +1,150 @@
+# backend/frame_ring.py
+"""
+Ring de frames en memoria compartida entre la ingesta y los procesos de
+inferencia (ver inference_pool.py).
+
+Un solo bloque de ``multiprocessing.shared_memory`` dividido en
+``FRAME_RING_SLOTS`` slots de tamaño fijo. La ingesta decodifica cada frame
+y lo deja en un slot libre; al proceso de inferencia solo viaja
+``FrameRef`` (slot + forma), que vuelve a ver el frame como un ndarray sobre
+la misma memoria. Ningún frame se serializa entre procesos.
+
+Los slots libres los administra solo el proceso que crea el ring: si no hay
+ninguno la ingesta recibe ``DetectionBusyError`` (contrapresión en lugar de
+cola sin límite).
+"""
+import math
+import os
+import queue
+import threading
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from inference_executor import DetectionBusyError
+from image_decode import decode_image
+
+# Slots del ring (0 = dos por proceso de inferencia)
+FRAME_RING_SLOTS = int(os.getenv("FRAME_RING_SLOTS", "0"))
+# Frame más grande que entra sin reducir en un slot (BGR)
+FRAME_RING_MAX_WIDTH = int(os.getenv("FRAME_RING_MAX_WIDTH", "1920"))
+FRAME_RING_MAX_HEIGHT = int(os.getenv("FRAME_RING_MAX_HEIGHT", "1080"))
+
+FrameRef = namedtuple("FrameRef", ("slot", "shape", "original_size"))
+
+
+def attach_shared_memory(name):
+    """Abre un bloque existente sin que este proceso lo libere al salir"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: el bloque lo registra el resource tracker compartido
+        # con el proceso que lo creó, que es quien lo libera
+        return shared_memory.SharedMemory(name=name)
+
+
+def slot_view(buffer, slot, slot_bytes, shape):
+    """ndarray BGR sobre el slot, sin copiar"""
+    return np.ndarray(shape, dtype=np.uint8, buffer=buffer, offset=slot * slot_bytes)
+
+
+class FrameRing:
+    """Slots de frames en memoria compartida con lista de slots libres"""
+
+    def __init__(self, slots, slot_bytes=FRAME_RING_MAX_WIDTH * FRAME_RING_MAX_HEIGHT * 3):
+        self.slots = max(1, slots)
+        self.slot_bytes = int(slot_bytes)
+        self._shm = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_bytes)
+        self._free = queue.SimpleQueue()
+        for slot in range(self.slots):
+            self._free.put(slot)
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.frames = 0
+        self.full = 0
+        self.downscaled = 0
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def view(self, ref):
+        return slot_view(self._shm.buf, ref.slot, self.slot_bytes, ref.shape)
+
+    def acquire(self):
+        """Reserva un slot libre o lanza DetectionBusyError"""
+        try:
+            slot = self._free.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                self.full += 1
+                in_use = self.in_use
+            raise DetectionBusyError(in_use)
+        with self._lock:
+            self.in_use += 1
+        return slot
+
+    def release(self, slot):
+        with self._lock:
+            self.in_use -= 1
+        self._free.put(slot)
+
+    def write(self, slot, image, original_size=None):
+        """
+        Copia un frame BGR al slot. Si no entra se reduce directamente sobre
+        el slot (sin copia intermedia) manteniendo la proporción.
+        """
+        height, width = image.shape[:2]
+        original_size = original_size or (width, height)
+        if image.nbytes > self.slot_bytes:
+            factor = math.sqrt(self.slot_bytes / image.nbytes)
+            shape = (max(1, int(height * factor)), max(1, int(width * factor)), 3)
+            cv2.resize(image, (shape[1], shape[0]), dst=self._view(slot, shape), interpolation=cv2.INTER_AREA)
+            with self._lock:
+                self.downscaled += 1
+        else:
+            shape = image.shape
+            np.copyto(self._view(slot, shape), image)
+        with self._lock:
+            self.frames += 1
+        return FrameRef(slot, tuple(shape), tuple(original_size))
+
+    def _view(self, slot, shape):
+        return slot_view(self._shm.buf, slot, self.slot_bytes, shape)
+
+    def decode_into(self, source, target_width=None):
+        """
+        Decodifica ``source`` (bytes, ruta o ndarray) en un slot libre y
+        devuelve su ``FrameRef``. Devuelve None si no se pudo decodificar.
+        """
+        # Sin slot libre no vale la pena decodificar
+        slot = self.acquire()
+        try:
+            image, original_size = decode_image(source, target_width)
+            if image is None:
+                self.release(slot)
+                return None
+            return self.write(slot, image, original_size)
+        except Exception:
+            self.release(slot)
+            raise
+
+    def stats(self):
+        with self._lock:
+            return {
+                "slots": self.slots,
+                "slot_mb": round(self.slot_bytes / (1024 * 1024), 1),
+                "in_use": self.in_use,
+                "frames": self.frames,
+                "full": self.full,
+                "downscaled": self.downscaled,
+            }
+
+    def close(self):
+        self._shm.close()
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,201 @@
+# backend/frame_stream.py
+"""
+Soporte para detección en vivo por WebSocket (``/detect/stream``).
+
+Cada conexión tiene un único slot con el frame más reciente: si llegan frames
+mientras se procesa el anterior, el nuevo reemplaza al que estaba esperando y
+el reemplazado se cuenta como descartado. Así una cámara más rápida que el
+servidor nunca acumula cola y la latencia se mantiene acotada.
+
+Al cliente solo se le envían los cambios de ocupación por zona respecto al
+último estado enviado, más estadísticas periódicas de la conexión.
+"""
+import asyncio
+import itertools
+import os
+import threading
+import time
+from collections import deque
+
+# Conexiones simultáneas permitidas por worker
+STREAM_MAX_CONNECTIONS = int(os.getenv("STREAM_MAX_CONNECTIONS", "16"))
+# Tope de frames procesados por segundo por conexión (0 = sin tope)
+STREAM_MAX_FPS = float(os.getenv("STREAM_MAX_FPS", "5"))
+# Cada cuántos segundos se envían estadísticas al cliente
+STREAM_STATS_INTERVAL = float(os.getenv("STREAM_STATS_INTERVAL", "5"))
+# Tamaño máximo aceptado por frame
+STREAM_MAX_FRAME_BYTES = int(os.getenv("STREAM_MAX_FRAME_BYTES", str(4 * 1024 * 1024)))
+
+# Ventana (segundos) para calcular los fps de entrada y procesados
+RATE_WINDOW = 5.0
+
+
+class LatestFrameSlot:
+    """Slot de un solo frame: ``put`` reemplaza al pendiente, ``get`` espera uno nuevo"""
+
+    def __init__(self):
+        self._frame = None
+        self._event = asyncio.Event()
+        self.dropped = 0
+
+    def put(self, frame, received_at):
+        if self._frame is not None:
+            self.dropped += 1
+        self._frame = (frame, received_at)
+        self._event.set()
+
+    def requeue(self, frame, received_at):
+        """Devuelve un frame no procesado, salvo que ya haya llegado uno más nuevo"""
+        if self._frame is None:
+            self._frame = (frame, received_at)
+            self._event.set()
+        else:
+            self.dropped += 1
+
+    async def get(self):
+        await self._event.wait()
+        self._event.clear()
+        frame, self._frame = self._frame, None
+        return frame
+
+
+class RateMeter:
+    """Eventos por segundo en una ventana deslizante"""
+
+    def __init__(self, window=RATE_WINDOW):
+        self.window = window
+        self._times = deque()
+
+    def mark(self, now=None):
+        now = time.monotonic() if now is None else now
+        self._times.append(now)
+        self._trim(now)
+
+    def rate(self, now=None):
+        now = time.monotonic() if now is None else now
+        self._trim(now)
+        if not self._times:
+            return 0.0
+        # Al menos un segundo de ventana para no inflar la tasa con pocos eventos
+        return len(self._times) / max(now - self._times[0], 1.0)
+
+    def _trim(self, now):
+        while self._times and now - self._times[0] > self.window:
+            self._times.popleft()
+
+
+class StreamStats:
+    """Estadísticas de una conexión de streaming"""
+
+    def __init__(self, stream_id, client=None):
+        self.stream_id = stream_id
+        self.client = client
+        self.started_at = time.monotonic()
+        self.frames_in = 0
+        self.frames_processed = 0
+        self.frames_failed = 0
+        # Frames procesados sin correr YOLO (compuerta de movimiento)
+        self.frames_skipped = 0
+        self.busy_retries = 0
+        self.bytes_in = 0
+        self.last_latency_ms = None
+        self.max_latency_ms = 0.0
+        self._latency_sum = 0.0
+        self._in_rate = RateMeter()
+        self._processed_rate = RateMeter()
+        self.slot = None
+
+    def frame_received(self, size):
+        self.frames_in += 1
+        self.bytes_in += size
+        self._in_rate.mark()
+
+    def frame_processed(self, latency_ms, skipped=False):
+        self.frames_processed += 1
+        self.frames_skipped += int(skipped)
+        self._processed_rate.mark()
+        self.last_latency_ms = latency_ms
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+        self._latency_sum += latency_ms
+
+    def snapshot(self):
+        return {
+            "stream_id": self.stream_id,
+            "client": self.client,
+            "uptime_s": round(time.monotonic() - self.started_at, 1),
+            "frames_in": self.frames_in,
+            "frames_processed": self.frames_processed,
+            "frames_dropped": self.slot.dropped if self.slot is not None else 0,
+            "frames_failed": self.frames_failed,
+            "frames_skipped": self.frames_skipped,
+            "skip_ratio": round(self.frames_skipped / self.frames_processed, 3) if self.frames_processed else 0.0,
+            "busy_retries": self.busy_retries,
+            "bytes_in": self.bytes_in,
+            "fps_in": round(self._in_rate.rate(), 2),
+            "fps_processed": round(self._processed_rate.rate(), 2),
+            "latency_ms": {
+                "last": round(self.last_latency_ms, 1) if self.last_latency_ms is not None else None,
+                "avg": round(self._latency_sum / self.frames_processed, 1) if self.frames_processed else None,
+                "max": round(self.max_latency_ms, 1),
+            },
+        }
+
+
+class StreamRegistry:
+    """Conexiones activas del worker, para limitarlas y exponer sus estadísticas"""
+
+    def __init__(self, max_connections=STREAM_MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        self._streams = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.total_connections = 0
+
+    def open(self, client=None):
+        """Registra una conexión nueva; None si ya se alcanzó el máximo"""
+        with self._lock:
+            if len(self._streams) >= self.max_connections:
+                self.rejected += 1
+                return None
+            stats = StreamStats(next(self._ids), client)
+            self._streams[stats.stream_id] = stats
+            self.total_connections += 1
+            return stats
+
+    def close(self, stats):
+        with self._lock:
+            self._streams.pop(stats.stream_id, None)
+
+    def stats(self):
+        with self._lock:
+            streams = list(self._streams.values())
+            rejected = self.rejected
+            total = self.total_connections
+        return {
+            "active": len(streams),
+            "max_connections": self.max_connections,
+            "max_fps": STREAM_MAX_FPS,
+            "total_connections": total,
+            "rejected": rejected,
+            "streams": [s.snapshot() for s in streams],
+        }
+
+
+stream_registry = StreamRegistry()
+
+
+def occupancy_state(zone_details):
+    """Estado compacto ``{zone_id: ocupado}`` a partir de los detalles por zona"""
+    return {str(zone["id"]): bool(zone["occupied"]) for zone in zone_details}
+
+
+def occupancy_delta(previous, current):
+    """Zonas cuyo estado cambió (todas si no hay estado previo)"""
+    if previous is None:
+        return dict(current)
+    delta = {zone_id: occupied for zone_id, occupied in current.items() if previous.get(zone_id) != occupied}
+    # Zonas que dejaron de existir (cambio de configuración)
+    for zone_id in previous.keys() - current.keys():
+        delta[zone_id] = None
+    return delta
@@ -0,0 +1,102 @@
+# backend/image_decode.py
+"""
+Decodificación de imágenes con escala de entrada.
+
+Con un ancho objetivo, los JPEG se decodifican directamente a 1/2, 1/4 u 1/8
+de resolución (``IMREAD_REDUCED_COLOR_*``: libjpeg escala durante la IDCT, así
+que decodificar una foto de 4000 px a 1000 px cuesta una fracción del tiempo)
+y luego se ajustan con ``INTER_AREA`` al ancho exacto. Se devuelve también el
+tamaño original para poder mapear zonas y cajas entre ambos espacios.
+"""
+import os
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# Factores de decodificación reducida soportados por OpenCV
+REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# Marcadores SOF (Start Of Frame) que traen el tamaño de la imagen
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def jpeg_size(data):
+    """(ancho, alto) leyendo solo la cabecera de un JPEG; None si no es JPEG"""
+    data = memoryview(data).cast("B")
+    n = len(data)
+    if n < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    i = 2
+    while i + 9 < n:
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        length = (data[i + 2] << 8) | data[i + 3]
+        if marker in _SOF_MARKERS:
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return width, height
+        i += 2 + length
+    return None
+
+
+def resize_to_width(image, target_width):
+    """Reduce la imagen a ``target_width`` (nunca la agranda)"""
+    height, width = image.shape[:2]
+    if not target_width or width <= target_width:
+        return image
+    target_height = max(1, round(height * target_width / width))
+    return cv2.resize(image, (target_width, target_height), interpolation=cv2.INTER_AREA)
+
+
+def decode_image(source, target_width=None):
+    """
+    Decodifica una ruta, bytes o memoryview (o acepta un ndarray) y la lleva a
+    ``target_width`` si es más ancha. Devuelve ``(imagen, (ancho, alto) original)``
+    o ``(None, None)`` si no se pudo decodificar.
+    """
+    if isinstance(source, np.ndarray):
+        height, width = source.shape[:2]
+        return resize_to_width(source, target_width), (width, height)
+
+    if isinstance(source, (str, Path)):
+        if not os.path.exists(source):
+            return None, None
+        buffer = np.fromfile(str(source), dtype=np.uint8)
+    else:
+        buffer = np.frombuffer(source, dtype=np.uint8)
+    if buffer.size == 0:
+        return None, None
+
+    flag = cv2.IMREAD_COLOR
+    size = jpeg_size(buffer) if target_width else None
+    if size is not None:
+        for factor, reduced_flag in REDUCED_FLAGS:
+            if size[0] // factor >= target_width:
+                flag = reduced_flag
+                break
+
+    image = cv2.imdecode(buffer, flag)
+    if image is None:
+        return None, None
+
+    if size is not None and flag != cv2.IMREAD_COLOR:
+        width, height = size
+        # Con orientación EXIF la imagen decodificada viene rotada
+        if (image.shape[1] > image.shape[0]) != (width > height) and width != height:
+            width, height = height, width
+    else:
+        height, width = image.shape[:2]
+    return resize_to_width(image, target_width), (width, height)
@@ -0,0 +1,70 @@
+# backend/image_store.py
+"""
+Almacén en memoria de imágenes anotadas.
+
+Las respuestas de detección devuelven solo un id corto y el cliente descarga
+los bytes con ``GET /detect/images/{image_id}``. El id es el hash del
+contenido, así que también sirve de ETag: si la imagen no cambió el navegador
+recibe un 304 y reutiliza su copia.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+IMAGE_STORE_MAX_BYTES = int(os.getenv("IMAGE_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".webp": "image/webp",
+}
+
+
+class ImageStore:
+    """LRU de imágenes codificadas, direccionadas por contenido y con tope de memoria"""
+
+    def __init__(self, max_bytes=IMAGE_STORE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()   # image_id -> (bytes, media_type)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def put(self, data, media_type="image/jpeg"):
+        """Guarda la imagen y devuelve su id (hash del contenido)"""
+        image_id = hashlib.sha1(data).hexdigest()[:20]
+        with self._lock:
+            if image_id in self._items:
+                self._items.move_to_end(image_id)
+                return image_id
+            self._items[image_id] = (bytes(data), media_type)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes and len(self._items) > 1:
+                _, (old, _) = self._items.popitem(last=False)
+                self._bytes -= len(old)
+                self.evictions += 1
+        return image_id
+
+    def get(self, image_id):
+        """Devuelve ``(bytes, media_type)`` o None si ya no está"""
+        with self._lock:
+            item = self._items.get(image_id)
+            if item is not None:
+                self._items.move_to_end(image_id)
+            return item
+
+    def stats(self):
+        with self._lock:
+            return {
+                "images": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+
+image_store = ImageStore()
+
+
+def image_url(image_id):
+    return f"/detect/images/{image_id}"
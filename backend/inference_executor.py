@@ -0,0 +1,148 @@
+# backend/inference_executor.py
+"""
+Ejecutor dedicado para el trabajo bloqueante de detección (YOLO / OpenCV).
+
+Los endpoints ``async`` envían aquí la parte pesada para no bloquear el event
+loop de uvicorn. Hay un número fijo de slots de inferencia y una cola de espera
+acotada: cuando la cola se llena se rechaza la petición de inmediato con
+``DetectionBusyError`` para que la API responda 503 + Retry-After.
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.responses import JSONResponse
+
+DETECTION_SLOTS = int(os.getenv("DETECTION_SLOTS", "1"))
+DETECTION_MAX_QUEUE = int(os.getenv("DETECTION_MAX_QUEUE", "8"))
+DETECTION_RETRY_AFTER = int(os.getenv("DETECTION_RETRY_AFTER", "2"))
+
+
+class DetectionBusyError(Exception):
+    """La cola de detección está llena"""
+
+    def __init__(self, queue_depth, retry_after=DETECTION_RETRY_AFTER):
+        super().__init__(f"Servicio de detección saturado ({queue_depth} en cola)")
+        self.queue_depth = queue_depth
+        self.retry_after = retry_after
+
+    def to_response(self, status_code=503):
+        return JSONResponse(
+            status_code=status_code,
+            headers={"Retry-After": str(self.retry_after)},
+            content={
+                "success": False,
+                "error": str(self),
+                "queue_depth": self.queue_depth,
+                "retry_after": self.retry_after,
+            },
+        )
+
+
+class InferenceExecutor:
+    """Pool de hilos con admisión acotada y métricas de cola"""
+
+    def __init__(self, slots=DETECTION_SLOTS, max_queue=DETECTION_MAX_QUEUE,
+                 retry_after=DETECTION_RETRY_AFTER, initializer=None):
+        self.slots = max(1, slots)
+        self.max_queue = max(0, max_queue)
+        self.retry_after = retry_after
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.slots,
+            thread_name_prefix="detect",
+            initializer=initializer,
+        )
+        self._lock = threading.Lock()
+        self._pending = 0   # en cola + ejecutándose
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+        self._wait_total_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.last_wait_ms = 0.0
+
+    @property
+    def queue_depth(self):
+        return max(0, self._pending - self._running)
+
+    def _admit(self, limit=None):
+        limit = self.slots + self.max_queue if limit is None else limit
+        with self._lock:
+            if self._pending >= limit:
+                self.rejected += 1
+                raise DetectionBusyError(self.queue_depth, self.retry_after)
+            self._pending += 1
+
+    def _job(self, enqueued_at, fn, args, kwargs):
+        wait_ms = (time.perf_counter() - enqueued_at) * 1000
+        with self._lock:
+            self._running += 1
+            self._wait_total_ms += wait_ms
+            self.last_wait_ms = wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self.completed += 1
+
+    def _submit(self, fn, args, kwargs):
+        """
+        Envía el trabajo al pool. ``_pending`` se descuenta cuando el trabajo
+        termina o se cancela en la cola, no cuando deja de esperarse: si se
+        cancela el ``await`` el hilo sigue ocupado hasta terminar.
+        """
+        job = functools.partial(self._job, time.perf_counter(), fn, args, kwargs)
+        try:
+            future = self._pool.submit(job)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn, *args, **kwargs):
+        """Ejecuta ``fn`` en un slot de inferencia o lanza DetectionBusyError"""
+        self._admit()
+        return await asyncio.wrap_future(self._submit(fn, args, kwargs))
+
+    def run_blocking(self, fn, *args, idle_only=False, **kwargs):
+        """
+        Versión bloqueante de ``run`` para hilos de fondo. Con ``idle_only``
+        solo se admite si hay un slot libre, así las peticiones tienen prioridad.
+        """
+        self._admit(self.slots if idle_only else None)
+        return self._submit(fn, args, kwargs).result()
+
+    def prestart(self):
+        """Arranca todos los hilos para que el initializer (warm-up) corra antes de la primera petición"""
+        barrier = threading.Barrier(self.slots)
+        futures = [self._pool.submit(barrier.wait) for _ in range(self.slots)]
+        for f in futures:
+            f.result()
+
+    def stats(self):
+        with self._lock:
+            started = self.completed + self._running
+            return {
+                "slots": self.slots,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queue_depth": self.queue_depth,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self._wait_total_ms / started, 2) if started else 0.0,
+                "max_wait_ms": round(self.max_wait_ms, 2),
+                "last_wait_ms": round(self.last_wait_ms, 2),
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
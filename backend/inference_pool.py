@@ -0,0 +1,224 @@
+# backend/inference_pool.py
+"""
+Pool de procesos de inferencia alimentado por el ring de frames.
+
+Con hilos el pre y post-proceso alrededor de YOLO (NumPy/OpenCV, color,
+fusión por zonas) compiten por el GIL y no escalan con los núcleos. Con
+``INFERENCE_PROCESSES`` > 0 la ingesta decodifica cada frame en un slot de
+``FrameRing`` (memoria compartida) y uno de N procesos, cada uno con su
+propio modelo, corre el pipeline sobre ese slot sin copiarlo. De vuelta
+solo viaja el resultado por zonas (un contexto reducido, sin imágenes), así
+que ``summarize`` y ``occupancy_state`` funcionan igual que con ``run``.
+
+Los procesos no guardan estado entre frames: la compuerta de movimiento y
+la anotación se quedan en el camino de hilos. Cada worker de uvicorn arma
+su propio pool; ``INFERENCE_PROCESS_THREADS`` limita los hilos de
+torch/OpenCV por proceso para no sobresuscribir la CPU.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+
+from frame_ring import FrameRing, FRAME_RING_SLOTS, attach_shared_memory, slot_view
+
+# Procesos de inferencia (0 = desactivado, se usa el ejecutor de hilos)
+INFERENCE_PROCESSES = int(os.getenv("INFERENCE_PROCESSES", "0"))
+INFERENCE_PROCESS_THREADS = int(os.getenv("INFERENCE_PROCESS_THREADS", "1"))
+
+# Etapas que corren en los procesos: sin anotar ni codificar
+POOL_STAGES = ("decode", "infer", "filter", "color", "fuse")
+
+# Estado de cada proceso de inferencia
+_worker = {}
+
+
+def _init_worker(ring_name, slot_bytes, threads):
+    """Abre el ring y carga y calienta el modelo una sola vez por proceso"""
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    # Import diferido: detection.py crea el pool al importarse
+    from detection import DETECTION_CONFIG, DetectionPipeline
+    from model_registry import registry, get_model
+
+    registry.thread_local = False
+    registry.load()
+    registry.warmup(**DETECTION_CONFIG)
+
+    def infer(image):
+        return get_model()(image, **DETECTION_CONFIG)[0]
+
+    def infer_many(images):
+        return get_model()(images, **DETECTION_CONFIG) if images else []
+
+    _worker["shm"] = attach_shared_memory(ring_name)
+    _worker["slot_bytes"] = slot_bytes
+    _worker["pipeline"] = DetectionPipeline(POOL_STAGES, infer=infer, infer_many=infer_many)
+
+
+def _ping():
+    return os.getpid()
+
+
+def _detect_slot(ref, parking_zones):
+    """Corre el pipeline sobre el frame del slot y devuelve solo el resultado por zonas"""
+    image = slot_view(_worker["shm"].buf, ref.slot, _worker["slot_bytes"], ref.shape)
+    try:
+        ctx = _worker["pipeline"].run(image, parking_zones, original_size=ref.original_size)
+    finally:
+        # El slot se reutiliza apenas vuelve el resultado
+        del image
+    return {
+        "parking_zones": ctx["parking_zones"],
+        "occupied_zones": ctx["occupied_zones"],
+        "zone_details": ctx["zone_details"],
+        "all_objects": ctx["all_objects"],
+        "color_detections": ctx["color_detections"],
+        "original_size": ctx["original_size"],
+        "scale": ctx["scale"],
+        "tiles": ctx.get("tiles"),
+        "timings": ctx["timings"],
+        "pid": os.getpid(),
+    }
+
+
+class ProcessInferencePool:
+    """N procesos con un modelo cada uno y un ring de frames compartido"""
+
+    def __init__(self, processes=INFERENCE_PROCESSES, slots=FRAME_RING_SLOTS, threads=INFERENCE_PROCESS_THREADS):
+        self.enabled = processes > 0
+        self.processes = max(1, processes)
+        self.slots = slots or 2 * self.processes
+        self.threads = max(1, threads)
+        self.ring = None
+        self._pool = None
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+        self._total_ms = 0.0
+
+    def start(self):
+        if not self.enabled or self._pool is not None:
+            return
+        self.ring = FrameRing(self.slots)
+        self._pool = self._new_executor()
+        # Arranca y calienta todos los procesos antes de la primera petición
+        futures = [self._pool.submit(_ping) for _ in range(self.processes)]
+        for f in futures:
+            f.result()
+        print(f"✓ Pool de inferencia: {self.processes} procesos, ring de {self.ring.slots} slots "
+              f"({self.ring.slot_bytes / (1024 * 1024):.1f} MB c/u)")
+
+    def _new_executor(self):
+        # spawn: un fork con hilos de torch/uvicorn activos puede bloquearse
+        return ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.ring.name, self.ring.slot_bytes, self.threads),
+        )
+
+    def _restart(self, broken):
+        """Reemplaza un executor roto (un proceso murió); los procesos nuevos arrancan con el próximo frame"""
+        with self._lock:
+            if broken is None or self._pool is not broken:
+                return
+            self._pool = self._new_executor()
+            self.restarts += 1
+        # Sin esperar: puede llamarse desde el hilo de gestión del executor roto
+        broken.shutdown(wait=False, cancel_futures=True)
+        print(f"⚠️ Un proceso de inferencia terminó inesperadamente, se reinicia el pool")
+
+    def ingest(self, source, target_width=None):
+        """
+        Decodifica ``source`` en un slot del ring y devuelve su ``FrameRef``.
+        Lanza DetectionBusyError si el ring está lleno e ImageDecodeError si
+        no se pudo decodificar.
+        """
+        ref = self.ring.decode_into(source, target_width)
+        if ref is None:
+            from detection import ImageDecodeError
+            raise ImageDecodeError("No se pudo decodificar la imagen")
+        return ref
+
+    def dispatch(self, ref, parking_zones=None):
+        """
+        Envía un frame ya cargado en el ring a un proceso y devuelve un
+        ``Future`` con el contexto reducido. El slot se libera al terminar.
+        Si un proceso murió el ``Future`` falla con BrokenProcessPool y el
+        pool se reinicia para los frames siguientes.
+        """
+        pool = self._pool
+        started = time.perf_counter()
+        try:
+            future = pool.submit(_detect_slot, ref, parking_zones)
+        except BrokenProcessPool:
+            self.ring.release(ref.slot)
+            with self._lock:
+                self.failed += 1
+            self._restart(pool)
+            raise
+        except Exception:
+            self.ring.release(ref.slot)
+            raise
+        future.add_done_callback(lambda f: self._done(pool, ref, f, started))
+        return future
+
+    def submit(self, source, parking_zones=None, target_width=None):
+        """``ingest`` + ``dispatch`` en el hilo que llama"""
+        return self.dispatch(self.ingest(source, target_width), parking_zones)
+
+    def _done(self, pool, ref, future, started):
+        self.ring.release(ref.slot)
+        error = None if future.cancelled() else future.exception()
+        with self._lock:
+            if future.cancelled() or error is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+                self._total_ms += (time.perf_counter() - started) * 1000
+        if isinstance(error, BrokenProcessPool):
+            self._restart(pool)
+
+    async def run(self, source, parking_zones=None, target_width=None):
+        """
+        Versión ``async`` para los endpoints: la decodificación y la copia al
+        ring corren fuera del event loop.
+        """
+        loop = asyncio.get_running_loop()
+        ref = await loop.run_in_executor(None, self.ingest, source, target_width)
+        return await asyncio.wrap_future(self.dispatch(ref, parking_zones))
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "enabled": self.enabled,
+                "running": self._pool is not None,
+                "processes": self.processes if self.enabled else 0,
+                "completed": self.completed,
+                "failed": self.failed,
+                "restarts": self.restarts,
+                "avg_ms": round(self._total_ms / self.completed, 2) if self.completed else 0.0,
+            }
+        if self.ring is not None:
+            stats["ring"] = self.ring.stats()
+        return stats
+
+    def stop(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
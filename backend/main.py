@@ -1,15 +1,28 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from ultralytics import YOLO
-import numpy as np
-import cv2
-import base64
 import traceback
 import os
-import json
-import torch
+from typing import Literal, Optional
+import datetime
+import time
 from fastapi import Body
+from fastapi.concurrency import run_in_threadpool
+from model_registry import registry
+from inference_executor import DetectionBusyError
+from zone_geometry import zone_index_cache
+from image_store import image_store
+from result_cache import result_cache
+from frame_stream import stream_registry
+from motion_gate import motion_gate
+from zone_registry import zone_registry
+from camera_registry import camera_registry
+from schemas.detect_schema import DeteccionLoteRequest
+from detection import (
+    detect_cached, detect_many_cached, detect_lots_multicam, lookup_cached, ImageDecodeError, INLINE_IMAGES_DEFAULT,
+    detection_executor, batch_scheduler, occupancy_scanner, occupancy_history, occupancy_writer,
+    inference_pool, default_zones_file, start_detection_services, stop_detection_services,
+)
 
 
 app = FastAPI(
@@ -66,385 +79,87 @@ except ImportError as e:
     print("   - Verificar que existe routers/reserva_router.py")
     print("   - Verificar que el router está definido correctamente")
 
+try:
+    from routers.cajon_router import router as cajon_router
+    app.include_router(cajon_router)
+    print("✓ Router cajones importado exitosamente")
+except ImportError as e:
+    print(f"✗ Error importando cajon_router: {e}")
+    print("   - Verificar que existe routers/cajon_router.py")
+
+try:
+    from routers.camara_router import router as camara_router
+    app.include_router(camara_router)
+    print("✓ Router cámaras importado exitosamente")
+except ImportError as e:
+    print(f"✗ Error importando camara_router: {e}")
+    print("   - Verificar que existe routers/camara_router.py")
+    print("   - Verificar que el router está definido correctamente")
+
+try:
+    from routers.detect_router import router as detect_router
+    app.include_router(detect_router)
+    print("✓ Router detect importado exitosamente")
+except ImportError as e:
+    print(f"✗ Error importando detect_router: {e}")
+    print("   - Verificar que existe routers/detect_router.py")
+    print("   - Verificar que el router está definido correctamente")
+
 print("=== FIN IMPORTACIÓN ROUTERS ===\n")
 
 # Verifica que el modelo existe
-model_path = "yolo11n.pt"
-if not os.path.exists(model_path):
+model_path = registry.model_path
+if not registry.exists():
     raise FileNotFoundError(f"Modelo no encontrado: {model_path}")
 
-# Configuración de detección simplificada
-DETECTION_CONFIG = {"conf": 0.2, "iou": 0.4}  # Más sensible para detectar cualquier objeto
-
-# Función para leer el archivo JSON de bounding boxes
-def load_parking_zones(json_file="bounding_boxes.json"):
+@app.on_event("startup")
+def warmup_model():
+    """Carga, fusiona y calienta el modelo una sola vez por worker"""
+    start_detection_services()
+    ensure_schema()
+    # Zonas por estacionamiento desde cajones (una sola consulta)
+    zone_registry.load_all()
+    # Estacionamientos con varias cámaras
+    camera_registry.load_all()
+    occupancy_scanner.start(lots_fn=_active_lot_ids, detect_fn=_scan_estacionamiento)
+
+def ensure_schema():
+    """Crea las tablas que falten (camaras y camara_zonas en una base ya existente)"""
     try:
-        with open(json_file, 'r') as f:
-            data = json.load(f)
-            return data
-    except FileNotFoundError:
-        print(f"Archivo {json_file} no encontrado. Usando zonas por defecto.")
-        # Zonas por defecto para 8 cajones
-        return [
-            {"points": [[30, 200], [120, 200], [120, 310], [30, 310]]},    # Cajón 1
-            {"points": [[140, 200], [230, 200], [230, 310], [140, 310]]},  # Cajón 2 
-            {"points": [[250, 200], [340, 200], [340, 310], [250, 310]]},  # Cajón 3
-            {"points": [[360, 200], [450, 200], [450, 310], [360, 310]]},  # Cajón 4
-            {"points": [[30, 330], [120, 330], [120, 440], [30, 440]]},    # Cajón 5
-            {"points": [[140, 330], [230, 330], [230, 440], [140, 440]]},  # Cajón 6
-            {"points": [[250, 330], [340, 330], [340, 440], [250, 440]]},  # Cajón 7
-            {"points": [[360, 330], [450, 330], [450, 440], [360, 440]]},  # Cajón 8
-        ]
-
-def point_in_polygon(point, polygon):
-    """Verifica si un punto está dentro de un polígono usando ray casting"""
-    x, y = point
-    n = len(polygon)
-    inside = False
-    
-    p1x, p1y = polygon[0]
-    for i in range(1, n + 1):
-        p2x, p2y = polygon[i % n]
-        if y > min(p1y, p2y):
-            if y <= max(p1y, p2y):
-                if x <= max(p1x, p2x):
-                    if p1y != p2y:
-                        xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
-                    if p1x == p2x or x <= xinters:
-                        inside = not inside
-        p1x, p1y = p2x, p2y
-    
-    return inside
-
-def calculate_overlap_percentage(bbox, polygon):
-    """Calcula el porcentaje de superposición entre un bbox y un polígono"""
-    try:
-        x1, y1, x2, y2 = bbox
-        
-        # Crear puntos del rectángulo
-        rect_points = np.array([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], dtype=np.float32)
-        polygon_points = np.array(polygon, dtype=np.float32)
-        
-        # Calcular intersección usando OpenCV
-        retval, intersection = cv2.intersectConvexConvex(rect_points, polygon_points)
-        
-        if retval > 0 and intersection is not None and len(intersection) > 2:
-            overlap_area = cv2.contourArea(intersection)
-            bbox_area = (x2 - x1) * (y2 - y1)
-            
-            # Retornar el porcentaje de superposición del bbox
-            if bbox_area > 0:
-                return overlap_area / bbox_area
-        
-        return 0.0
+        from database import create_tables
+        # Registra todos los modelos en el metadata antes de crear
+        import models.camara, models.cajon, models.estacionamiento, models.reserva, models.user
+        create_tables()
     except Exception as e:
-        print(f"Error calculando overlap: {e}")
-        return 0.0
+        print(f"⚠️ No se pudieron crear las tablas faltantes: {e}")
 
-def is_significant_object(confidence, bbox_area, bbox):
-    """Determina si un objeto es lo suficientemente significativo para considerarlo"""
-    
-    # Confianza mínima muy baja para capturar más objetos
-    if confidence < 0.15:
-        return False, f"Confianza muy baja: {confidence:.3f}"
-    
-    # Área mínima muy pequeña para no filtrar objetos válidos
-    min_area = 500  # Reducido significativamente
-    if bbox_area < min_area:
-        return False, f"Área muy pequeña: {bbox_area:.0f} < {min_area}"
-    
-    # Verificar que no sea demasiado alargado (posible línea o borde)
-    x1, y1, x2, y2 = bbox
-    width = x2 - x1
-    height = y2 - y1
-    aspect_ratio = width / height if height > 0 else 0
-    
-    # Rango muy amplio de aspect ratio
-    if not (0.2 <= aspect_ratio <= 8.0):
-        return False, f"Aspecto extremo: {aspect_ratio:.2f}"
-    
-    return True, "Objeto significativo detectado"
-
-def detect_by_color_analysis(image_cv2, parking_zones):
-    """Detección complementaria basada en análisis de color mejorado"""
-    # Convertir a diferentes espacios de color para mejor análisis
-    hsv = cv2.cvtColor(image_cv2, cv2.COLOR_BGR2HSV)
-    lab = cv2.cvtColor(image_cv2, cv2.COLOR_BGR2LAB)
-    gray = cv2.cvtColor(image_cv2, cv2.COLOR_BGR2GRAY)
-    
-    potential_objects = []
-    
-    for i, zone in enumerate(parking_zones):
-        # Crear máscara de la zona
-        mask = np.zeros(image_cv2.shape[:2], dtype=np.uint8)
-        points = np.array(zone['points'], np.int32)
-        cv2.fillPoly(mask, [points], 255)
-        
-        # Extraer región de la zona
-        zone_gray = cv2.bitwise_and(gray, gray, mask=mask)
-        zone_hsv = cv2.bitwise_and(hsv, hsv, mask=mask)
-        
-        # Análisis 1: Variabilidad de intensidad (objetos vs asfalto vacío)
-        masked_pixels = gray[mask > 0]
-        if len(masked_pixels) > 0:
-            intensity_std = np.std(masked_pixels)
-            intensity_mean = np.mean(masked_pixels)
-            
-            # El asfalto vacío tiende a ser más uniforme
-            # Los objetos (coches) tienen más variabilidad
-            variability_score = intensity_std / 255.0
-            
-            # Análisis 2: Detección de bordes
-            edges = cv2.Canny(zone_gray, 50, 150)
-            edge_pixels = cv2.countNonZero(edges)
-            zone_area = cv2.countNonZero(mask)
-            edge_density = edge_pixels / zone_area if zone_area > 0 else 0
-            
-            # Análisis 3: Saturación de color (coches suelen tener colores más saturados)
-            zone_hsv_masked = zone_hsv[mask > 0]
-            if len(zone_hsv_masked) > 0:
-                saturation_mean = np.mean(zone_hsv_masked[:, 1])
-                saturation_score = saturation_mean / 255.0
-            else:
-                saturation_score = 0
-            
-            # Combinar todas las métricas
-            combined_score = (
-                variability_score * 0.4 +      # 40% variabilidad de intensidad
-                edge_density * 0.4 +           # 40% densidad de bordes
-                saturation_score * 0.2         # 20% saturación de color
-            )
-            
-            # Umbral para considerar que hay un objeto
-            if combined_score > 0.15:  # Umbral ajustable
-                confidence_score = min(combined_score * 2.0, 0.9)
-                potential_objects.append({
-                    'zone_id': i,
-                    'combined_score': combined_score,
-                    'confidence_score': confidence_score,
-                    'variability_score': variability_score,
-                    'edge_density': edge_density,
-                    'saturation_score': saturation_score
-                })
-                
-                print(f"  Zona #{i+1} - Análisis de color:")
-                print(f"    Variabilidad: {variability_score:.3f}")
-                print(f"    Densidad bordes: {edge_density:.3f}")
-                print(f"    Saturación: {saturation_score:.3f}")
-                print(f"    Score combinado: {combined_score:.3f}")
-    
-    return potential_objects
-
-def analyze_parking_zones_simple(all_objects, color_detections, parking_zones):
-    """Analiza cada zona de estacionamiento de forma simplificada"""
-    occupied_zones = set()
-    zone_details = []
-    
-    print(f"\n--- ANÁLISIS SIMPLIFICADO DE ZONAS ---")
-    
-    for zone_idx, zone in enumerate(parking_zones):
-        is_occupied = False
-        occupying_object = None
-        best_overlap = 0
-        detection_method = "none"
-        confidence_score = 0.0
-        
-        # 1. Verificar cualquier objeto detectado por YOLO
-        for obj in all_objects:
-            center_in_zone = point_in_polygon(obj['center'], zone['points'])
-            overlap_percentage = calculate_overlap_percentage(obj['bbox'], zone['points'])
-            
-            # Criterios más flexibles - cualquier overlap significativo
-            if center_in_zone or overlap_percentage > 0.15:  # Solo 15% de overlap
-                if overlap_percentage > best_overlap:
-                    is_occupied = True
-                    occupying_object = obj
-                    best_overlap = overlap_percentage
-                    detection_method = "object_detection"
-                    confidence_score = obj['confidence']
-        
-        # 2. Verificar detección por análisis de color
-        color_confidence = 0.0
-        for cd in color_detections:
-            if cd['zone_id'] == zone_idx:
-                color_confidence = cd['confidence_score']
-                
-                # Usar color si no hay detección YOLO o para confirmar
-                if not is_occupied and cd['confidence_score'] > 0.3:
-                    is_occupied = True
-                    detection_method = "color_analysis"
-                    confidence_score = cd['confidence_score']
-                    occupying_object = {
-                        'class': 'object_by_analysis',
-                        'confidence': cd['confidence_score'],
-                        'method': 'color_analysis'
-                    }
-                elif is_occupied and cd['confidence_score'] > 0.2:
-                    detection_method = "dual_detection"  # Confirmación dual
-                break
-        
-        # 3. Registrar resultado
-        if is_occupied:
-            occupied_zones.add(zone_idx)
-        
-        # 4. Logging
-        status = "OCUPADA" if is_occupied else "LIBRE"
-        method_str = f" [{detection_method.upper()}]"
-        confidence_str = f" (conf: {confidence_score:.3f})" if confidence_score > 0 else ""
-        
-        print(f"Zona #{zone_idx+1}: {status}{confidence_str}{method_str}")
-        
-        if is_occupied and occupying_object:
-            if detection_method == "object_detection" or detection_method == "dual_detection":
-                print(f"  -> Overlap: {best_overlap:.3f}")
-            if color_confidence > 0:
-                print(f"  -> Análisis color: {color_confidence:.3f}")
-        
-        # 5. Guardar detalles
-        zone_details.append({
-            'id': zone_idx + 1,
-            'occupied': is_occupied,
-            'confidence': float(confidence_score),
-            'detection_method': detection_method,
-            'overlap_percentage': float(best_overlap),
-            'color_confidence': float(color_confidence)
-        })
-    
-    return occupied_zones, zone_details
+@app.on_event("shutdown")
+def shutdown_detection():
+    stop_detection_services()
 
-def draw_simple_annotations(image, parking_zones, occupied_zones, zone_details, all_objects):
-    """Dibuja anotaciones simplificadas en la imagen sin texto"""
-    annotated_image = image.copy()
-    
-    # 1. Dibujar bounding boxes de objetos detectados (sin etiquetas)
-    for obj in all_objects:
-        x1, y1, x2, y2 = obj['bbox']
-        cv2.rectangle(annotated_image, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 255), 2)
-    
-    # 2. Dibujar zonas de estacionamiento
-    for i, zone in enumerate(parking_zones):
-        points = np.array(zone['points'], np.int32)
-        points = points.reshape((-1, 1, 2))
-        
-        # Color según estado
-        color = (0, 0, 255) if i in occupied_zones else (0, 255, 0)
-        
-        # Dibujar contorno
-        cv2.polylines(annotated_image, [points], True, color, 4)
-        
-        # Rellenar con transparencia
-        overlay = annotated_image.copy()
-        cv2.fillPoly(overlay, [points], color)
-        cv2.addWeighted(overlay, 0.3, annotated_image, 0.7, 0, annotated_image)
-    
-    return annotated_image
+# annotate=false devuelve solo conteos (sin dibujar ni codificar la imagen)
+AnnotateMode = Literal["false", "thumbnail", "full"]
 
 @app.post("/detect/")
-async def detect_parking(file: UploadFile = File(...)):
+async def detect_parking(
+    file: UploadFile = File(...),
+    annotate: AnnotateMode = Query("full"),
+    inline_image: bool = Query(INLINE_IMAGES_DEFAULT),
+    resize_width: Optional[int] = Query(None, ge=32),
+):
+    contents = await file.read()
     try:
-        # Leer y decodificar imagen
-        contents = await file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        image_cv2 = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-        if image_cv2 is None:
-            return JSONResponse(status_code=400, content={"error": "No se pudo decodificar la imagen"})
+        return await detection_executor.run(_detect_parking, contents, annotate, inline_image, resize_width)
+    except DetectionBusyError as e:
+        return e.to_response()
 
-        # Cargar modelo y zonas
-        model = YOLO(model_path)
-        parking_zones = load_parking_zones()
-        
+def _detect_parking(contents, annotate="full", inline_image=INLINE_IMAGES_DEFAULT, resize_width=None):
+    try:
         print(f"\n=== DETECCIÓN SIMPLIFICADA DE ESTACIONAMIENTO ===")
-        print(f"Dimensiones imagen: {image_cv2.shape}")
-        print(f"Zonas a analizar: {len(parking_zones)}")
-        
-        # === FASE 1: DETECCIÓN DE CUALQUIER OBJETO ===
-        print(f"\n1. Detectando objetos con YOLO...")
-        results = model(image_cv2, **DETECTION_CONFIG)
-        
-        all_objects = []
-        if results[0].boxes is not None:
-            for box in results[0].boxes:
-                class_id = int(box.cls[0])
-                confidence = float(box.conf[0])
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                bbox_area = (x2 - x1) * (y2 - y1)
-                class_name = model.names[class_id]
-                
-                # Verificar si es un objeto significativo (sin filtrar por clase)
-                is_significant, reason = is_significant_object(confidence, bbox_area, (x1, y1, x2, y2))
-                
-                if is_significant:
-                    center_x = (x1 + x2) / 2
-                    center_y = (y1 + y2) / 2
-                    
-                    all_objects.append({
-                        'center': (float(center_x), float(center_y)),
-                        'bbox': (float(x1), float(y1), float(x2), float(y2)),
-                        'class': class_name,
-                        'confidence': float(confidence),
-                        'reason': reason
-                    })
-                    print(f"✓ OBJETO DETECTADO: {class_name} (conf: {confidence:.3f}, área: {bbox_area:.0f})")
-                else:
-                    print(f"✗ Objeto rechazado: {class_name} (conf: {confidence:.3f}) - {reason}")
-        
-        print(f"Total objetos válidos: {len(all_objects)}")
-        
-        # === FASE 2: ANÁLISIS COMPLEMENTARIO POR COLOR ===
-        print(f"\n2. Análisis complementario por color...")
-        color_detections = detect_by_color_analysis(image_cv2, parking_zones)
-        print(f"Zonas con actividad detectada: {len(color_detections)}")
-        
-        # === FASE 3: ANÁLISIS SIMPLIFICADO DE ZONAS ===
-        print(f"\n3. Analizando ocupación de zonas...")
-        occupied_zones, zone_details = analyze_parking_zones_simple(all_objects, color_detections, parking_zones)
-        
-        # === FASE 4: GENERAR IMAGEN ANOTADA ===
-        annotated_image = draw_simple_annotations(image_cv2, parking_zones, occupied_zones, zone_details, all_objects)
-        
-        # === FASE 5: CALCULAR ESTADÍSTICAS ===
-        total_zones = len(parking_zones)
-        occupied_count = len(occupied_zones)
-        available_count = total_zones - occupied_count
-        occupancy_rate = (occupied_count / total_zones) * 100 if total_zones > 0 else 0
-        
-        # Codificar imagen resultado
-        _, buffer = cv2.imencode(".jpg", annotated_image)
-        encoded_image = base64.b64encode(buffer).decode("utf-8")
-        data_uri = f"data:image/jpeg;base64,{encoded_image}"
-        
-        # === RESUMEN FINAL ===
-        print(f"\n=== RESUMEN FINAL ===")
-        print(f"Total zonas: {total_zones}")
-        print(f"Zonas ocupadas: {occupied_count}")
-        print(f"Zonas disponibles: {available_count}")
-        print(f"Tasa de ocupación: {occupancy_rate:.1f}%")
-        print(f"Objetos detectados: {len(all_objects)}")
-        print(f"Análisis de color: {len(color_detections)} zonas")
-        print("================================\n")
-
-        return {
-            "success": True,
-            "image_annotated": data_uri,
-            "total": int(total_zones),
-            "occupied": int(occupied_count),
-            "available": int(available_count),
-            "occupancy_rate": round(occupancy_rate, 1),
-            "statistics": {
-                "total": int(total_zones),
-                "occupied": int(occupied_count),
-                "available": int(available_count),
-                "occupancy_rate": round(occupancy_rate, 1)
-            },
-            "detection_info": {
-                "objects_detected": int(len(all_objects)),
-                "color_analysis_zones": int(len(color_detections)),
-                "detection_method": "simplified_any_object"
-            },
-            "zones": zone_details
-        }
+        return detect_cached(contents, annotate=annotate, inline_image=inline_image, target_width=resize_width)
 
+    except ImageDecodeError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
     except Exception as e:
         print(f"Error en detección: {str(e)}")
         traceback.print_exc()
@@ -454,134 +169,310 @@ async def detect_parking(file: UploadFile = File(...)):
         )
 
 @app.post("/detect/estacionamiento/")
-async def detect_estacionamiento(estacionamiento_id: int = Body(...)):
+async def detect_estacionamiento(
+    estacionamiento_id: int = Body(...),
+    annotate: AnnotateMode = Query("full"),
+    inline_image: bool = Query(INLINE_IMAGES_DEFAULT),
+):
+    # Si la imagen no cambió se responde desde caché sin pasar por la cola.
+    # Los registros pueden consultar la base y la caché lee el archivo: fuera del event loop
+    cached = await run_in_threadpool(_cached_estacionamiento, estacionamiento_id, annotate, inline_image)
+    if cached is not None:
+        return cached
+
     try:
-        # Buscar la imagen del estacionamiento
-        image_path = f"images/estacionamientos/{estacionamiento_id}.jpg"
+        return await detection_executor.run(_detect_estacionamiento, estacionamiento_id, annotate, inline_image)
+    except DetectionBusyError as e:
+        return e.to_response()
+
+def _cached_estacionamiento(estacionamiento_id, annotate, inline_image):
+    """Respuesta en caché de un estacionamiento de una sola imagen, o None"""
+    image_path = resolve_parking_image(estacionamiento_id)
+    if image_path is None or camera_registry.get(int(estacionamiento_id)) is not None:
+        return None
+    try:
+        cached = lookup_cached(image_path, annotate, inline_image,
+                               extra={"estacionamiento_id": int(estacionamiento_id)},
+                               parking_zones=zone_registry.get(int(estacionamiento_id)))
+    except OSError:
+        return None
+    if cached is not None:
+        _remember_occupancy(int(estacionamiento_id), cached)
+    return cached
+
+def resolve_parking_image(estacionamiento_id):
+    """Ruta de la imagen del estacionamiento (o la imagen por defecto); None si no hay"""
+    # Buscar la imagen del estacionamiento
+    image_path = f"images/estacionamientos/{estacionamiento_id}.jpg"
+    
+    # Si no existe, usar una imagen por defecto
+    if not os.path.exists(image_path):
+        image_path = "images/default_parking.jpg"
         
-        # Si no existe, usar una imagen por defecto
-        if not os.path.exists(image_path):
-            image_path = "images/default_parking.jpg"
-            
-        # Verificar que la ruta exista (incluyendo la imagen por defecto)
-        if not os.path.exists(image_path):
+    # Verificar que la ruta exista (incluyendo la imagen por defecto)
+    if not os.path.exists(image_path):
+        return None
+    return image_path
+
+def _detect_estacionamiento(estacionamiento_id, annotate="full", inline_image=INLINE_IMAGES_DEFAULT):
+    try:
+        # Varias cámaras: todas en un lote y ocupación fusionada por cajón
+        cameras = camera_registry.get(int(estacionamiento_id))
+        if cameras is not None:
+            response = detect_lots_multicam(
+                [({"estacionamiento_id": int(estacionamiento_id)}, cameras)], annotate, inline_image
+            )[0]
+            if not response["success"]:
+                return JSONResponse(status_code=404, content=response)
+            _remember_occupancy(int(estacionamiento_id), response)
+            return response
+
+        image_path = resolve_parking_image(estacionamiento_id)
+        if image_path is None:
             return JSONResponse(status_code=404, content={
                 "error": f"No se encontró imagen para estacionamiento {estacionamiento_id} ni imagen por defecto"
             })
 
-        # Leer la imagen desde disco
-        image_cv2 = cv2.imread(image_path)
-        if image_cv2 is None:
-            return JSONResponse(status_code=400, content={"error": "No se pudo leer la imagen"})
-
-        # Cargar modelo y zonas
-        model = YOLO(model_path)
-        parking_zones = load_parking_zones()
+        # Zonas del estacionamiento (cajones) o, si no tiene, las globales
+        parking_zones = zone_registry.get(int(estacionamiento_id))
+        zones_source = "cajones" if parking_zones is not None else default_zones_file()
 
         print(f"\n=== DETECCIÓN DESDE RUTA ===")
         print(f"Estacionamiento ID: {estacionamiento_id}")
         print(f"Ruta: {image_path}")
-        print(f"Dimensiones: {image_cv2.shape}")
-        print(f"Zonas a analizar: {len(parking_zones)}")
-
-        # === FASE 1: DETECCIÓN DE CUALQUIER OBJETO ===
-        print(f"\n1. Detectando objetos con YOLO...")
-        results = model(image_cv2, **DETECTION_CONFIG)
-        
-        all_objects = []
-        if results[0].boxes is not None:
-            for box in results[0].boxes:
-                class_id = int(box.cls[0])
-                confidence = float(box.conf[0])
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                bbox_area = (x2 - x1) * (y2 - y1)
-                class_name = model.names[class_id]
-                
-                # Verificar si es un objeto significativo (sin filtrar por clase)
-                is_significant, reason = is_significant_object(confidence, bbox_area, (x1, y1, x2, y2))
-                
-                if is_significant:
-                    center_x = (x1 + x2) / 2
-                    center_y = (y1 + y2) / 2
-                    
-                    all_objects.append({
-                        'center': (float(center_x), float(center_y)),
-                        'bbox': (float(x1), float(y1), float(x2), float(y2)),
-                        'class': class_name,
-                        'confidence': float(confidence),
-                        'reason': reason
-                    })
-                    print(f"✅ OBJETO DETECTADO: {class_name} (conf: {confidence:.3f}, área: {bbox_area:.0f})")
-                else:
-                    print(f"❌ Objeto rechazado: {class_name} (conf: {confidence:.3f}) - {reason}")
-        
-        print(f"Total objetos válidos: {len(all_objects)}")
-
-        # === FASE 2: ANÁLISIS COMPLEMENTARIO POR COLOR ===
-        print(f"\n2. Análisis complementario por color...")
-        color_detections = detect_by_color_analysis(image_cv2, parking_zones)
-        print(f"Zonas con actividad detectada: {len(color_detections)}")
-
-        # === FASE 3: ANÁLISIS SIMPLIFICADO DE ZONAS ===
-        print(f"\n3. Analizando ocupación de zonas...")
-        occupied_zones, zone_details = analyze_parking_zones_simple(all_objects, color_detections, parking_zones)
+        print(f"Zonas: {zones_source}")
+
+        response = detect_cached(
+            image_path,
+            annotate=annotate,
+            extra={"estacionamiento_id": int(estacionamiento_id)},
+            info_extra={"image_source": image_path, "zones_source": zones_source},
+            inline_image=inline_image,
+            parking_zones=parking_zones,
+        )
+        _remember_occupancy(int(estacionamiento_id), response)
+        return response
 
-        # === FASE 4: GENERAR IMAGEN ANOTADA ===
-        annotated_image = draw_simple_annotations(image_cv2, parking_zones, occupied_zones, zone_details, all_objects)
+    except ImageDecodeError:
+        return JSONResponse(status_code=400, content={"error": "No se pudo leer la imagen"})
+    except Exception as e:
+        print(f"❌ Error en /detect/estacionamiento/: {str(e)}")
+        traceback.print_exc()
+        return JSONResponse(status_code=500, content={
+            "success": False, 
+            "error": str(e),
+            "estacionamiento_id": estacionamiento_id
+        })
 
-        # === FASE 5: CALCULAR ESTADÍSTICAS ===
-        total_zones = len(parking_zones)
-        occupied_count = len(occupied_zones)
-        available_count = total_zones - occupied_count
-        occupancy_rate = (occupied_count / total_zones) * 100 if total_zones > 0 else 0
+# Máximo de estacionamientos por llamada al endpoint en lote
+DETECTION_BATCH_MAX_IDS = int(os.getenv("DETECTION_BATCH_MAX_IDS", "64"))
+
+@app.post("/detect/estacionamientos/batch")
+async def detect_estacionamientos_batch(request: DeteccionLoteRequest):
+    """
+    Detecta varios estacionamientos con una sola inferencia en lote y devuelve
+    un resumen compacto por estacionamiento (sin imagen salvo que se pida).
+    """
+    ids = list(dict.fromkeys(request.estacionamiento_ids))
+    if not ids:
+        return JSONResponse(status_code=400, content={"error": "La lista de estacionamientos está vacía"})
+    if len(ids) > DETECTION_BATCH_MAX_IDS:
+        return JSONResponse(status_code=400, content={
+            "error": f"Máximo {DETECTION_BATCH_MAX_IDS} estacionamientos por llamada"
+        })
 
-        # Codificar imagen resultado
-        _, buffer = cv2.imencode(".jpg", annotated_image)
-        encoded_image = base64.b64encode(buffer).decode("utf-8")
-        data_uri = f"data:image/jpeg;base64,{encoded_image}"
+    try:
+        return await detection_executor.run(
+            _detect_estacionamientos_batch, ids, request.annotate, request.inline_image
+        )
+    except DetectionBusyError as e:
+        return e.to_response()
 
-        # === RESUMEN FINAL ===
-        print(f"\n=== RESUMEN FINAL ===")
-        print(f"Estacionamiento ID: {estacionamiento_id}")
-        print(f"Total zonas: {total_zones}")
-        print(f"Zonas ocupadas: {occupied_count}")
-        print(f"Zonas disponibles: {available_count}")
-        print(f"Tasa de ocupación: {occupancy_rate:.1f}%")
-        print(f"Objetos detectados: {len(all_objects)}")
-        print(f"Análisis de color: {len(color_detections)} zonas")
-        print("================================\n")
+def _summarize_lot(estacionamiento_id, response):
+    """Resumen compacto de la respuesta completa de un estacionamiento"""
+    if not response.get("success", True) or "statistics" not in response:
+        return {
+            "estacionamiento_id": estacionamiento_id,
+            "success": False,
+            "error": response.get("error", "Error desconocido"),
+        }
+    stats = response["statistics"]
+    summary = {
+        "estacionamiento_id": estacionamiento_id,
+        "success": True,
+        "total": stats["total"],
+        "occupied": stats["occupied"],
+        "available": stats["available"],
+        "occupancy_rate": stats["occupancy_rate"],
+        "cache": response["detection_info"].get("cache"),
+    }
+    if response.get("image_id"):
+        summary["image_id"] = response["image_id"]
+        summary["image_url"] = response["image_url"]
+    if response.get("image_annotated"):
+        summary["image_annotated"] = response["image_annotated"]
+    return summary
+
+def _detect_estacionamientos_batch(ids, annotate="false", inline_image=False):
+    try:
+        print(f"\n=== DETECCIÓN EN LOTE: {len(ids)} estacionamientos ===")
+        results = {}
+        items = []
+        item_ids = []
+        multicam = []
+        for estacionamiento_id in ids:
+            cameras = camera_registry.get(estacionamiento_id)
+            if cameras is not None:
+                multicam.append(({"estacionamiento_id": estacionamiento_id}, cameras))
+                continue
+            image_path = resolve_parking_image(estacionamiento_id)
+            if image_path is None:
+                results[estacionamiento_id] = {"success": False, "error": "Imagen no encontrada"}
+                continue
+            parking_zones = zone_registry.get(estacionamiento_id)
+            zones_source = "cajones" if parking_zones is not None else default_zones_file()
+            items.append((
+                image_path,
+                {"estacionamiento_id": estacionamiento_id},
+                {"image_source": image_path, "zones_source": zones_source},
+                parking_zones,
+            ))
+            item_ids.append(estacionamiento_id)
+
+        for estacionamiento_id, response in zip(item_ids, detect_many_cached(items, annotate, inline_image)):
+            results[estacionamiento_id] = response
+            _remember_occupancy(estacionamiento_id, response)
+
+        if multicam:
+            for (extra, _), response in zip(multicam, detect_lots_multicam(multicam, annotate, inline_image)):
+                results[extra["estacionamiento_id"]] = response
+                _remember_occupancy(extra["estacionamiento_id"], response)
 
         return {
             "success": True,
-            "estacionamiento_id": int(estacionamiento_id),
-            "image_annotated": data_uri,
-            "total": int(total_zones),
-            "occupied": int(occupied_count),
-            "available": int(available_count),
-            "occupancy_rate": round(occupancy_rate, 1),
-            "statistics": {
-                "total": int(total_zones),
-                "occupied": int(occupied_count),
-                "available": int(available_count),
-                "occupancy_rate": round(occupancy_rate, 1)
-            },
-            "detection_info": {
-                "objects_detected": int(len(all_objects)),
-                "color_analysis_zones": int(len(color_detections)),
-                "detection_method": "simplified_any_object",
-                "image_source": image_path
-            },
-            "zones": zone_details
+            "count": len(ids),
+            "results": [_summarize_lot(i, results[i]) for i in ids],
         }
 
     except Exception as e:
-        print(f"❌ Error en /detect/estacionamiento/: {str(e)}")
+        print(f"❌ Error en /detect/estacionamientos/batch: {str(e)}")
         traceback.print_exc()
-        return JSONResponse(status_code=500, content={
-            "success": False, 
-            "error": str(e),
-            "estacionamiento_id": estacionamiento_id
+        return JSONResponse(status_code=500, content={"success": False, "error": str(e)})
+
+def _remember_occupancy(estacionamiento_id, response):
+    """Las detecciones pedidas por los clientes también refrescan el snapshot"""
+    if isinstance(response, dict) and response.get("success", True) and "total" in response:
+        occupancy_scanner.record(estacionamiento_id, response, source="request")
+
+def _active_lot_ids():
+    """Ids de los estacionamientos activos (para el escáner)"""
+    from database import SessionLocal
+    from models.estacionamiento import Estacionamiento
+    db = SessionLocal()
+    try:
+        return [row.id for row in db.query(Estacionamiento.id).filter_by(activo=True).all()]
+    finally:
+        db.close()
+
+def _scan_estacionamiento(estacionamiento_id):
+    """Detección de un estacionamiento para el escáner (solo conteos, sin imagen)"""
+    cameras = camera_registry.get(estacionamiento_id)
+    if cameras is not None:
+        return detect_lots_multicam([({"estacionamiento_id": estacionamiento_id}, cameras)])[0]
+    image_path = resolve_parking_image(estacionamiento_id)
+    if image_path is None:
+        return None
+    parking_zones = zone_registry.get(estacionamiento_id)
+    zones_source = "cajones" if parking_zones is not None else default_zones_file()
+    return detect_cached(
+        image_path,
+        annotate="false",
+        extra={"estacionamiento_id": estacionamiento_id},
+        info_extra={"image_source": image_path, "zones_source": zones_source},
+        parking_zones=parking_zones,
+    )
+
+@app.get("/detect/estacionamientos/ocupacion")
+async def get_ocupacion_todos():
+    """Último estado conocido de todos los estacionamientos (no corre detección)"""
+    return {"estacionamientos": occupancy_scanner.all()}
+
+@app.get("/detect/estacionamientos/{estacionamiento_id}/ocupacion")
+async def get_ocupacion(estacionamiento_id: int):
+    """Último estado conocido de un estacionamiento (no corre detección)"""
+    snapshot = occupancy_scanner.get(estacionamiento_id)
+    if snapshot is None:
+        return JSONResponse(status_code=404, content={
+            "error": f"Aún no hay datos de ocupación para el estacionamiento {estacionamiento_id}"
         })
+    return snapshot
+
+# Ventana por defecto de las consultas de historial según el nivel
+HISTORY_DEFAULT_WINDOW = {"minute": 2 * 3600, "hour": 7 * 86400, "day": 90 * 86400}
+HistoryLevel = Literal["minute", "hour", "day"]
+
+def _history_range(nivel, desde, hasta):
+    until = hasta.timestamp() if hasta else time.time()
+    since = desde.timestamp() if desde else until - HISTORY_DEFAULT_WINDOW[nivel]
+    return since, until
+
+def _history_response(estacionamiento_id, result):
+    if result is None:
+        return JSONResponse(status_code=404, content={
+            "error": f"Aún no hay historial de ocupación para el estacionamiento {estacionamiento_id}"
+        })
+    return result
+
+@app.get("/detect/estacionamientos/{estacionamiento_id}/historial")
+async def get_historial(
+    estacionamiento_id: int,
+    nivel: HistoryLevel = Query("hour"),
+    desde: Optional[datetime.datetime] = Query(None),
+    hasta: Optional[datetime.datetime] = Query(None),
+):
+    """Tasa de ocupación por minuto, hora o día (desde los agregados, no corre detección)"""
+    since, until = _history_range(nivel, desde, hasta)
+    return _history_response(estacionamiento_id, occupancy_history.history(estacionamiento_id, nivel, since, until))
+
+@app.get("/detect/estacionamientos/{estacionamiento_id}/heatmap")
+async def get_heatmap(
+    estacionamiento_id: int,
+    nivel: HistoryLevel = Query("hour"),
+    desde: Optional[datetime.datetime] = Query(None),
+    hasta: Optional[datetime.datetime] = Query(None),
+):
+    """Fracción de tiempo ocupada de cada cajón por bucket"""
+    since, until = _history_range(nivel, desde, hasta)
+    return _history_response(estacionamiento_id, occupancy_history.heatmap(estacionamiento_id, nivel, since, until))
+
+@app.get("/detect/estacionamientos/{estacionamiento_id}/perfil-semanal")
+async def get_perfil_semanal(
+    estacionamiento_id: int,
+    desde: Optional[datetime.datetime] = Query(None),
+    hasta: Optional[datetime.datetime] = Query(None),
+):
+    """Ocupación media por día de la semana y hora (UTC)"""
+    since, until = _history_range("day", desde, hasta)
+    return _history_response(estacionamiento_id, occupancy_history.weekly_profile(estacionamiento_id, since, until))
+
+@app.get("/detect/stats")
+async def detection_stats():
+    """Profundidad de cola y tiempos de espera del ejecutor de detección"""
+    return {
+        **detection_executor.stats(),
+        "batching": batch_scheduler.stats(),
+        "zone_cache": zone_index_cache.stats(),
+        "image_store": image_store.stats(),
+        "result_cache": result_cache.stats(),
+        "streams": stream_registry.stats(),
+        "motion_gate": motion_gate.stats(),
+        "zone_registry": zone_registry.stats(),
+        "camera_registry": camera_registry.stats(),
+        "scanner": occupancy_scanner.stats(),
+        "history": occupancy_history.stats(),
+        "persistence": occupancy_writer.stats(),
+        "process_pool": inference_pool.stats(),
+    }
 
 @app.get("/")
 async def root():
@@ -591,7 +482,10 @@ async def root():
 async def health_check():
     return {
         "status": "healthy",
-        "model_loaded": os.path.exists(model_path),
+        "model_loaded": registry.is_loaded,
+        "model": registry.stats(),
+        "inference": detection_executor.stats(),
+        "batching": batch_scheduler.stats(),
         "detection_mode": "any_object",
         "features": ["object_detection", "color_analysis", "dual_confirmation"]
     }
@@ -0,0 +1,218 @@
+# backend/model_registry.py
+"""
+Registro del modelo YOLO compartido por todo el proceso.
+
+Cada worker de uvicorn es un proceso distinto, así que cada uno tiene su
+propia instancia: se carga y fusiona una sola vez, se calienta con un frame
+vacío al arrancar FastAPI y después todos los handlers reciben el mismo objeto.
+
+Con ``thread_local=True`` cada hilo de inferencia obtiene su propia copia,
+ya que el predictor de ultralytics no es seguro entre hilos.
+
+``YOLO_BACKEND`` elige el motor de inferencia: ``torch`` (PyTorch), ``onnx``
+(ONNX Runtime) u ``openvino``. Para los dos últimos el .pt se exporta una sola
+vez y el artefacto queda cacheado junto al modelo (o en ``YOLO_EXPORT_DIR``);
+solo se vuelve a exportar si el .pt es más nuevo. Ultralytics carga cualquiera
+de los formatos y devuelve los mismos ``Results``, así que el post-proceso a
+``all_objects`` es idéntico. Requieren ``onnxruntime`` / ``openvino``.
+``onnx-int8`` usa la variante cuantizada de quantization.py (se calibra con
+las imágenes de estacionamientos si aún no existe).
+"""
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent
+MODEL_PATH = os.getenv("YOLO_MODEL_PATH", str(BASE_DIR / "yolo11n.pt"))
+
+# Tamaño del frame de calentamiento (mismo imgsz por defecto de YOLO)
+WARMUP_IMGSZ = int(os.getenv("YOLO_WARMUP_IMGSZ", "640"))
+
+# Motor de inferencia y dónde se guardan los modelos exportados
+INFERENCE_BACKEND = os.getenv("YOLO_BACKEND", "torch").lower()
+EXPORT_DIR = os.getenv("YOLO_EXPORT_DIR", "")
+EXPORT_IMGSZ = int(os.getenv("YOLO_EXPORT_IMGSZ", "640"))
+
+# Formato de exportación de ultralytics por backend
+BACKEND_FORMATS = {
+    "torch": None,
+    "onnx": "onnx",
+    "onnx-int8": "onnx",
+    "openvino": "openvino",
+}
+
+
+def export_artifact_path(model_path, backend):
+    """Ruta del artefacto exportado para ``backend`` (archivo o directorio)"""
+    model_path = Path(model_path)
+    base = Path(EXPORT_DIR) if EXPORT_DIR else model_path.parent
+    if backend == "onnx":
+        return base / f"{model_path.stem}.onnx"
+    if backend == "onnx-int8":
+        return base / f"{model_path.stem}_int8.onnx"
+    if backend == "openvino":
+        return base / f"{model_path.stem}_openvino_model"
+    return model_path
+
+
+def ensure_exported(model_path, backend, imgsz=EXPORT_IMGSZ):
+    """
+    Devuelve la ruta a cargar para ``backend``, exportando el .pt si el
+    artefacto no existe o es más viejo que el modelo.
+    """
+    if backend not in BACKEND_FORMATS:
+        raise ValueError(f"YOLO_BACKEND debe ser uno de {tuple(BACKEND_FORMATS)}")
+    if backend == "torch":
+        return str(model_path)
+
+    artifact = export_artifact_path(model_path, backend)
+    if artifact.exists() and artifact.stat().st_mtime_ns >= os.stat(model_path).st_mtime_ns:
+        return str(artifact)
+
+    if backend == "onnx-int8":
+        # Se cuantiza a partir del ONNX FP32 (exportado si hace falta)
+        from quantization import quantize_model
+        return quantize_model(ensure_exported(model_path, "onnx", imgsz), artifact)
+
+    from ultralytics import YOLO
+
+    print(f"⚠️ Exportando {model_path} a {backend} (solo la primera vez)...")
+    start = time.perf_counter()
+    # dynamic=True: admite lotes y el mismo letterbox rectangular que PyTorch
+    exported = Path(YOLO(str(model_path)).export(
+        format=BACKEND_FORMATS[backend], imgsz=imgsz, dynamic=True, half=False, verbose=False,
+    ))
+    if exported.resolve() != artifact.resolve():
+        artifact.parent.mkdir(parents=True, exist_ok=True)
+        if artifact.is_dir():
+            shutil.rmtree(artifact)
+        shutil.move(str(exported), str(artifact))
+    print(f"✓ Modelo exportado: {artifact} ({(time.perf_counter() - start) * 1000:.0f} ms)")
+    return str(artifact)
+
+
+def _mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+class ModelRegistry:
+    """Carga perezosa y thread-safe del modelo YOLO (uno por proceso o por hilo)"""
+
+    def __init__(self, model_path=MODEL_PATH, thread_local=False, backend=INFERENCE_BACKEND):
+        self.model_path = model_path
+        self.thread_local = thread_local
+        self.backend = backend
+        self.artifact_path = None
+        self._shared = SimpleNamespace(model=None, warmed=False)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.instances = 0
+        self.load_time_ms = None
+        self.warmup_ms = None
+        self.fused = False
+
+    def _slot(self):
+        if not self.thread_local:
+            return self._shared
+        if not hasattr(self._local, "model"):
+            self._local.model = None
+            self._local.warmed = False
+        return self._local
+
+    @property
+    def is_loaded(self):
+        return self.instances > 0
+
+    def exists(self):
+        return os.path.exists(self.model_path)
+
+    @property
+    def model_id(self):
+        """
+        Identifica el modelo cargado (nombre + mtime + backend) para claves de
+        caché. Con un backend exportado también cuenta el mtime del artefacto:
+        un ONNX o una cuantización regenerada cambia los resultados aunque el
+        .pt siga igual.
+        """
+        model_id = f"{os.path.basename(self.model_path)}:{_mtime_ns(self.model_path)}:{self.backend}"
+        if self.backend != "torch":
+            artifact = self.artifact_path or export_artifact_path(self.model_path, self.backend)
+            model_id += f":{_mtime_ns(artifact)}"
+        return model_id
+
+    def load(self):
+        """Carga el modelo si aún no está en memoria y lo devuelve"""
+        slot = self._slot()
+        if slot.model is not None:
+            return slot.model
+
+        with self._lock:
+            if slot.model is not None:
+                return slot.model
+
+            from ultralytics import YOLO
+
+            if self.artifact_path is None:
+                self.artifact_path = ensure_exported(self.model_path, self.backend)
+
+            start = time.perf_counter()
+            model = YOLO(self.artifact_path, task="detect")
+            if self.backend == "torch":
+                try:
+                    # Fusiona Conv+BN una sola vez; las llamadas siguientes ya no lo repiten
+                    model.fuse()
+                    self.fused = True
+                except Exception as e:
+                    print(f"⚠️ No se pudo fusionar el modelo: {e}")
+            self.load_time_ms = (time.perf_counter() - start) * 1000
+            self.instances += 1
+            slot.model = model
+            print(f"✓ Modelo cargado: {self.artifact_path} [{self.backend}] ({self.load_time_ms:.1f} ms)")
+            return slot.model
+
+    def get(self):
+        return self.load()
+
+    def warmup(self, imgsz=WARMUP_IMGSZ, **kwargs):
+        """Ejecuta una inferencia sobre un frame negro para inicializar el backend"""
+        model = self.load()
+        slot = self._slot()
+        if slot.warmed:
+            return self.warmup_ms
+        dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+        start = time.perf_counter()
+        model(dummy, verbose=False, **kwargs)
+        self.warmup_ms = (time.perf_counter() - start) * 1000
+        slot.warmed = True
+        print(f"✓ Warm-up del modelo completado ({self.warmup_ms:.1f} ms)")
+        return self.warmup_ms
+
+    def stats(self):
+        return {
+            "model_path": self.model_path,
+            "backend": self.backend,
+            "artifact_path": self.artifact_path,
+            "loaded": self.is_loaded,
+            "fused": self.fused,
+            "thread_local": self.thread_local,
+            "instances": self.instances,
+            "load_time_ms": round(self.load_time_ms, 1) if self.load_time_ms is not None else None,
+            "warmup_ms": round(self.warmup_ms, 1) if self.warmup_ms is not None else None,
+            "pid": os.getpid(),
+        }
+
+
+registry = ModelRegistry()
+
+
+def get_model():
+    """Devuelve la instancia del modelo para el proceso/hilo actual"""
+    return registry.get()
@@ -2,3 +2,4 @@ from .user import Usuario, RolEnum
 from .estacionamiento import Estacionamiento
 from .cajon import Cajon
 from .reserva import Reserva
+from .camara import Camara, CamaraZona
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey
+from sqlalchemy.orm import relationship
+from database import Base
+
+class Camara(Base):
+    __tablename__ = "camaras"
+
+    id = Column(Integer, primary_key=True, index=True)
+    estacionamiento_id = Column(Integer, ForeignKey("estacionamientos.id"), nullable=False, index=True)
+    nombre = Column(String(50), nullable=False)
+    imagen = Column(String, nullable=True)  # ruta del último frame; por defecto images/estacionamientos/{id}/{camara}.jpg
+    activo = Column(Boolean, default=True)
+
+    estacionamiento = relationship("Estacionamiento", back_populates="camaras")
+    zonas = relationship("CamaraZona", back_populates="camara", cascade="all, delete-orphan")
+
+class CamaraZona(Base):
+    """Polígono de un cajón visto desde una cámara concreta"""
+    __tablename__ = "camara_zonas"
+
+    id = Column(Integer, primary_key=True, index=True)
+    camara_id = Column(Integer, ForeignKey("camaras.id"), nullable=False, index=True)
+    cajon_id = Column(Integer, ForeignKey("cajones.id"), nullable=False)
+    coordenadas = Column(String, nullable=False)  # JSON con los puntos en coordenadas de esta cámara
+
+    camara = relationship("Camara", back_populates="zonas")
+    cajon = relationship("Cajon")
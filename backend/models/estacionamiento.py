@@ -22,4 +22,5 @@ class Estacionamiento(Base):
     cajones = relationship("Cajon", back_populates="estacionamiento")
     
     # AGREGAR ESTA RELACIÓN QUE FALTA:
-    reservas = relationship("Reserva", back_populates="estacionamiento")
\ No newline at end of file
+    reservas = relationship("Reserva", back_populates="estacionamiento")
+    camaras = relationship("Camara", back_populates="estacionamiento")
\ No newline at end of file
@@ -0,0 +1,226 @@
+# backend/motion_gate.py
+"""
+Compuerta de movimiento delante de la inferencia.
+
+Las cámaras de estacionamiento son fijas y la mayoría de los frames
+consecutivos solo difieren por ruido. Por cada cámara (o estacionamiento) se
+guarda un frame de referencia reducido en escala de grises; para cada frame
+nuevo se calcula con un solo ``absdiff`` y una imagen integral el cambio medio
+dentro de la ROI de cada zona. Si ninguna zona supera el umbral se reutiliza
+el último estado sin correr YOLO; si cambian algunas, YOLO corre solo sobre el
+recorte de esas zonas, que toman el estado nuevo, y las demás conservan el
+anterior.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+MOTION_GATE_ENABLED = os.getenv("MOTION_GATE_ENABLED", "1") == "1"
+# Ancho del frame de referencia reducido
+MOTION_GATE_WIDTH = int(os.getenv("MOTION_GATE_WIDTH", "160"))
+# Cambio medio (0-1) a partir del cual una zona se considera modificada
+MOTION_GATE_THRESHOLD = float(os.getenv("MOTION_GATE_THRESHOLD", "0.03"))
+# Cada cuántos segundos se fuerza una inferencia completa aunque no haya cambios
+MOTION_GATE_MAX_AGE = float(os.getenv("MOTION_GATE_MAX_AGE", "30"))
+# Cámaras recordadas por worker
+MOTION_GATE_MAX_KEYS = int(os.getenv("MOTION_GATE_MAX_KEYS", "64"))
+
+
+class GateDecision:
+    """Resultado de evaluar un frame: qué zonas cambiaron y si hay que inferir"""
+
+    __slots__ = ("mode", "reason", "scores", "changed", "frame_score", "small")
+
+    def __init__(self, mode, reason, scores, changed, frame_score, small):
+        self.mode = mode            # "full" | "partial" | "skip"
+        self.reason = reason
+        self.scores = scores
+        self.changed = changed      # índices de zonas que superan el umbral
+        self.frame_score = frame_score
+        self.small = small
+
+    @property
+    def skip(self):
+        return self.mode == "skip"
+
+    def as_full(self, reason):
+        """La misma decisión convertida en inferencia completa (sin estado anterior)"""
+        count = len(self.scores)
+        return GateDecision("full", reason, np.ones(count), list(range(count)), 1.0, self.small)
+
+    def to_dict(self):
+        return {
+            "mode": self.mode,
+            "reason": self.reason,
+            "frame_score": round(self.frame_score, 4),
+            "changed_zones": [int(i) + 1 for i in self.changed],
+            "max_zone_score": round(float(self.scores.max()), 4) if len(self.scores) else 0.0,
+        }
+
+
+class _CameraState:
+    __slots__ = ("reference", "shape", "zones_version", "rois", "result", "refreshed_at")
+
+    def __init__(self):
+        self.reference = None
+        self.shape = None
+        self.zones_version = None
+        self.rois = None
+        self.result = None
+        self.refreshed_at = 0.0
+
+
+class MotionGate:
+    """Referencia reducida y último estado de zonas por cámara, con LRU"""
+
+    def __init__(self, width=MOTION_GATE_WIDTH, threshold=MOTION_GATE_THRESHOLD,
+                 max_age=MOTION_GATE_MAX_AGE, max_keys=MOTION_GATE_MAX_KEYS,
+                 enabled=MOTION_GATE_ENABLED):
+        self.width = width
+        self.threshold = threshold
+        self.max_age = max_age
+        self.max_keys = max_keys
+        self.enabled = enabled
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.skipped = 0
+        self.partial = 0
+        self.full = 0
+        self.zones_checked = 0
+        self.zones_changed = 0
+
+    def _state(self, key):
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = _CameraState()
+                self._states[key] = state
+                while len(self._states) > self.max_keys:
+                    self._states.popitem(last=False)
+            else:
+                self._states.move_to_end(key)
+            return state
+
+    def _downscale(self, image):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        height, width = gray.shape[:2]
+        if width <= self.width:
+            return gray, 1.0
+        scale = self.width / width
+        small = cv2.resize(gray, (self.width, max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+        return small, scale
+
+    @staticmethod
+    def _scaled_rois(zone_index, scale, small_shape):
+        """ROIs de las zonas en coordenadas del frame reducido (Z, 4), al menos 1 px"""
+        rois = np.array([zone.roi for zone in zone_index], dtype=np.float64).reshape(-1, 4)
+        height, width = small_shape[:2]
+        x1 = np.clip(np.floor(rois[:, 0] * scale), 0, width - 1)
+        y1 = np.clip(np.floor(rois[:, 1] * scale), 0, height - 1)
+        x2 = np.clip(np.maximum(np.ceil(rois[:, 2] * scale), x1 + 1), 1, width)
+        y2 = np.clip(np.maximum(np.ceil(rois[:, 3] * scale), y1 + 1), 1, height)
+        return np.stack([x1, y1, x2, y2], axis=1).astype(np.intp)
+
+    @staticmethod
+    def zone_scores(reference, small, rois):
+        """Cambio medio normalizado (0-1) dentro de cada ROI, vectorizado con imagen integral"""
+        diff = cv2.absdiff(reference, small)
+        integral = cv2.integral(diff, sdepth=cv2.CV_64F)
+        x1, y1, x2, y2 = rois.T
+        sums = integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+        areas = (x2 - x1) * (y2 - y1)
+        return sums / (areas * 255.0), float(diff.mean()) / 255.0
+
+    def evaluate(self, key, image, zone_index):
+        """Decide si el frame necesita inferencia completa, parcial o ninguna"""
+        small, scale = self._downscale(image)
+        state = self._state(key)
+        zone_count = len(zone_index)
+
+        reason = None
+        if state.reference is None or state.result is None:
+            reason = "sin_referencia"
+        elif state.shape != image.shape[:2] or state.zones_version != zone_index.version:
+            reason = "configuracion_cambiada"
+        elif self.max_age > 0 and time.monotonic() - state.refreshed_at > self.max_age:
+            reason = "referencia_vencida"
+
+        if reason is not None:
+            self._count("full", zone_count, zone_count)
+            return GateDecision("full", reason, np.ones(zone_count), list(range(zone_count)), 1.0, small)
+
+        scores, frame_score = self.zone_scores(state.reference, small, state.rois)
+        changed = np.flatnonzero(scores > self.threshold).tolist()
+        if not changed:
+            self._count("skip", zone_count, 0)
+            return GateDecision("skip", "sin_cambios", scores, changed, frame_score, small)
+        self._count("partial", zone_count, len(changed))
+        return GateDecision("partial", "zonas_cambiadas", scores, changed, frame_score, small)
+
+    def _count(self, mode, checked, changed):
+        with self._lock:
+            self.frames += 1
+            if mode == "full":
+                self.full += 1
+            elif mode == "skip":
+                self.skipped += 1
+            else:
+                self.partial += 1
+            self.zones_checked += checked
+            self.zones_changed += changed
+
+    def previous(self, key):
+        """Último resultado guardado para la cámara"""
+        return self._state(key).result
+
+    def commit(self, key, decision, image_shape, zone_index, result):
+        """
+        Guarda el resultado y actualiza la referencia: completa tras una
+        inferencia completa, solo en las ROIs cambiadas tras una parcial.
+        """
+        state = self._state(key)
+        if decision.mode == "full":
+            state.reference = decision.small
+            state.rois = self._scaled_rois(zone_index, decision.small.shape[1] / image_shape[1], decision.small.shape)
+            state.shape = image_shape[:2]
+            state.zones_version = zone_index.version
+            state.refreshed_at = time.monotonic()
+        elif decision.mode == "partial" and state.reference is not None:
+            # Sin referencia (reset o LRU desde evaluate) la próxima evaluación es completa
+            reference = state.reference.copy()
+            for i in decision.changed:
+                x1, y1, x2, y2 = state.rois[i]
+                reference[y1:y2, x1:x2] = decision.small[y1:y2, x1:x2]
+            state.reference = reference
+        state.result = result
+
+    def reset(self, key=None):
+        with self._lock:
+            if key is None:
+                self._states.clear()
+            else:
+                self._states.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "threshold": self.threshold,
+                "width": self.width,
+                "max_age_s": self.max_age,
+                "cameras": len(self._states),
+                "frames": self.frames,
+                "skipped": self.skipped,
+                "partial": self.partial,
+                "full": self.full,
+                "skip_ratio": round(self.skipped / self.frames, 3) if self.frames else 0.0,
+                "zone_skip_ratio": round(1 - self.zones_changed / self.zones_checked, 3) if self.zones_checked else 0.0,
+            }
+
+
+motion_gate = MotionGate()
@@ -0,0 +1,436 @@
+# backend/occupancy_history.py
+"""
+Historial de ocupación por estacionamiento.
+
+Cada detección de un estacionamiento agrega una muestra: su timestamp y el
+estado de las zonas empaquetado en bits (``np.packbits``: 1 bit por cajón).
+Las muestras van a un buffer circular por estacionamiento, de tamaño fijo.
+
+Un hilo en segundo plano consolida las muestras nuevas en agregados por
+minuto, hora y día, ponderados por tiempo. Cada muestra pesa lo que dura
+hasta la siguiente, con un tope de ``OCCUPANCY_HISTORY_MAX_GAP``, así que
+una cámara a 5 fps no pesa más que el escáner cada 30 s. Cada muestra cae
+entera en el bucket donde empieza.
+
+Cada ``OCCUPANCY_HISTORY_FLUSH`` segundos se escribe a disco, en
+``OCCUPANCY_HISTORY_DIR/<id>/``:
+- un segmento ``raw-<ts>.npz`` de solo anexado con las muestras consolidadas;
+- ``rollups.npz``, que se reemplaza completo.
+
+Las consultas de historial y heatmap leen solo los agregados, nunca las
+muestras crudas.
+"""
+import datetime
+import glob
+import os
+import threading
+import time
+
+import numpy as np
+
+OCCUPANCY_HISTORY_ENABLED = os.getenv("OCCUPANCY_HISTORY_ENABLED", "1") == "1"
+OCCUPANCY_HISTORY_DIR = os.getenv("OCCUPANCY_HISTORY_DIR", os.path.join("data", "occupancy"))
+# Muestras crudas en memoria por estacionamiento
+OCCUPANCY_HISTORY_CAPACITY = int(os.getenv("OCCUPANCY_HISTORY_CAPACITY", "4096"))
+# Segundos entre consolidaciones y entre escrituras a disco
+OCCUPANCY_HISTORY_ROLLUP = float(os.getenv("OCCUPANCY_HISTORY_ROLLUP", "10"))
+OCCUPANCY_HISTORY_FLUSH = float(os.getenv("OCCUPANCY_HISTORY_FLUSH", "60"))
+# Peso máximo de una muestra (sin detecciones el estado se considera desconocido)
+OCCUPANCY_HISTORY_MAX_GAP = float(os.getenv("OCCUPANCY_HISTORY_MAX_GAP", "300"))
+# Días que se conservan los segmentos crudos en disco
+OCCUPANCY_HISTORY_RAW_DAYS = float(os.getenv("OCCUPANCY_HISTORY_RAW_DAYS", "7"))
+
+# Nivel -> (tamaño del bucket, retención) en segundos
+LEVELS = {
+    "minute": (60, 2 * 86400),
+    "hour": (3600, 90 * 86400),
+    "day": (86400, 3 * 365 * 86400),
+}
+
+
+def zone_layout(zones):
+    """Identidad de cada zona: el id del cajón si lo tiene, si no su número"""
+    return tuple(int(z["cajon_id"]) if z.get("cajon_id") is not None else -int(z["id"]) for z in zones)
+
+
+def _iso(ts):
+    return datetime.datetime.utcfromtimestamp(ts).isoformat() + "Z"
+
+
+class Rollup:
+    """Buckets de un nivel: segundos observados y segundos ocupados por zona"""
+
+    def __init__(self, size, retention, zones):
+        self.size = size
+        self.retention = retention
+        self.zones = zones
+        self.buckets = {}  # inicio -> [segundos, ndarray(Z) segundos ocupados]
+
+    def add(self, starts, weights, occupied):
+        """Suma un bloque de muestras (inicio, peso, estados 0/1 por zona)"""
+        keys = (starts // self.size) * self.size
+        unique, inverse = np.unique(keys, return_inverse=True)
+        seconds = np.bincount(inverse, weights=weights, minlength=len(unique))
+        per_zone = np.zeros((len(unique), self.zones), dtype=np.float64)
+        np.add.at(per_zone, inverse, occupied * weights[:, None])
+        for key, secs, occ in zip(unique.tolist(), seconds, per_zone):
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                self.buckets[key] = [float(secs), occ]
+            else:
+                bucket[0] += float(secs)
+                bucket[1] += occ
+        cutoff = unique[-1] - self.retention if len(unique) else None
+        if cutoff is not None:
+            for key in [k for k in self.buckets if k < cutoff]:
+                del self.buckets[key]
+
+    def select(self, since=None, until=None):
+        keys = sorted(k for k in self.buckets
+                      if (since is None or k + self.size > since) and (until is None or k < until))
+        return keys, [self.buckets[k] for k in keys]
+
+    def to_arrays(self):
+        keys = sorted(self.buckets)
+        seconds = np.asarray([self.buckets[k][0] for k in keys], dtype=np.float64)
+        occupied = (np.stack([self.buckets[k][1] for k in keys]) if keys
+                    else np.zeros((0, self.zones))).astype(np.float32)
+        return np.asarray(keys, dtype=np.int64), seconds, occupied
+
+    def load_arrays(self, keys, seconds, occupied):
+        self.buckets = {int(k): [float(s), o.astype(np.float64)] for k, s, o in zip(keys, seconds, occupied)}
+
+
+class LotSeries:
+    """Buffer circular de muestras de un estacionamiento y sus agregados"""
+
+    def __init__(self, layout, capacity=OCCUPANCY_HISTORY_CAPACITY):
+        self.layout = layout
+        self.zones = len(layout)
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.states = np.zeros((capacity, (self.zones + 7) // 8), dtype=np.uint8)
+        self.total = 0        # muestras agregadas desde el inicio
+        self.rolled = 0       # muestras ya consolidadas
+        self.dropped = 0      # muestras pisadas antes de consolidarse
+        self.rollups = {name: Rollup(size, retention, self.zones) for name, (size, retention) in LEVELS.items()}
+        self.pending = []     # bloques consolidados aún no escritos a disco
+        self.dirty = False
+
+    def append(self, ts, occupied):
+        slot = self.total % self.capacity
+        self.timestamps[slot] = ts
+        self.states[slot] = np.packbits(np.asarray(occupied, dtype=np.uint8))
+        self.total += 1
+
+    def roll(self, max_gap=OCCUPANCY_HISTORY_MAX_GAP):
+        """Consolida las muestras que ya tienen sucesora (la última sigue abierta)"""
+        if self.total - self.rolled > self.capacity:
+            self.dropped += self.total - self.rolled - self.capacity
+            self.rolled = self.total - self.capacity
+        if self.total - self.rolled < 2:
+            return 0
+
+        slots = np.arange(self.rolled, self.total) % self.capacity
+        ts = self.timestamps[slots]
+        packed = self.states[slots]
+        weights = np.clip(np.diff(ts), 0, max_gap)
+        occupied = np.unpackbits(packed[:-1], axis=1, count=self.zones).astype(np.float64)
+        for rollup in self.rollups.values():
+            rollup.add(ts[:-1], weights, occupied)
+
+        self.pending.append((ts[:-1].copy(), packed[:-1].copy()))
+        self.rolled = self.total - 1
+        self.dirty = True
+        return len(weights)
+
+
+class OccupancyHistory:
+    """Series por estacionamiento, consolidación en segundo plano y consultas"""
+
+    def __init__(self, directory=OCCUPANCY_HISTORY_DIR, enabled=OCCUPANCY_HISTORY_ENABLED,
+                 capacity=OCCUPANCY_HISTORY_CAPACITY):
+        self.directory = directory
+        self.enabled = enabled
+        self.capacity = capacity
+        self._series = {}
+        self._archive = []   # (estacionamiento_id, serie) reemplazadas, pendientes de archivar
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.samples = 0
+        self.rolled = 0
+        self.flushes = 0
+        self.errors = 0
+        self.last_rollup_ms = None
+
+    # --- Escritura ---
+
+    def record(self, estacionamiento_id, zones, ts=None):
+        """
+        Agrega el estado de las zonas (``zone_details`` o snapshot) de un
+        estacionamiento. Solo toca memoria: se llama desde las peticiones.
+        """
+        if not self.enabled or not zones:
+            return
+        layout = zone_layout(zones)
+        occupied = [bool(z["occupied"]) for z in zones]
+        with self._lock:
+            series = self._get_series(estacionamiento_id, layout, load=False)
+            series.append(time.time() if ts is None else ts, occupied)
+            self.samples += 1
+
+    def _get_series(self, estacionamiento_id, layout=None, load=True):
+        series = self._series.get(estacionamiento_id)
+        if series is None and load:
+            series = self._load(estacionamiento_id)
+        if layout is not None and (series is None or series.layout != layout):
+            if series is not None:
+                # Cambiaron los cajones: el historial anterior no es comparable.
+                # Se guarda y se archiva en el hilo de escritura
+                print(f"⚠️ Historial de ocupación del estacionamiento {estacionamiento_id}: "
+                      f"cambiaron las zonas ({series.zones} -> {len(layout)}), se reinicia")
+                self._archive.append((estacionamiento_id, series))
+            series = LotSeries(layout, self.capacity)
+        if series is not None:
+            self._series[estacionamiento_id] = series
+        return series
+
+    # --- Consolidación y disco ---
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._preload()
+        self._thread = threading.Thread(target=self._loop, name="occupancy-history", daemon=True)
+        self._thread.start()
+        print(f"✓ Historial de ocupación iniciado ({self.directory})")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self.enabled:
+            self.roll_all()
+            self.flush()
+
+    def _loop(self):
+        last_flush = time.monotonic()
+        while not self._stop.wait(OCCUPANCY_HISTORY_ROLLUP):
+            try:
+                self.roll_all()
+                if time.monotonic() - last_flush >= OCCUPANCY_HISTORY_FLUSH:
+                    self.flush()
+                    last_flush = time.monotonic()
+            except Exception as e:
+                self.errors += 1
+                print(f"⚠️ Historial de ocupación: {e}")
+
+    def roll_all(self):
+        start = time.perf_counter()
+        with self._lock:
+            for series in self._series.values():
+                self.rolled += series.roll()
+        self.last_rollup_ms = (time.perf_counter() - start) * 1000
+
+    def _preload(self):
+        """Carga los agregados guardados para que ``record`` no lea de disco"""
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if not name.isdigit():
+                continue
+            series = self._load(int(name))
+            if series is not None:
+                with self._lock:
+                    self._series.setdefault(int(name), series)
+
+    def flush(self):
+        """Escribe a disco lo consolidado; el lock solo se toma para copiar el estado"""
+        with self._lock:
+            archives, self._archive = self._archive, []
+            archived = [(lot, s, self._snapshot(s)) for lot, s in archives]
+            dirty = [(lot, s, self._snapshot(s)) for lot, s in self._series.items() if s.dirty]
+
+        # Las series reemplazadas primero: su rollups.npz se renombra antes de
+        # que la serie nueva escriba el suyo
+        retry = set()
+        for estacionamiento_id, series, snapshot in archived:
+            if not self._write_snapshot(estacionamiento_id, series, snapshot):
+                retry.add(estacionamiento_id)
+                with self._lock:
+                    self._archive.append((estacionamiento_id, series))
+                continue
+            lot_dir = self._lot_dir(estacionamiento_id)
+            try:
+                os.replace(os.path.join(lot_dir, "rollups.npz"),
+                           os.path.join(lot_dir, f"rollups-{int(time.time())}.npz"))
+            except FileNotFoundError:
+                pass
+        for estacionamiento_id, series, snapshot in dirty:
+            if estacionamiento_id in retry:
+                # Sin archivar la serie anterior no se pisa su rollups.npz
+                self._restore(series, snapshot[0])
+                continue
+            self._write_snapshot(estacionamiento_id, series, snapshot)
+        if archived or dirty:
+            self.flushes += 1
+
+    def _lot_dir(self, estacionamiento_id):
+        return os.path.join(self.directory, str(estacionamiento_id))
+
+    @staticmethod
+    def _snapshot(series):
+        """Copia (con el lock tomado) lo que hay que escribir de una serie"""
+        raw = None
+        if series.pending:
+            raw = (np.concatenate([chunk[0] for chunk in series.pending]),
+                   np.concatenate([chunk[1] for chunk in series.pending]))
+            series.pending = []
+        arrays = {"layout": np.asarray(series.layout, dtype=np.int64)}
+        for name, rollup in series.rollups.items():
+            keys, seconds, occupied = rollup.to_arrays()
+            arrays[f"{name}_starts"] = keys
+            arrays[f"{name}_seconds"] = seconds
+            arrays[f"{name}_occupied"] = occupied
+        series.dirty = False
+        return raw, arrays
+
+    def _restore(self, series, raw):
+        """Devuelve a la serie lo que no se pudo escribir"""
+        with self._lock:
+            if raw is not None:
+                series.pending.insert(0, raw)
+            series.dirty = True
+
+    def _write_snapshot(self, estacionamiento_id, series, snapshot):
+        raw, arrays = snapshot
+        lot_dir = self._lot_dir(estacionamiento_id)
+        try:
+            os.makedirs(lot_dir, exist_ok=True)
+            if raw is not None:
+                ts, packed = raw
+                np.savez(os.path.join(lot_dir, f"raw-{int(ts[0] * 1000)}.npz"),
+                         timestamps=ts, states=packed, layout=arrays["layout"])
+                raw = None
+            tmp = os.path.join(lot_dir, "rollups.tmp.npz")
+            np.savez(tmp, **arrays)
+            os.replace(tmp, os.path.join(lot_dir, "rollups.npz"))
+        except OSError as e:
+            # Se reintenta en la próxima escritura
+            self._restore(series, raw)
+            self.errors += 1
+            print(f"⚠️ No se pudo guardar el historial del estacionamiento {estacionamiento_id}: {e}")
+            return False
+
+        cutoff = (time.time() - OCCUPANCY_HISTORY_RAW_DAYS * 86400) * 1000
+        for path in glob.glob(os.path.join(lot_dir, "raw-*.npz")):
+            try:
+                if int(os.path.basename(path)[4:-4]) < cutoff:
+                    os.remove(path)
+            except (ValueError, OSError):
+                pass
+        return True
+
+    def _load(self, estacionamiento_id):
+        """Agregados guardados de un estacionamiento (None si no hay)"""
+        path = os.path.join(self._lot_dir(estacionamiento_id), "rollups.npz")
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                series = LotSeries(tuple(int(v) for v in data["layout"]), self.capacity)
+                for name, rollup in series.rollups.items():
+                    rollup.load_arrays(data[f"{name}_starts"], data[f"{name}_seconds"], data[f"{name}_occupied"])
+        except (OSError, KeyError, ValueError) as e:
+            self.errors += 1
+            print(f"⚠️ Historial de ocupación del estacionamiento {estacionamiento_id} ilegible: {e}")
+            return None
+        return series
+
+    # --- Consultas ---
+
+    def _rollup(self, estacionamiento_id, level):
+        if level not in LEVELS:
+            raise ValueError(f"nivel debe ser uno de {tuple(LEVELS)}")
+        with self._lock:
+            series = self._get_series(estacionamiento_id)
+        return series, (series.rollups[level] if series is not None else None)
+
+    def history(self, estacionamiento_id, level="hour", since=None, until=None):
+        """Tasa de ocupación por bucket entre ``since`` y ``until`` (epoch s)"""
+        series, rollup = self._rollup(estacionamiento_id, level)
+        if rollup is None:
+            return None
+        with self._lock:
+            keys, buckets = rollup.select(since, until)
+            points = []
+            for key, (seconds, occupied) in zip(keys, buckets):
+                rate = float(occupied.sum()) / (seconds * series.zones) if seconds > 0 else None
+                points.append({
+                    "t": _iso(key),
+                    "occupancy_rate": round(rate * 100, 1) if rate is not None else None,
+                    "occupied_avg": round(rate * series.zones, 2) if rate is not None else None,
+                    "observed_s": round(seconds, 1),
+                })
+        return {"estacionamiento_id": estacionamiento_id, "level": level, "zones": series.zones, "points": points}
+
+    def heatmap(self, estacionamiento_id, level="hour", since=None, until=None):
+        """Matriz zona × bucket con la fracción de tiempo ocupada de cada cajón"""
+        series, rollup = self._rollup(estacionamiento_id, level)
+        if rollup is None:
+            return None
+        with self._lock:
+            keys, buckets = rollup.select(since, until)
+            rates = [
+                [round(float(v), 3) for v in (occupied / seconds if seconds > 0 else np.zeros(series.zones))]
+                for seconds, occupied in buckets
+            ]
+        return {
+            "estacionamiento_id": estacionamiento_id,
+            "level": level,
+            "zones": [{"cajon_id": z} if z >= 0 else {"id": -z} for z in series.layout],
+            "buckets": [_iso(k) for k in keys],
+            # rates[bucket][zona]
+            "rates": rates,
+        }
+
+    def weekly_profile(self, estacionamiento_id, since=None, until=None):
+        """Ocupación media por día de la semana (lunes=0) y hora UTC, a partir de los agregados por hora"""
+        series, rollup = self._rollup(estacionamiento_id, "hour")
+        if rollup is None:
+            return None
+        seconds = np.zeros((7, 24))
+        occupied = np.zeros((7, 24))
+        with self._lock:
+            keys, buckets = rollup.select(since, until)
+            for key, (secs, occ) in zip(keys, buckets):
+                moment = datetime.datetime.utcfromtimestamp(key)
+                seconds[moment.weekday(), moment.hour] += secs
+                occupied[moment.weekday(), moment.hour] += occ.sum()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rates = np.where(seconds > 0, occupied / (seconds * series.zones) * 100, np.nan)
+        return {
+            "estacionamiento_id": estacionamiento_id,
+            # rates[día][hora], None donde no hubo observaciones
+            "rates": [[None if np.isnan(v) else round(float(v), 1) for v in row] for row in rates],
+        }
+
+    def stats(self):
+        with self._lock:
+            lots = len(self._series)
+            pending = sum(s.total - s.rolled for s in self._series.values())
+            dropped = sum(s.dropped for s in self._series.values())
+        return {
+            "enabled": self.enabled,
+            "lots": lots,
+            "samples": self.samples,
+            "rolled": self.rolled,
+            "pending": pending,
+            "dropped": dropped,
+            "flushes": self.flushes,
+            "errors": self.errors,
+            "last_rollup_ms": round(self.last_rollup_ms, 2) if self.last_rollup_ms is not None else None,
+        }
@@ -0,0 +1,136 @@
+# backend/occupancy_merge.py
+"""
+Fusión de la ocupación de varias cámaras de un mismo estacionamiento.
+
+Cada cámara vota por los cajones que ve (sus zonas traen ``cajon_id``). Las
+vistas se solapan, así que un cajón puede tener varios votos:
+
+- ``majority`` (por defecto): ocupado si más de la mitad de las cámaras que
+  lo ven lo ven ocupado. En empate decide la detección ocupada de mayor
+  confianza (>= ``MULTICAM_TIE_CONFIDENCE``): una cámara con el auto de
+  frente pesa más que otra que solo ve el cajón de reojo.
+- ``any``: ocupado si alguna cámara lo ve ocupado (más conservador, nunca
+  ofrece un cajón que alguna cámara ve tomado).
+
+El resultado tiene la misma forma que la respuesta de una sola imagen, con
+un cajón por zona y el detalle por cámara en ``cameras``.
+"""
+import hashlib
+import os
+
+# majority | any
+MULTICAM_MERGE_RULE = os.getenv("MULTICAM_MERGE_RULE", "majority")
+MULTICAM_TIE_CONFIDENCE = float(os.getenv("MULTICAM_TIE_CONFIDENCE", "0.5"))
+
+MERGE_RULES = ("majority", "any")
+
+
+def merge_votes(votes, rule=MULTICAM_MERGE_RULE, tie_confidence=MULTICAM_TIE_CONFIDENCE):
+    """Decide un cajón a partir de los ``zone_details`` de cada cámara que lo ve"""
+    occupied_votes = [v for v in votes if v["occupied"]]
+    if rule == "any":
+        occupied = bool(occupied_votes)
+    elif 2 * len(occupied_votes) != len(votes):
+        occupied = 2 * len(occupied_votes) > len(votes)
+    else:
+        occupied = max(v["confidence"] for v in occupied_votes) >= tie_confidence
+
+    # El detalle sale de la cámara más segura del lado ganador
+    side = occupied_votes if occupied else [v for v in votes if not v["occupied"]]
+    best = max(side, key=lambda v: v["confidence"]) if side else votes[0]
+    return {
+        "occupied": occupied,
+        "confidence": float(best["confidence"]),
+        "detection_method": best["detection_method"],
+        "overlap_percentage": float(best.get("overlap_percentage", 0.0)),
+        "color_confidence": float(best.get("color_confidence", 0.0)),
+        "votes": {"occupied": len(occupied_votes), "total": len(votes)},
+        "cameras": [v["camara_id"] for v in votes],
+    }
+
+
+def _camera_summary(camera, response):
+    summary = {"camara_id": camera.camara_id, "nombre": camera.nombre}
+    if response is None or not response.get("success", True) or "statistics" not in response:
+        summary.update(success=False, error=(response or {}).get("error", "Sin respuesta"))
+        return summary
+    summary.update(
+        success=True,
+        total=response["total"],
+        occupied=response["occupied"],
+        cache=response["detection_info"].get("cache"),
+        image_id=response.get("image_id"),
+        image_url=response.get("image_url"),
+    )
+    return summary
+
+
+def merge_camera_responses(cameras, responses, extra=None, rule=MULTICAM_MERGE_RULE):
+    """
+    Respuesta de estacionamiento a partir de la respuesta de cada cámara
+    (en el mismo orden que ``cameras``).
+    """
+    if rule not in MERGE_RULES:
+        raise ValueError(f"MULTICAM_MERGE_RULE debe ser uno de {MERGE_RULES}")
+
+    votes = {}
+    numeros = {}
+    ok = []
+    for camera, response in zip(cameras, responses):
+        if response is None or not response.get("success", True) or "zones" not in response:
+            continue
+        ok.append(response)
+        for zone in response["zones"]:
+            if zone.get("cajon_id") is None:
+                continue
+            votes.setdefault(zone["cajon_id"], []).append({**zone, "camara_id": camera.camara_id})
+            numeros[zone["cajon_id"]] = zone.get("numero_cajon")
+
+    camera_summaries = [_camera_summary(c, r) for c, r in zip(cameras, responses)]
+    if not ok:
+        return {"success": False, "error": "Ninguna cámara del estacionamiento respondió",
+                **(extra or {}), "cameras": camera_summaries}
+
+    zones = []
+    for i, cajon_id in enumerate(sorted(votes)):
+        zones.append({"id": i + 1, "cajon_id": cajon_id, "numero_cajon": numeros[cajon_id],
+                      **merge_votes(votes[cajon_id], rule)})
+
+    total = len(zones)
+    occupied = sum(1 for z in zones if z["occupied"])
+    stats = {
+        "total": total,
+        "occupied": occupied,
+        "available": total - occupied,
+        "occupancy_rate": round(occupied / total * 100, 1) if total else 0,
+    }
+    caches = {r["detection_info"].get("cache") for r in ok}
+    # El estado fusionado es nuevo si cambió el frame de alguna cámara
+    frame_ids = [r["detection_info"].get("frame_id") for r in ok]
+    frame_id = None if None in frame_ids else hashlib.sha1("+".join(frame_ids).encode("utf-8")).hexdigest()[:16]
+    first_image = next((r for r in ok if r.get("image_id")), {})
+
+    response = {"success": True}
+    response.update(extra or {})
+    response.update({
+        "image_id": first_image.get("image_id"),
+        "image_url": first_image.get("image_url"),
+        "image_annotated": first_image.get("image_annotated"),
+        **stats,
+        "statistics": dict(stats),
+        "detection_info": {
+            "objects_detected": sum(r["detection_info"]["objects_detected"] for r in ok),
+            "color_analysis_zones": sum(r["detection_info"]["color_analysis_zones"] for r in ok),
+            "detection_method": "multi_camera",
+            "merge_rule": rule,
+            "cameras": len(cameras),
+            "cameras_ok": len(ok),
+            "cache": caches.pop() if len(caches) == 1 else "partial",
+            "frame_id": frame_id,
+            # Las cámaras se infieren en un mismo lote: manda la más lenta
+            "timings_ms": {"total": max(r["detection_info"]["timings_ms"].get("total", 0) for r in ok)},
+        },
+        "zones": zones,
+        "cameras": camera_summaries,
+    })
+    return response
@@ -0,0 +1,179 @@
+# backend/occupancy_scanner.py
+"""
+Escaneo de ocupación en segundo plano.
+
+Un hilo recorre los estacionamientos activos cada ``OCCUPANCY_SCAN_INTERVAL``
+segundos, corre la detección de cada uno en el ejecutor de detección (solo
+cuando hay un slot libre, las peticiones tienen prioridad) y guarda el último
+estado de zonas en memoria. Leer la ocupación de un estacionamiento es una
+búsqueda en un dict, sin importar cuántos usuarios la estén viendo.
+
+``OCCUPANCY_SCAN_BUDGET`` es la fracción de tiempo que el escáner puede
+ocupar: después de cada detección espera lo necesario para no superarla.
+Con ``history`` cada estado registrado también se agrega al historial
+(ver occupancy_history.py) y con ``writer`` se persiste en la base
+(ver occupancy_writer.py).
+"""
+import datetime
+import os
+import threading
+import time
+
+from inference_executor import DetectionBusyError
+
+OCCUPANCY_SCAN_ENABLED = os.getenv("OCCUPANCY_SCAN_ENABLED", "1") == "1"
+# Segundos entre dos pasadas por el mismo estacionamiento
+OCCUPANCY_SCAN_INTERVAL = float(os.getenv("OCCUPANCY_SCAN_INTERVAL", "30"))
+# Fracción máxima del tiempo dedicada a escanear (0-1]
+OCCUPANCY_SCAN_BUDGET = float(os.getenv("OCCUPANCY_SCAN_BUDGET", "0.25"))
+
+
+def snapshot_from_response(estacionamiento_id, response, source="scanner"):
+    """Estado compacto de un estacionamiento a partir de una respuesta de detección"""
+    return {
+        "estacionamiento_id": estacionamiento_id,
+        "total": response["total"],
+        "occupied": response["occupied"],
+        "available": response["available"],
+        "occupancy_rate": response["occupancy_rate"],
+        "zones": [
+            {key: zone[key] for key in ("id", "cajon_id", "numero_cajon", "occupied") if key in zone}
+            for zone in response.get("zones", [])
+        ],
+        "source": source,
+        "updated_at": datetime.datetime.utcnow().isoformat() + "Z",
+        "_monotonic": time.monotonic(),
+    }
+
+
+class OccupancyScanner:
+    """
+    ``lots_fn()`` devuelve los ids de los estacionamientos a escanear y
+    ``detect_fn(id)`` la respuesta de detección de uno (o None si no hay
+    imagen). Ambos los provee main.py.
+    """
+
+    def __init__(self, executor, interval=OCCUPANCY_SCAN_INTERVAL, budget=OCCUPANCY_SCAN_BUDGET,
+                 enabled=OCCUPANCY_SCAN_ENABLED, history=None, writer=None):
+        self.executor = executor
+        self.history = history
+        self.writer = writer
+        self.interval = max(1.0, interval)
+        self.budget = min(1.0, max(0.01, budget))
+        self.enabled = enabled
+        self._snapshots = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lots_fn = None
+        self._detect_fn = None
+        self.cycles = 0
+        self.scans = 0
+        self.busy_skips = 0
+        self.errors = 0
+        self.last_cycle_ms = None
+        self._busy_s = 0.0
+        self._started_at = None
+
+    def start(self, lots_fn, detect_fn):
+        if not self.enabled or self._thread is not None:
+            return
+        self._lots_fn = lots_fn
+        self._detect_fn = detect_fn
+        self._stop.clear()
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._loop, name="occupancy-scanner", daemon=True)
+        self._thread.start()
+        print(f"✓ Escáner de ocupación iniciado (cada {self.interval:.0f} s, presupuesto {self.budget:.0%})")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            cycle_start = time.monotonic()
+            try:
+                lot_ids = list(self._lots_fn())
+            except Exception as e:
+                self.errors += 1
+                print(f"⚠️ Escáner de ocupación: no se pudieron listar los estacionamientos: {e}")
+                lot_ids = []
+
+            for estacionamiento_id in lot_ids:
+                if self._stop.is_set():
+                    return
+                elapsed = self.scan_one(estacionamiento_id)
+                # Respeta el presupuesto: por cada segundo de trabajo descansa (1-b)/b
+                if elapsed:
+                    self._stop.wait(elapsed * (1 - self.budget) / self.budget)
+
+            self.cycles += 1
+            self.last_cycle_ms = (time.monotonic() - cycle_start) * 1000
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - cycle_start)))
+
+    def scan_one(self, estacionamiento_id):
+        """Escanea un estacionamiento; devuelve los segundos de trabajo usados"""
+        start = time.monotonic()
+        try:
+            response = self.executor.run_blocking(self._detect_fn, estacionamiento_id, idle_only=True)
+        except DetectionBusyError:
+            self.busy_skips += 1
+            return 0.0
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠️ Escáner de ocupación: error en estacionamiento {estacionamiento_id}: {e}")
+            return time.monotonic() - start
+        elapsed = time.monotonic() - start
+        self._busy_s += elapsed
+        self.scans += 1
+        if response is not None and response.get("success", True):
+            self.record(estacionamiento_id, response, source="scanner")
+        return elapsed
+
+    def record(self, estacionamiento_id, response, source="request"):
+        """Guarda el estado de un estacionamiento (también desde las peticiones de detección)"""
+        snapshot = snapshot_from_response(estacionamiento_id, response, source)
+        with self._lock:
+            self._snapshots[estacionamiento_id] = snapshot
+        if self.history is not None:
+            self.history.record(estacionamiento_id, snapshot["zones"])
+        if self.writer is not None:
+            frame_id = response.get("detection_info", {}).get("frame_id")
+            self.writer.record(estacionamiento_id, snapshot["zones"], frame_id=frame_id)
+
+    def get(self, estacionamiento_id):
+        with self._lock:
+            snapshot = self._snapshots.get(estacionamiento_id)
+        return self._public(snapshot) if snapshot is not None else None
+
+    def all(self):
+        with self._lock:
+            snapshots = list(self._snapshots.values())
+        return [self._public(s) for s in snapshots]
+
+    @staticmethod
+    def _public(snapshot):
+        result = {k: v for k, v in snapshot.items() if not k.startswith("_")}
+        result["age_s"] = round(time.monotonic() - snapshot["_monotonic"], 1)
+        return result
+
+    def stats(self):
+        uptime = time.monotonic() - self._started_at if self._started_at else 0.0
+        with self._lock:
+            lots = len(self._snapshots)
+        return {
+            "enabled": self.enabled,
+            "running": self._thread is not None,
+            "interval_s": self.interval,
+            "budget": self.budget,
+            "lots": lots,
+            "cycles": self.cycles,
+            "scans": self.scans,
+            "busy_skips": self.busy_skips,
+            "errors": self.errors,
+            "last_cycle_ms": round(self.last_cycle_ms, 1) if self.last_cycle_ms is not None else None,
+            "duty": round(self._busy_s / uptime, 3) if uptime else 0.0,
+        }
@@ -0,0 +1,257 @@
+# backend/occupancy_writer.py
+"""
+Persistencia de la ocupación detectada en ``cajones.status`` y
+``estacionamientos.espacios_disponibles``.
+
+Cada zona se filtra (debounce): un estado nuevo solo se confirma después de
+``OCCUPANCY_DEBOUNCE`` observaciones seguidas iguales, así que un auto que
+pasa por delante de la cámara no cambia nada. Una observación es un frame
+distinto: la misma imagen servida otra vez desde la caché (mismo
+``frame_id``) no cuenta. Las zonas confirmadas con
+cambio quedan pendientes y un hilo las escribe cada
+``OCCUPANCY_PERSIST_INTERVAL`` segundos: un UPDATE por estacionamiento con
+solo los cajones que cambiaron (``CASE id WHEN ...``) y, si cambió el número
+de libres, el de ``espacios_disponibles``. Las escrituras son proporcionales
+a las llegadas y salidas reales, no a los frames por segundo.
+
+``espacios_disponibles`` sigue la fórmula del panel del dueño: libres
+detectados menos reservas aceptadas activas en este momento.
+"""
+import datetime
+import os
+import threading
+
+OCCUPANCY_PERSIST_ENABLED = os.getenv("OCCUPANCY_PERSIST_ENABLED", "1") == "1"
+# Observaciones seguidas iguales para confirmar un cambio de estado
+OCCUPANCY_DEBOUNCE = int(os.getenv("OCCUPANCY_DEBOUNCE", "3"))
+# Segundos entre escrituras a la base
+OCCUPANCY_PERSIST_INTERVAL = float(os.getenv("OCCUPANCY_PERSIST_INTERVAL", "1.0"))
+
+STATUS_LIBRE = "libre"
+STATUS_OCUPADO = "ocupado"
+
+
+class ZoneDebouncer:
+    """Estado confirmado de cada zona de un estacionamiento"""
+
+    def __init__(self, keys, k=OCCUPANCY_DEBOUNCE):
+        self.keys = keys
+        self.k = max(1, k)
+        self.confirmed = {key: None for key in keys}
+        self._candidate = {key: None for key in keys}
+        self._streak = {key: 0 for key in keys}
+
+    def observe(self, states):
+        """``states`` es {clave: ocupado}; devuelve {clave: ocupado} de las zonas que cambiaron"""
+        changed = {}
+        for key, occupied in states.items():
+            if occupied == self._candidate[key]:
+                self._streak[key] += 1
+            else:
+                self._candidate[key] = occupied
+                self._streak[key] = 1
+            if self._streak[key] >= self.k and self.confirmed[key] != occupied:
+                self.confirmed[key] = occupied
+                changed[key] = occupied
+        return changed
+
+    def free_count(self):
+        """Zonas libres confirmadas, o None si alguna aún no tiene estado confirmado"""
+        if any(v is None for v in self.confirmed.values()):
+            return None
+        return sum(1 for v in self.confirmed.values() if not v)
+
+
+class OccupancyWriter:
+    """Debounce por zona en memoria y escritura en bloque en segundo plano"""
+
+    def __init__(self, session_factory=None, k=OCCUPANCY_DEBOUNCE, interval=OCCUPANCY_PERSIST_INTERVAL,
+                 enabled=OCCUPANCY_PERSIST_ENABLED):
+        self._session_factory = session_factory
+        self.k = k
+        self.interval = interval
+        self.enabled = enabled
+        self._lots = {}      # estacionamiento_id -> ZoneDebouncer
+        self._last_frame = {}  # estacionamiento_id -> frame_id de la última observación
+        self._pending = {}   # estacionamiento_id -> {"cajones": {id: status}, "free": int | None}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.observations = 0
+        self.repeated_frames = 0
+        self.changes = 0
+        self.statements = 0
+        self.rows_updated = 0
+        self.errors = 0
+        self.last_error = None
+
+    def _session(self):
+        if self._session_factory is None:
+            # Import diferido: database.py exige DATABASE_URL al importarse
+            from database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    # --- Observaciones ---
+
+    def record(self, estacionamiento_id, zones, frame_id=None):
+        """
+        Observa el estado de las zonas (``zone_details`` o snapshot) de un
+        estacionamiento. Con ``frame_id`` se ignora el mismo frame repetido.
+        """
+        if not self.enabled or not zones:
+            return
+        # Zonas del registro: clave = id del cajón; zonas globales: -id de la zona
+        states = {}
+        for zone in zones:
+            key = zone["cajon_id"] if zone.get("cajon_id") is not None else -int(zone["id"])
+            states[key] = bool(zone["occupied"])
+
+        with self._lock:
+            if frame_id is not None:
+                if self._last_frame.get(estacionamiento_id) == frame_id:
+                    self.repeated_frames += 1
+                    return
+                self._last_frame[estacionamiento_id] = frame_id
+            self.observations += 1
+            debouncer = self._lots.get(estacionamiento_id)
+            if debouncer is None or debouncer.keys != tuple(states):
+                debouncer = ZoneDebouncer(tuple(states), self.k)
+                self._lots[estacionamiento_id] = debouncer
+            changed = debouncer.observe(states)
+            if not changed:
+                return
+            self.changes += len(changed)
+            # Las zonas globales (sin cajon_id) no son de este estacionamiento:
+            # no se escribe nada, ni siquiera espacios_disponibles
+            if any(key < 0 for key in states):
+                return
+            pending = self._pending.setdefault(estacionamiento_id, {"cajones": {}, "free": None})
+            for key, occupied in changed.items():
+                pending["cajones"][key] = STATUS_OCUPADO if occupied else STATUS_LIBRE
+            pending["free"] = debouncer.free_count()
+        self._wake.set()
+
+    # --- Escritura ---
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="occupancy-writer", daemon=True)
+        self._thread.start()
+        print(f"✓ Persistencia de ocupación iniciada (debounce {self.k} observaciones)")
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self.enabled:
+            self.flush()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            self.flush()
+            # Junta los cambios que lleguen mientras tanto en la próxima escritura
+            self._stop.wait(self.interval)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            db = self._session()
+        except Exception as e:
+            self._failed(pending, e)
+            return
+        try:
+            for estacionamiento_id, change in pending.items():
+                self._write_lot(db, estacionamiento_id, change)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self._failed(pending, e)
+        finally:
+            db.close()
+
+    def _failed(self, pending, error):
+        # Se reintentan en la próxima escritura, sin pisar cambios más nuevos
+        with self._lock:
+            for estacionamiento_id, change in pending.items():
+                current = self._pending.setdefault(estacionamiento_id, {"cajones": {}, "free": None})
+                current["cajones"] = {**change["cajones"], **current["cajones"]}
+                if current["free"] is None:
+                    current["free"] = change["free"]
+            self.errors += 1
+            self.last_error = str(error)
+        print(f"⚠️ No se pudo guardar la ocupación detectada: {error}")
+
+    def _write_lot(self, db, estacionamiento_id, change):
+        from sqlalchemy import case, or_, update
+        from models.cajon import Cajon
+        from models.estacionamiento import Estacionamiento
+
+        cajones = change["cajones"]
+        if cajones:
+            # El primer estado confirmado de cada cajón puede coincidir con la base: no se toca
+            status = case(cajones, value=Cajon.id)
+            result = db.execute(
+                update(Cajon)
+                .where(Cajon.id.in_(list(cajones)), Cajon.estacionamiento_id == estacionamiento_id,
+                       or_(Cajon.status.is_(None), Cajon.status != status))
+                .values(status=status)
+                .execution_options(synchronize_session=False)
+            )
+            self.statements += 1
+            self.rows_updated += result.rowcount or 0
+
+        if change["free"] is not None:
+            espacios = max(0, change["free"] - self._active_reservations(db, estacionamiento_id))
+            result = db.execute(
+                update(Estacionamiento)
+                .where(Estacionamiento.id == estacionamiento_id,
+                       Estacionamiento.espacios_disponibles != espacios)
+                .values(espacios_disponibles=espacios)
+                .execution_options(synchronize_session=False)
+            )
+            self.statements += 1
+            self.rows_updated += result.rowcount or 0
+
+    @staticmethod
+    def _active_reservations(db, estacionamiento_id):
+        """Reservas aceptadas de hoy en curso (mismo criterio que /reservas/activas)"""
+        from models.reserva import Reserva
+        ahora = datetime.datetime.now()
+        return db.query(Reserva).filter(
+            Reserva.estacionamiento_id == estacionamiento_id,
+            Reserva.fecha_reserva == ahora.date(),
+            Reserva.estado == "aceptada",
+            Reserva.hora_inicio <= ahora.time(),
+            Reserva.hora_fin >= ahora.time(),
+        ).count()
+
+    def stats(self):
+        with self._lock:
+            pending = sum(len(c["cajones"]) for c in self._pending.values())
+            lots = len(self._lots)
+        return {
+            "enabled": self.enabled,
+            "debounce": self.k,
+            "lots": lots,
+            "observations": self.observations,
+            "repeated_frames": self.repeated_frames,
+            "confirmed_changes": self.changes,
+            "statements": self.statements,
+            "rows_updated": self.rows_updated,
+            "pending_cajones": pending,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
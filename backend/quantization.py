@@ -0,0 +1,193 @@
+# backend/quantization.py
+"""
+Variante INT8 del detector (cuantización estática con ONNX Runtime).
+
+El modelo FP32 exportado a ONNX se cuantiza en formato QDQ (pesos INT8 por
+canal, activaciones UINT8) calibrando los rangos con nuestras imágenes de
+estacionamientos. La decodificación final de la cabeza (DFL, concatenaciones y
+escalado a píxeles) se deja en FP32 porque ahí la cuantización mueve las
+cajas. Se usa con ``YOLO_BACKEND=onnx-int8``.
+
+Comandos (desde backend/):
+    python quantization.py calibrate --images "images/estacionamientos/*.jpg"
+    python quantization.py regress --threshold 0.95
+
+``regress`` compara la decisión de ocupación de cada zona
+(``analyze_parking_zones_simple``) entre FP32 e INT8 y termina con código 1
+si la concordancia queda por debajo del umbral.
+"""
+import argparse
+import contextlib
+import glob
+import io
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent
+CALIBRATION_IMAGES = os.getenv("QUANT_CALIBRATION_IMAGES", str(BASE_DIR / "images" / "estacionamientos" / "*.jpg"))
+CALIBRATION_IMGSZ = int(os.getenv("QUANT_CALIBRATION_IMGSZ", "640"))
+MIN_AGREEMENT = float(os.getenv("QUANT_MIN_AGREEMENT", "0.95"))
+
+
+def calibration_paths(pattern=CALIBRATION_IMAGES):
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        raise FileNotFoundError(f"No hay imágenes de calibración en {pattern}")
+    return paths
+
+
+def preprocess(image, imgsz=CALIBRATION_IMGSZ):
+    """Mismo preproceso que ultralytics: letterbox, BGR→RGB, CHW y escala 0-1"""
+    from ultralytics.data.augment import LetterBox
+
+    boxed = LetterBox((imgsz, imgsz), auto=False, stride=32)(image=image)
+    tensor = boxed[..., ::-1].transpose(2, 0, 1)
+    return np.ascontiguousarray(tensor, dtype=np.float32)[None] / 255.0
+
+
+class ImageCalibrationReader:
+    """CalibrationDataReader de ONNX Runtime sobre una lista de imágenes"""
+
+    def __init__(self, paths, input_name, imgsz=CALIBRATION_IMGSZ):
+        self.paths = list(paths)
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self._iter = iter(self.paths)
+
+    def get_next(self):
+        for path in self._iter:
+            image = cv2.imread(path)
+            if image is None:
+                print(f"⚠️ Imagen de calibración ilegible: {path}")
+                continue
+            return {self.input_name: preprocess(image, self.imgsz)}
+        return None
+
+    def rewind(self):
+        self._iter = iter(self.paths)
+
+
+def head_nodes_to_exclude(model):
+    """Nodos de decodificación de la cabeza Detect (todo lo que no son sus ramas cv2/cv3)"""
+    indices = [int(m.group(1)) for n in model.graph.node if (m := re.match(r"^/model\.(\d+)/", n.name))]
+    if not indices:
+        return []
+    head = f"/model.{max(indices)}/"
+    return [
+        n.name for n in model.graph.node
+        if n.name.startswith(head) and not re.match(re.escape(head) + r"cv[23]\.", n.name)
+    ]
+
+
+def quantize_model(fp32_path, int8_path, image_pattern=CALIBRATION_IMAGES, imgsz=CALIBRATION_IMGSZ):
+    """Cuantiza ``fp32_path`` (ONNX) a ``int8_path`` calibrando con las imágenes dadas"""
+    import onnx
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+
+    paths = calibration_paths(image_pattern)
+    model = onnx.load(str(fp32_path))
+    reader = ImageCalibrationReader(paths, model.graph.input[0].name, imgsz)
+    exclude = head_nodes_to_exclude(model)
+
+    print(f"⚠️ Calibrando INT8 con {len(paths)} imágenes ({len(exclude)} nodos de la cabeza quedan en FP32)...")
+    start = time.perf_counter()
+    tmp_path = Path(str(int8_path) + ".tmp")
+    quantize_static(
+        str(fp32_path), str(tmp_path), reader,
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        calibrate_method=CalibrationMethod.MinMax,
+        nodes_to_exclude=exclude,
+    )
+    os.replace(tmp_path, int8_path)
+    print(f"✓ Modelo INT8 guardado: {int8_path} ({(time.perf_counter() - start) * 1000:.0f} ms)")
+    return str(int8_path)
+
+
+def zone_decisions(model, images, parking_zones, config):
+    """Ocupación por zona (lista de bools) de cada imagen con el pipeline sin anotar"""
+    from detection import DetectionPipeline
+
+    pipe = DetectionPipeline(
+        infer=lambda image: model(image, **config)[0],
+        zones_loader=lambda: parking_zones,
+    ).without("annotate", "encode")
+    decisions = []
+    for image in images:
+        with contextlib.redirect_stdout(io.StringIO()):
+            ctx = pipe.run(image)
+        decisions.append([zone["occupied"] for zone in ctx["zone_details"]])
+    return decisions
+
+
+def regress(reference_backend="onnx", image_pattern=CALIBRATION_IMAGES, zones_file="bounding_boxes.json"):
+    """Concordancia por zona entre FP32 e INT8; devuelve (concordancia, detalle por imagen)"""
+    from model_registry import ModelRegistry
+    from detection import DETECTION_CONFIG, load_parking_zones
+
+    paths = calibration_paths(image_pattern)
+    images = [img for img in (cv2.imread(p) for p in paths) if img is not None]
+    parking_zones = load_parking_zones(zones_file)
+    config = dict(DETECTION_CONFIG, verbose=False)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        fp32 = ModelRegistry(backend=reference_backend).load()
+        int8 = ModelRegistry(backend="onnx-int8").load()
+
+    reference = zone_decisions(fp32, images, parking_zones, config)
+    candidate = zone_decisions(int8, images, parking_zones, config)
+
+    total = agree = 0
+    per_image = []
+    for path, ref, cand in zip(paths, reference, candidate):
+        same = sum(r == c for r, c in zip(ref, cand))
+        total += len(ref)
+        agree += same
+        per_image.append((path, same, len(ref)))
+    agreement = agree / total if total else 1.0
+    return agreement, per_image
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    calibrate = sub.add_parser("calibrate", help="Genera el modelo INT8 calibrado")
+    calibrate.add_argument("--images", default=CALIBRATION_IMAGES)
+    calibrate.add_argument("--imgsz", type=int, default=CALIBRATION_IMGSZ)
+
+    check = sub.add_parser("regress", help="Compara la ocupación por zona entre FP32 e INT8")
+    check.add_argument("--images", default=CALIBRATION_IMAGES)
+    check.add_argument("--zones", default="bounding_boxes.json")
+    check.add_argument("--reference", default="onnx", choices=["torch", "onnx"])
+    check.add_argument("--threshold", type=float, default=MIN_AGREEMENT)
+
+    args = parser.parse_args()
+
+    if args.command == "calibrate":
+        from model_registry import MODEL_PATH, ensure_exported, export_artifact_path
+
+        fp32_path = ensure_exported(MODEL_PATH, "onnx")
+        quantize_model(fp32_path, export_artifact_path(MODEL_PATH, "onnx-int8"), args.images, args.imgsz)
+        return 0
+
+    agreement, per_image = regress(args.reference, args.images, args.zones)
+    for path, same, total in per_image:
+        print(f"  {Path(path).name}: {same}/{total} zonas iguales")
+    if agreement < args.threshold:
+        print(f"❌ Concordancia FP32 vs INT8: {agreement:.3f} < {args.threshold:.3f}")
+        return 1
+    print(f"✅ Concordancia FP32 vs INT8: {agreement:.3f} (umbral {args.threshold:.3f})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
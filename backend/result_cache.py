@@ -0,0 +1,138 @@
+# backend/result_cache.py
+"""
+Caché de resultados de detección direccionada por contenido.
+
+La clave combina la identidad de la imagen (hash de los bytes, o ruta + mtime
++ tamaño para archivos en disco), la versión de las zonas, DETECTION_CONFIG,
+el modelo y el modo de anotación. Repetir la detección sobre una imagen que no
+cambió devuelve el resultado guardado sin correr YOLO ni el análisis de color.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+
+
+def image_identity(source):
+    """Identidad barata de la imagen: ruta+mtime+tamaño en disco o hash de los bytes"""
+    if isinstance(source, (str, Path)):
+        st = os.stat(source)
+        return f"file:{os.path.realpath(source)}:{st.st_mtime_ns}:{st.st_size}"
+    if hasattr(source, "tobytes") and not isinstance(source, (bytes, bytearray, memoryview)):
+        # ndarray: se incluye la forma para no confundir frames con los mismos bytes
+        return f"array:{source.shape}:{hashlib.sha1(source.tobytes()).hexdigest()}"
+    return f"bytes:{hashlib.sha1(source).hexdigest()}"
+
+
+class CacheEntry:
+    __slots__ = ("response", "image", "media_type", "size", "expires_at")
+
+    def __init__(self, response, image, media_type, size, expires_at):
+        self.response = response
+        self.image = image
+        self.media_type = media_type
+        self.size = size
+        self.expires_at = expires_at
+
+
+class DetectionResultCache:
+    """LRU con TTL y tope de memoria para respuestas de detección"""
+
+    def __init__(self, max_entries=RESULT_CACHE_MAX_ENTRIES, max_bytes=RESULT_CACHE_MAX_BYTES,
+                 ttl=RESULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.ttl > 0
+
+    @staticmethod
+    def make_key(source, zones_version, config, model_id, variant=None):
+        return (
+            image_identity(source),
+            zones_version,
+            json.dumps(config, sort_keys=True),
+            model_id,
+            json.dumps(variant, sort_keys=True, default=str),
+        )
+
+    def get(self, key, count_miss=True):
+        """
+        Entrada vigente o None. Un sondeo previo a ``detect_cached`` pasa
+        ``count_miss=False`` para que un fallo no se cuente dos veces.
+        """
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += count_miss
+                return None
+            if entry.expires_at <= now:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += count_miss
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, response, image=None, media_type=None):
+        size = len(json.dumps(response, default=str)) + (len(image) if image else 0)
+        entry = CacheEntry(response, image, media_type, size, time.monotonic() + self.ttl)
+        if not self.enabled or size > self.max_bytes:
+            return entry
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return entry
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+result_cache = DetectionResultCache()
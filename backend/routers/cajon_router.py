@@ -1,15 +1,32 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from models.cajon import Cajon
 from schemas.cajon_schema import CajonCreate, CajonOut
 from database import get_db
+from zone_registry import zone_registry, parse_coordenadas
+import json
 
 router = APIRouter(prefix="/cajones", tags=["Cajones"])
 
 @router.post("/", response_model=CajonOut)
 def crear_cajon(data: CajonCreate, db: Session = Depends(get_db)):
-    cajon = Cajon(**data.dict())
+    payload = data.dict()
+    coordenadas = payload.get("coordenadas")
+    if coordenadas is not None:
+        # Se valida al escribir para que la detección no encuentre polígonos rotos
+        try:
+            parse_coordenadas(coordenadas)
+        except (ValueError, TypeError) as e:
+            raise HTTPException(status_code=400, detail=f"Coordenadas inválidas: {e}")
+        if not isinstance(coordenadas, str):
+            payload["coordenadas"] = json.dumps(coordenadas)
+
+    cajon = Cajon(**payload)
     db.add(cajon)
     db.commit()
     db.refresh(cajon)
+
+    # Las zonas del estacionamiento cambiaron: se recargan con esta misma sesión
+    if cajon.estacionamiento_id is not None:
+        zone_registry.invalidate(cajon.estacionamiento_id, db=db)
     return cajon
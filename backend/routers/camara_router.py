@@ -0,0 +1,59 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List
+from models.camara import Camara, CamaraZona
+from models.cajon import Cajon
+from schemas.camara_schema import CamaraCreate, CamaraOut
+from database import get_db
+from camera_registry import camera_registry
+from zone_registry import parse_coordenadas
+import json
+
+router = APIRouter(prefix="/camaras", tags=["Cámaras"])
+
+@router.post("/", response_model=CamaraOut)
+def crear_camara(data: CamaraCreate, db: Session = Depends(get_db)):
+    # Los cajones deben ser del mismo estacionamiento que la cámara
+    cajon_ids = {zona.cajon_id for zona in data.zonas}
+    if cajon_ids:
+        validos = {
+            row.id for row in db.query(Cajon.id)
+            .filter(Cajon.id.in_(cajon_ids), Cajon.estacionamiento_id == data.estacionamiento_id)
+        }
+        faltantes = sorted(cajon_ids - validos)
+        if faltantes:
+            raise HTTPException(status_code=400, detail=f"Cajones que no son del estacionamiento: {faltantes}")
+
+    zonas = []
+    for zona in data.zonas:
+        # Se valida al escribir para que la detección no encuentre polígonos rotos
+        try:
+            parse_coordenadas(zona.coordenadas)
+        except (ValueError, TypeError) as e:
+            raise HTTPException(status_code=400, detail=f"Coordenadas inválidas (cajón {zona.cajon_id}): {e}")
+        coordenadas = zona.coordenadas if isinstance(zona.coordenadas, str) else json.dumps(zona.coordenadas)
+        zonas.append(CamaraZona(cajon_id=zona.cajon_id, coordenadas=coordenadas))
+
+    camara = Camara(**data.dict(exclude={"zonas"}), zonas=zonas)
+    db.add(camara)
+    db.commit()
+    db.refresh(camara)
+
+    camera_registry.invalidate(camara.estacionamiento_id, db=db)
+    return camara
+
+@router.get("/estacionamiento/{estacionamiento_id}", response_model=List[CamaraOut])
+def listar_camaras(estacionamiento_id: int, db: Session = Depends(get_db)):
+    return db.query(Camara).filter(Camara.estacionamiento_id == estacionamiento_id).order_by(Camara.id).all()
+
+@router.delete("/{camara_id}")
+def eliminar_camara(camara_id: int, db: Session = Depends(get_db)):
+    camara = db.query(Camara).filter(Camara.id == camara_id).first()
+    if not camara:
+        raise HTTPException(status_code=404, detail="Cámara no encontrada")
+    estacionamiento_id = camara.estacionamiento_id
+    db.delete(camara)
+    db.commit()
+
+    camera_registry.invalidate(estacionamiento_id, db=db)
+    return {"message": "Cámara eliminada"}
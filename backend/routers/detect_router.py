@@ -1,52 +1,235 @@
-# backend/app/routers/detect_router.py
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from fastapi.responses import JSONResponse
-from pathlib import Path
-import tempfile, uuid, base64, shutil
-from ..detection import detect_from_path
+# backend/routers/detect_router.py
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query, Request, WebSocket
+from fastapi.responses import JSONResponse, Response
+import asyncio, time, traceback
+from concurrent.futures.process import BrokenProcessPool
+import base64
+from detection import (
+    detect_image, detection_executor, inference_pool, INLINE_IMAGES_DEFAULT,
+    ImageDecodeError, pipeline_for, summarize,
+)
+from inference_executor import DetectionBusyError
+from image_store import image_store, image_url
+from motion_gate import motion_gate
+from frame_stream import (
+    LatestFrameSlot, stream_registry, occupancy_state, occupancy_delta,
+    STREAM_MAX_FPS, STREAM_STATS_INTERVAL, STREAM_MAX_FRAME_BYTES,
+)
 from typing import Optional
 
 router = APIRouter(prefix="/detect", tags=["detect"])
 
-def _save_upload_to_temp(upload_file: UploadFile, name_prefix="upload") -> Path:
-    suffix = Path(upload_file.filename).suffix or ".jpg"
-    tmp = Path(tempfile.gettempdir()) / f"{name_prefix}_{uuid.uuid4().hex}{suffix}"
-    with tmp.open("wb") as buffer:
-        shutil.copyfileobj(upload_file.file, buffer)
-    return tmp
+# Las imágenes se direccionan por contenido: un id nunca cambia de bytes
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+async def _read_upload(upload_file: UploadFile) -> memoryview:
+    """Bytes de la subida en memoria (sin pasar por /tmp)"""
+    data = await upload_file.read()
+    if not data:
+        raise HTTPException(status_code=400, detail="Archivo vacío")
+    return memoryview(data)
+
+def _attach_annotated_image(result, inline_image):
+    """Guarda la imagen anotada y agrega image_id/image_url (y base64 en modo compatibilidad)"""
+    annotated_bytes = result.pop("annotated_bytes", None)
+    media_type = result.pop("annotated_media_type", None) or "image/jpeg"
+
+    image_id = image_store.put(annotated_bytes, media_type) if annotated_bytes else None
+    result["image_id"] = image_id
+    result["image_url"] = image_url(image_id) if image_id else None
+    if inline_image:
+        result["annotated_image_b64"] = base64.b64encode(annotated_bytes).decode() if annotated_bytes else None
+
+def _etag_matches(if_none_match, etag):
+    """Comparación débil de If-None-Match: lista separada por comas, ``W/`` opcional o ``*``"""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:].strip()
+        if tag == etag:
+            return True
+    return False
+
+@router.get("/images/{image_id}")
+def get_annotated_image(image_id: str, request: Request):
+    """Bytes de una imagen anotada, con ETag para que el cliente la cachee"""
+    item = image_store.get(image_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Imagen no encontrada o expirada")
+
+    data, media_type = item
+    etag = f'"{image_id}"'
+    headers = {"ETag": etag, "Cache-Control": IMAGE_CACHE_CONTROL}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type=media_type, headers=headers)
 
 @router.post("/upload")
-async def detect_upload(file: UploadFile = File(...)):
-    tmp = _save_upload_to_temp(file, "img")
+async def detect_upload(file: UploadFile = File(...), inline_image: bool = Query(INLINE_IMAGES_DEFAULT)):
+    data = await _read_upload(file)
     try:
-        result = detect_from_path(str(tmp))
-        annotated_path = result.get("annotated_path")
-        if annotated_path and Path(annotated_path).exists():
-            with open(annotated_path, "rb") as f:
-                result["annotated_image_b64"] = base64.b64encode(f.read()).decode()
-        else:
-            annotated_bytes = result.get("annotated_bytes")
-            result["annotated_image_b64"] = base64.b64encode(annotated_bytes).decode() if annotated_bytes else None
+        result = await detection_executor.run(detect_image, data)
+        _attach_annotated_image(result, inline_image)
         return JSONResponse(result)
+    except DetectionBusyError as e:
+        return e.to_response()
+    except ImageDecodeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        tmp.unlink(missing_ok=True)
 
 @router.post("/frame")
-async def detect_frame(frame: UploadFile = File(...), resize_width: Optional[int] = None):
-    tmp = _save_upload_to_temp(frame, "frame")
+async def detect_frame(
+    frame: UploadFile = File(...),
+    resize_width: Optional[int] = Query(None, ge=32),
+    inline_image: bool = Query(INLINE_IMAGES_DEFAULT),
+    camera_id: Optional[str] = Query(None),
+):
+    # Con camera_id los frames sin cambios en las zonas no pasan por YOLO
+    gate_key = f"camera:{camera_id}" if camera_id else None
+    data = await _read_upload(frame)
     try:
-        result = detect_from_path(str(tmp), resize_width=resize_width)
-        annotated_path = result.get("annotated_path")
-        if annotated_path and Path(annotated_path).exists():
-            with open(annotated_path, "rb") as f:
-                result["annotated_image_b64"] = base64.b64encode(f.read()).decode()
-        else:
-            annotated_bytes = result.get("annotated_bytes")
-            result["annotated_image_b64"] = base64.b64encode(annotated_bytes).decode() if annotated_bytes else None
+        result = await detection_executor.run(detect_image, data, resize_width=resize_width, gate_key=gate_key)
+        _attach_annotated_image(result, inline_image)
         return JSONResponse(result)
+    except DetectionBusyError as e:
+        return e.to_response()
+    except ImageDecodeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+# Espera antes de reintentar un frame cuando el ejecutor está lleno
+STREAM_BUSY_BACKOFF = 0.1
+
+@router.websocket("/stream")
+async def detect_stream(websocket: WebSocket):
+    """
+    Detección en vivo: el cliente envía frames JPEG binarios y recibe solo los
+    cambios de ocupación por zona. Se procesa siempre el frame más reciente;
+    los que llegan mientras tanto se descartan y los frames sin cambios en las
+    zonas no pasan por YOLO (compuerta de movimiento). El cliente puede enviar el
+    texto ``stats`` para pedir las estadísticas de la conexión.
+    """
+    client = f"{websocket.client.host}:{websocket.client.port}" if websocket.client else None
+    stats = stream_registry.open(client)
+    if stats is None:
+        # 1013 = "try again later"
+        await websocket.close(code=1013)
+        return
+
+    await websocket.accept()
+    slot = LatestFrameSlot()
+    stats.slot = slot
+    send_lock = asyncio.Lock()
+    pipe = pipeline_for("false")
+    gate_key = f"stream:{stats.stream_id}"
+
+    async def send(message):
+        async with send_lock:
+            await websocket.send_json(message)
+
+    async def receive_frames():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            data = message.get("bytes")
+            if data is None:
+                if (message.get("text") or "").strip() == "stats":
+                    await send({"type": "stats", **stats.snapshot()})
+                continue
+            if len(data) > STREAM_MAX_FRAME_BYTES:
+                stats.frames_failed += 1
+                await send({"type": "error", "error": "Frame demasiado grande"})
+                continue
+            stats.frame_received(len(data))
+            slot.put(data, time.monotonic())
+
+    async def process_frames():
+        previous = None
+        min_interval = 1.0 / STREAM_MAX_FPS if STREAM_MAX_FPS > 0 else 0.0
+        last_start = 0.0
+        while True:
+            data, received_at = await slot.get()
+            wait = last_start + min_interval - time.monotonic()
+            if wait > 0:
+                # Durante la espera puede llegar un frame más nuevo que reemplace a este
+                slot.requeue(data, received_at)
+                await asyncio.sleep(wait)
+                continue
+            last_start = time.monotonic()
+
+            try:
+                if inference_pool.enabled:
+                    # Pool de procesos: el frame va por memoria compartida, sin compuerta
+                    ctx = await inference_pool.run(data)
+                else:
+                    ctx = await detection_executor.run(pipe.run_gated, data, gate_key)
+            except DetectionBusyError:
+                stats.busy_retries += 1
+                slot.requeue(data, received_at)
+                await asyncio.sleep(STREAM_BUSY_BACKOFF)
+                continue
+            except ImageDecodeError as e:
+                stats.frames_failed += 1
+                await send({"type": "error", "error": str(e)})
+                continue
+            except BrokenProcessPool:
+                # El pool se reinicia solo; el stream sigue con el próximo frame
+                stats.frames_failed += 1
+                await send({"type": "error", "error": "Falló el proceso de inferencia, se reintenta con el próximo frame"})
+                continue
+            except Exception as e:
+                await frame_failed(e)
+                continue
+
+            latency_ms = (time.monotonic() - received_at) * 1000
+            try:
+                skipped = ctx.get("gate", {}).get("mode") == "skip"
+                current = occupancy_state(ctx["zone_details"])
+                summary = summarize(ctx)
+            except Exception as e:
+                await frame_failed(e)
+                continue
+            stats.frame_processed(latency_ms, skipped=skipped)
+            changes = occupancy_delta(previous, current)
+            previous = current
+            if changes:
+                await send({
+                    "type": "occupancy",
+                    "frame": stats.frames_processed,
+                    "changes": changes,
+                    **summary,
+                    "latency_ms": round(latency_ms, 1),
+                })
+
+    async def frame_failed(error):
+        # Un error inesperado no corta el stream en silencio: se avisa y sigue
+        stats.frames_failed += 1
+        print(f"✗ Error procesando un frame del stream {stats.stream_id}: {error}")
+        traceback.print_exc()
+        await send({"type": "error", "error": "Error interno procesando el frame, se sigue con el próximo"})
+
+    async def report_stats():
+        while True:
+            await asyncio.sleep(STREAM_STATS_INTERVAL)
+            await send({"type": "stats", **stats.snapshot()})
+
+    tasks = [asyncio.create_task(coro) for coro in (receive_frames(), process_frames(), report_stats())]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not task.cancelled() and task.exception() is not None:
+                print(f"✗ Error en stream {stats.stream_id}: {task.exception()}")
     finally:
-        tmp.unlink(missing_ok=True)
+        stream_registry.close(stats)
+        motion_gate.reset(gate_key)
+        print(f"✓ Stream {stats.stream_id} cerrado: {stats.snapshot()}")
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Any
+from typing import Any, Optional
 
 class CajonBase(BaseModel):
     numero_cajon: str
@@ -7,6 +7,7 @@ class CajonBase(BaseModel):
 
 class CajonCreate(CajonBase):
     coordenadas: Any  # Recibimos coordenadas en formato JSON
+    estacionamiento_id: Optional[int] = None
 
 class CajonOut(CajonBase):
     id: int
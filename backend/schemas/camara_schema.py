@@ -0,0 +1,28 @@
+from pydantic import BaseModel
+from typing import Any, List, Optional
+
+class CamaraZonaBase(BaseModel):
+    cajon_id: int
+    coordenadas: Any  # Puntos del cajón en coordenadas de la cámara (JSON)
+
+class CamaraZonaOut(CamaraZonaBase):
+    id: int
+
+    class Config:
+        orm_mode = True
+
+class CamaraBase(BaseModel):
+    estacionamiento_id: int
+    nombre: str
+    imagen: Optional[str] = None
+    activo: bool = True
+
+class CamaraCreate(CamaraBase):
+    zonas: List[CamaraZonaBase] = []
+
+class CamaraOut(CamaraBase):
+    id: int
+    zonas: List[CamaraZonaOut] = []
+
+    class Config:
+        orm_mode = True
@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+from typing import List, Literal
+
+class DeteccionLoteRequest(BaseModel):
+    estacionamiento_ids: List[int]
+    annotate: Literal["false", "thumbnail", "full"] = "false"
+    inline_image: bool = False
@@ -1,2 +1,171 @@
-from ultralytics import solutions
-solutions.ParkingPtsSelection()
\ No newline at end of file
+# backend/select_parking.py
+"""
+Calibración de zonas de estacionamiento.
+
+Carga un frame de referencia, toma los polígonos de un archivo (JSON de
+``bounding_boxes.json``, lista de puntos o un ``.npz`` previo) o los marca
+de forma interactiva, los valida, los recorta al tamaño de la imagen y
+escribe el artefacto binario que carga la detección (ver zone_artifact.py).
+
+Comandos (desde backend/):
+    python select_parking.py calibrate --image images/estacionamientos/1.jpg --zones bounding_boxes.json
+    python select_parking.py calibrate --image images/estacionamientos/1.jpg --interactive
+    python select_parking.py inspect bounding_boxes.npz
+
+Modo interactivo: clic izquierdo agrega un punto, Enter/n cierra el polígono,
+u deshace, s guarda y sale, q/Esc sale sin guardar.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from zone_registry import parse_coordenadas
+from zone_artifact import load_zone_artifact, write_zone_artifact
+
+
+def read_polygons(path):
+    """Polígonos de un JSON (formato bounding_boxes.json o lista de puntos) o de un .npz"""
+    if str(path).endswith(".npz"):
+        zones, _ = load_zone_artifact(path, register=False)
+        return [zone["points"] for zone in zones]
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [zone["points"] if isinstance(zone, dict) and "points" in zone else zone for zone in data]
+
+
+def clip_polygons(polygons, shape):
+    """
+    Valida y recorta cada polígono a la imagen. Devuelve ``(válidos, errores)``;
+    un polígono que queda sin área al recortarlo se descarta.
+    """
+    height, width = shape[:2]
+    valid, errors = [], []
+    for i, polygon in enumerate(polygons, start=1):
+        try:
+            points = parse_coordenadas(polygon)
+        except (ValueError, TypeError) as e:
+            errors.append(f"Zona #{i}: {e}")
+            continue
+        clipped = np.clip(np.asarray(points, dtype=np.float64), 0, [width - 1, height - 1])
+        if not np.array_equal(clipped, points):
+            print(f"⚠️ Zona #{i}: puntos fuera de la imagen, se recortan a {width}x{height}")
+        try:
+            valid.append(parse_coordenadas(clipped.tolist()))
+        except ValueError as e:
+            errors.append(f"Zona #{i}: {e} después de recortar")
+    return valid, errors
+
+
+def select_interactive(image, polygons=()):
+    """Marca polígonos sobre la imagen con OpenCV; devuelve la lista o None si se cancela"""
+    polygons = [list(p) for p in polygons]
+    current = []
+    window = "Calibración de zonas"
+
+    def on_mouse(event, x, y, flags, param):
+        if event == cv2.EVENT_LBUTTONDOWN:
+            current.append([x, y])
+
+    cv2.namedWindow(window, cv2.WINDOW_NORMAL)
+    cv2.setMouseCallback(window, on_mouse)
+    try:
+        while True:
+            canvas = image.copy()
+            for polygon in polygons:
+                cv2.polylines(canvas, [np.asarray(polygon, dtype=np.int32)], True, (0, 255, 0), 2)
+            if current:
+                cv2.polylines(canvas, [np.asarray(current, dtype=np.int32)], False, (0, 255, 255), 2)
+                for point in current:
+                    cv2.circle(canvas, tuple(point), 3, (0, 255, 255), -1)
+            cv2.imshow(window, canvas)
+
+            key = cv2.waitKey(30) & 0xFF
+            if key in (13, ord("n")) and len(current) >= 3:
+                polygons.append(current[:])
+                current.clear()
+            elif key == ord("u"):
+                if current:
+                    current.pop()
+                elif polygons:
+                    polygons.pop()
+            elif key == ord("s"):
+                if len(current) >= 3:
+                    polygons.append(current[:])
+                return polygons
+            elif key in (ord("q"), 27):
+                return None
+    finally:
+        cv2.destroyWindow(window)
+
+
+def calibrate(args):
+    image = cv2.imread(args.image)
+    if image is None:
+        print(f"❌ No se pudo leer la imagen de referencia: {args.image}")
+        return 1
+
+    polygons = read_polygons(args.zones) if args.zones else []
+    if args.interactive:
+        polygons = select_interactive(image, polygons)
+        if polygons is None:
+            print("✗ Calibración cancelada")
+            return 1
+    if not polygons:
+        print("❌ No hay zonas: usar --zones o --interactive")
+        return 1
+
+    valid, errors = clip_polygons(polygons, image.shape)
+    for error in errors:
+        print(f"❌ {error}")
+    if errors and not args.skip_invalid:
+        return 1
+    if not valid:
+        print("❌ Ninguna zona válida")
+        return 1
+
+    index = write_zone_artifact(args.out, valid, image.shape)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([{"points": polygon} for polygon in valid], f)
+    mask_kb = sum(zone.mask.size for zone in index) / 1024
+    print(f"✅ {len(valid)} zonas guardadas en {args.out} "
+          f"({image.shape[1]}x{image.shape[0]}, versión {index.version}, máscaras {mask_kb:.0f} KB)")
+    return 0
+
+
+def inspect(args):
+    zones, index = load_zone_artifact(args.artifact, register=False)
+    print(f"{args.artifact}: {len(zones)} zonas, referencia {index.shape[1]}x{index.shape[0]}, versión {index.version}")
+    for zone in index:
+        x1, y1, x2, y2 = zone.roi
+        print(f"  Zona #{zone.index + 1}: {len(zone.points)} puntos, ROI ({x1}, {y1})-({x2}, {y2}), área {zone.area} px")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    cal = sub.add_parser("calibrate", help="Valida las zonas y escribe el artefacto .npz")
+    cal.add_argument("--image", required=True, help="Frame de referencia de la cámara")
+    cal.add_argument("--zones", help="Polígonos de partida (.json o .npz)")
+    cal.add_argument("--interactive", action="store_true", help="Marcar o corregir zonas sobre la imagen")
+    cal.add_argument("--out", default="bounding_boxes.npz")
+    cal.add_argument("--json", help="Además escribe las zonas válidas en formato bounding_boxes.json")
+    cal.add_argument("--skip-invalid", action="store_true", help="Descarta las zonas inválidas en lugar de fallar")
+
+    ins = sub.add_parser("inspect", help="Muestra el contenido de un artefacto")
+    ins.add_argument("artifact")
+
+    args = parser.parse_args()
+    if args.command == "calibrate":
+        return calibrate(args)
+    return inspect(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+# backend/tiled_inference.py
+"""
+Inferencia recortada a las zonas del estacionamiento.
+
+Las cámaras gran angular entregan frames grandes donde las zonas ocupan solo
+una parte; si YOLO reduce el frame completo a 640 px los autos lejanos
+quedan de pocos píxeles. Con ``DETECTION_TILING``:
+
+- ``crop``: se infiere solo sobre el rectángulo que cubre todas las zonas
+  (``ZoneIndex.union_roi`` más un margen).
+- ``tile``: ese rectángulo se divide en parches del tamaño del modelo con
+  solapamiento, los parches que no tocan ninguna zona se descartan y el resto
+  se infiere en un solo lote. Las cajas se llevan a coordenadas del frame y se
+  fusionan con NMS por clase.
+
+En ambos casos el recorte se enmascara con los polígonos de las zonas: lo que
+queda fuera de todas (el margen, los pasillos entre cajones) llega al modelo
+en negro, así que ningún píxel fuera de las zonas se procesa. El resultado es
+un ``Results`` de ultralytics sobre el frame completo, así que el resto del
+pipeline no cambia.
+"""
+import os
+
+import numpy as np
+
+# off | crop | tile
+DETECTION_TILING = os.getenv("DETECTION_TILING", "off")
+# Lado de cada parche (normalmente el imgsz del modelo)
+DETECTION_TILE_SIZE = int(os.getenv("DETECTION_TILE_SIZE", "640"))
+# Solapamiento entre parches vecinos (fracción del lado)
+DETECTION_TILE_OVERLAP = float(os.getenv("DETECTION_TILE_OVERLAP", "0.2"))
+# Margen alrededor de las zonas (en negro tras enmascarar): las cajas de los
+# autos que sobresalen de su cajón no quedan pegadas al borde del recorte
+DETECTION_CROP_MARGIN = int(os.getenv("DETECTION_CROP_MARGIN", "32"))
+# Una caja contenida en otra de la misma clase en esta fracción se descarta
+# (autos cortados por el borde de un parche)
+TILE_MERGE_IOS = float(os.getenv("DETECTION_TILE_MERGE_IOS", "0.8"))
+
+TILING_MODES = ("off", "crop", "tile")
+
+
+def crop_region(zone_index, shape, margin=DETECTION_CROP_MARGIN):
+    """Rectángulo (x1, y1, x2, y2) con todas las zonas más el margen, o None si no hay zonas"""
+    height, width = shape[:2]
+    ux1, uy1, ux2, uy2 = zone_index.union_roi
+    if ux2 <= ux1 or uy2 <= uy1:
+        return None
+    return (max(0, ux1 - margin), max(0, uy1 - margin), min(width, ux2 + margin), min(height, uy2 + margin))
+
+
+def masked_region(image, zone_index, region):
+    """Copia de ``region`` con negro fuera de todas las zonas (máscaras precompiladas)"""
+    x1, y1, x2, y2 = region
+    crop = np.zeros((y2 - y1, x2 - x1) + image.shape[2:], dtype=image.dtype)
+    for zone in zone_index:
+        if zone.area == 0:
+            continue
+        rx1, ry1, rx2, ry2 = zone.roi
+        inside = zone.mask_bool if image.ndim == 2 else zone.mask_bool[..., None]
+        np.copyto(crop[ry1 - y1:ry2 - y1, rx1 - x1:rx2 - x1], image[ry1:ry2, rx1:rx2], where=inside)
+    return crop
+
+
+def _axis_starts(start, end, size, overlap):
+    """Inicios de los parches a lo largo de un eje, el último pegado al final"""
+    length = end - start
+    if length <= size:
+        return [start]
+    stride = max(1, int(size * (1 - overlap)))
+    starts = list(range(start, end - size, stride))
+    starts.append(end - size)
+    return starts
+
+
+def plan_tiles(region, zone_index, size=DETECTION_TILE_SIZE, overlap=DETECTION_TILE_OVERLAP):
+    """Parches (x1, y1, x2, y2) que cubren ``region`` y tocan al menos una zona"""
+    rx1, ry1, rx2, ry2 = region
+    rois = [zone.roi for zone in zone_index if zone.mask.size]
+    tiles = []
+    for y in _axis_starts(ry1, ry2, size, overlap):
+        for x in _axis_starts(rx1, rx2, size, overlap):
+            tile = (x, y, min(x + size, rx2), min(y + size, ry2))
+            if any(r[0] < tile[2] and tile[0] < r[2] and r[1] < tile[3] and tile[1] < r[3] for r in rois):
+                tiles.append(tile)
+    return tiles
+
+
+def merge_boxes(boxes, iou_threshold, ios_threshold=TILE_MERGE_IOS):
+    """
+    NMS por clase sobre filas ``[x1, y1, x2, y2, conf, cls]``. Además de IoU
+    suprime las cajas contenidas casi por completo en otra de mayor confianza.
+    """
+    if len(boxes) == 0:
+        return boxes
+    boxes = boxes[np.argsort(-boxes[:, 4], kind="stable")]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = np.ones(len(boxes), dtype=bool)
+    for i in range(len(boxes)):
+        if not keep[i]:
+            continue
+        rest = np.nonzero(keep[i + 1:] & (boxes[i + 1:, 5] == boxes[i, 5]))[0] + i + 1
+        if not len(rest):
+            continue
+        ix1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        iy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        ix2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        iy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        ios = inter / np.maximum(np.minimum(areas[i], areas[rest]), 1e-9)
+        keep[rest[(iou > iou_threshold) | (ios > ios_threshold)]] = False
+    return boxes[keep]
+
+
+def _offset_boxes(result, origin):
+    """Cajas de un ``Results`` de un recorte, como filas en coordenadas del frame"""
+    if result is None or result.boxes is None or len(result.boxes) == 0:
+        return np.zeros((0, 6), dtype=np.float32)
+    data = result.boxes.data.cpu().numpy()[:, :6].astype(np.float32)
+    data[:, [0, 2]] += origin[0]
+    data[:, [1, 3]] += origin[1]
+    return data
+
+
+def _frame_result(image, boxes, names):
+    import torch
+    from ultralytics.engine.results import Results
+
+    return Results(orig_img=image, path="", names=names or {}, boxes=torch.from_numpy(np.ascontiguousarray(boxes)))
+
+
+def zone_inference(image, zone_index, mode, infer, infer_many, iou_threshold,
+                   tile_size=DETECTION_TILE_SIZE, overlap=DETECTION_TILE_OVERLAP):
+    """
+    ``Results`` del frame completo inferido solo sobre la región de zonas.
+    Devuelve también cuántos parches se infirieron.
+    """
+    region = crop_region(zone_index, image.shape)
+    if region is None:
+        return _frame_result(image, np.zeros((0, 6), dtype=np.float32), None), 0
+
+    if mode == "crop":
+        tiles = [region]
+    else:
+        tiles = plan_tiles(region, zone_index, tile_size, overlap)
+
+    masked = masked_region(image, zone_index, region)
+    ox, oy = region[:2]
+    crops = [masked[y1 - oy:y2 - oy, x1 - ox:x2 - ox] for x1, y1, x2, y2 in tiles]
+    results = [infer(crops[0])] if len(crops) == 1 else infer_many(crops)
+
+    boxes = np.concatenate([_offset_boxes(r, t[:2]) for r, t in zip(results, tiles)])
+    if len(tiles) > 1:
+        boxes = merge_boxes(boxes, iou_threshold)
+    names = next((r.names for r in results if r is not None), None)
+    return _frame_result(image, boxes, names), len(tiles)
@@ -0,0 +1,156 @@
+# backend/zone_artifact.py
+"""
+Artefacto binario de zonas calibradas (``.npz`` sin comprimir).
+
+Lo genera ``select_parking.py`` a partir de un frame de referencia y guarda,
+a esa resolución, todo lo que ZoneIndex calcula al compilar: polígonos,
+rectángulos envolventes, ROIs, áreas y las máscaras de cada ROI. Como el
+``.npz`` no está comprimido, cada arreglo se mapea en memoria directamente
+desde el archivo: cargar un estacionamiento no dibuja ningún polígono y las
+máscaras se comparten entre workers a través de la caché de páginas.
+
+Contenido (``ZONE_ARTIFACT_VERSION`` = 1):
+    format_version  ()       int32
+    shape           (2,)     int32   alto, ancho del frame de referencia
+    version         ()       str     hash de polígonos + resolución
+    points          (P, 2)   float64 vértices de todas las zonas, concatenados
+    point_offsets   (Z+1,)   int64   zona i = points[po[i]:po[i+1]]
+    bboxes          (Z, 4)   float64 x1, y1, x2, y2 sin recortar
+    rois            (Z, 4)   int32   ROI recortada a la imagen (con margen)
+    areas           (Z,)     int64   píxeles dentro de cada zona
+    masks           (M,)     uint8   máscaras 0/1 de cada ROI, aplanadas
+    mask_offsets    (Z+1,)   int64
+"""
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+
+from zone_geometry import CompiledZone, ParkingZones, ZoneIndex, zone_index_cache
+
+ZONE_ARTIFACT_VERSION = 1
+
+
+class ZoneArtifactError(ValueError):
+    """El artefacto de zonas no existe, está dañado o es de otra versión"""
+
+
+def artifact_version(polygons, shape):
+    payload = json.dumps([[list(map(float, p)) for p in poly] for poly in polygons] + [list(shape[:2])])
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def write_zone_artifact(path, polygons, shape):
+    """Compila ``polygons`` para un frame de ``shape`` y los guarda en ``path``"""
+    shape = tuple(int(v) for v in shape[:2])
+    version = artifact_version(polygons, shape)
+    zones = ParkingZones([{"points": [list(map(float, p)) for p in poly]} for poly in polygons], version=version)
+    index = ZoneIndex(zones, shape)
+
+    point_offsets = np.cumsum([0] + [len(z.points_f64) for z in index]).astype(np.int64)
+    mask_offsets = np.cumsum([0] + [z.mask.size for z in index]).astype(np.int64)
+    masks = [(z.mask > 0).astype(np.uint8).ravel() for z in index]
+
+    # Archivo nuevo + os.replace: un servidor en marcha puede tener el
+    # artefacto anterior mapeado en memoria y truncarlo lo haría fallar (SIGBUS)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=".zones-", suffix=".npz", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(
+                f,
+                format_version=np.int32(ZONE_ARTIFACT_VERSION),
+                shape=np.asarray(shape, dtype=np.int32),
+                version=np.asarray(version),
+                points=np.concatenate([z.points_f64 for z in index]) if len(index) else np.zeros((0, 2)),
+                point_offsets=point_offsets,
+                bboxes=np.asarray([z.bbox for z in index], dtype=np.float64).reshape(-1, 4),
+                rois=np.asarray([z.roi for z in index], dtype=np.int32).reshape(-1, 4),
+                areas=np.asarray([z.area for z in index], dtype=np.int64),
+                masks=np.concatenate(masks) if masks else np.zeros(0, dtype=np.uint8),
+                mask_offsets=mask_offsets,
+            )
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return index
+
+
+def _memmap_members(path):
+    """
+    Arreglos de un ``.npz`` sin comprimir mapeados en memoria (de solo lectura).
+    Los miembros comprimidos, o de dtype objeto, se leen de forma normal.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in zf.infolist():
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                with zf.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member)
+                continue
+            # Cabecera local del zip: 30 bytes fijos + nombre + extra
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = np.frombuffer(f.read(4), dtype="<u2")
+            f.seek(info.header_offset + 30 + int(name_len) + int(extra_len))
+            major, _ = np.lib.format.read_magic(f)
+            if major == 1:
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            if dtype.hasobject:
+                raise ZoneArtifactError(f"Arreglo de objetos en el artefacto: {name}")
+            if not shape or 0 in shape:
+                arrays[name] = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+                continue
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=f.tell(),
+                                     shape=shape, order="F" if fortran else "C")
+    return arrays
+
+
+def load_zone_artifact(path, register=True):
+    """
+    Carga un artefacto y devuelve ``(ParkingZones, ZoneIndex)``. Con
+    ``register`` el ZoneIndex queda en la caché de zone_geometry, así que los
+    frames de la resolución de referencia lo usan sin compilar nada.
+    """
+    try:
+        data = _memmap_members(path)
+    except (OSError, zipfile.BadZipFile, ValueError) as e:
+        raise ZoneArtifactError(f"No se pudo leer {path}: {e}") from e
+
+    missing = {"format_version", "shape", "version", "points", "point_offsets",
+               "rois", "areas", "masks", "mask_offsets"} - set(data)
+    if missing:
+        raise ZoneArtifactError(f"Faltan arreglos en {path}: {sorted(missing)}")
+    if int(data["format_version"]) != ZONE_ARTIFACT_VERSION:
+        raise ZoneArtifactError(
+            f"{path} es de la versión {int(data['format_version'])}, se esperaba {ZONE_ARTIFACT_VERSION}"
+        )
+
+    shape = tuple(int(v) for v in data["shape"])
+    version = str(data["version"])
+    points, point_offsets = data["points"], data["point_offsets"]
+    masks, mask_offsets = data["masks"], data["mask_offsets"]
+    rois, areas = data["rois"], data["areas"]
+
+    compiled = []
+    zones = []
+    for i in range(len(rois)):
+        zone_points = np.asarray(points[point_offsets[i]:point_offsets[i + 1]])
+        rx1, ry1, rx2, ry2 = (int(v) for v in rois[i])
+        mask = masks[mask_offsets[i]:mask_offsets[i + 1]].reshape(ry2 - ry1, rx2 - rx1)
+        compiled.append(CompiledZone.precompiled(i, zone_points, rois[i], mask, areas[i],
+                                                 mask_bool=mask.view(np.bool_)))
+        zones.append({"points": zone_points.tolist()})
+
+    parking_zones = ParkingZones(zones, version=version)
+    index = ZoneIndex(parking_zones, shape, zones=compiled)
+    if register:
+        zone_index_cache.put(index)
+    return parking_zones, index
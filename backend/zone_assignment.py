@@ -0,0 +1,126 @@
+# backend/zone_assignment.py
+"""
+Asignación vectorizada de objetos detectados a zonas de estacionamiento.
+
+En lugar de evaluar cada par zona × objeto en Python, se descartan primero con
+NumPy los pares cuyos rectángulos envolventes no se tocan (ahí el centro no
+puede caer dentro del polígono y el overlap es 0). Para los pares restantes el
+test de centro (ray casting) se calcula en bloque y el overlap exacto se
+obtiene con ``cv2.intersectConvexConvex``, igual que antes, así que el
+resultado es numéricamente idéntico al de los bucles anidados.
+"""
+import cv2
+import numpy as np
+
+def point_in_polygon(point, polygon):
+    """Verifica si un punto está dentro de un polígono usando ray casting"""
+    x, y = point
+    n = len(polygon)
+    inside = False
+
+    p1x, p1y = polygon[0]
+    for i in range(1, n + 1):
+        p2x, p2y = polygon[i % n]
+        if y > min(p1y, p2y):
+            if y <= max(p1y, p2y):
+                if x <= max(p1x, p2x):
+                    if p1y != p2y:
+                        xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
+                    if p1x == p2x or x <= xinters:
+                        inside = not inside
+        p1x, p1y = p2x, p2y
+
+    return inside
+
+def calculate_overlap_percentage(bbox, polygon):
+    """Calcula el porcentaje de superposición entre un bbox y un polígono"""
+    try:
+        x1, y1, x2, y2 = bbox
+
+        # Crear puntos del rectángulo
+        rect_points = np.array([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], dtype=np.float32)
+        polygon_points = np.asarray(polygon, dtype=np.float32)
+
+        # Calcular intersección usando OpenCV
+        retval, intersection = cv2.intersectConvexConvex(rect_points, polygon_points)
+
+        if retval > 0 and intersection is not None and len(intersection) > 2:
+            overlap_area = cv2.contourArea(intersection)
+            bbox_area = (x2 - x1) * (y2 - y1)
+
+            # Retornar el porcentaje de superposición del bbox
+            if bbox_area > 0:
+                return overlap_area / bbox_area
+
+        return 0.0
+    except Exception as e:
+        print(f"Error calculando overlap: {e}")
+        return 0.0
+
+def candidate_pairs(zone_bboxes, object_bboxes):
+    """Matriz (Z, N) con los pares cuyos rectángulos envolventes se tocan"""
+    zx1, zy1, zx2, zy2 = (zone_bboxes[:, i:i + 1] for i in range(4))
+    ox1, oy1, ox2, oy2 = (object_bboxes[None, :, i] for i in range(4))
+    return ~((ox2 < zx1) | (ox1 > zx2) | (oy2 < zy1) | (oy1 > zy2))
+
+def points_in_zones(zone_index, zone_ids, points):
+    """
+    Ray casting vectorizado: para cada par (zone_ids[k], points[k]) indica si
+    el punto cae dentro del polígono. Replica exactamente ``point_in_polygon``.
+    """
+    arrays = zone_index.arrays
+    p1 = arrays["p1"][zone_ids]
+    p2 = arrays["p2"][zone_ids]
+    valid = arrays["valid"][zone_ids]
+
+    x = points[:, 0:1]
+    y = points[:, 1:2]
+    p1x, p1y = p1[..., 0], p1[..., 1]
+    p2x, p2y = p2[..., 0], p2[..., 1]
+
+    in_y = (y > np.minimum(p1y, p2y)) & (y <= np.maximum(p1y, p2y))
+    left = x <= np.maximum(p1x, p2x)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
+    crosses = valid & in_y & left & ((p1x == p2x) | (x <= xinters))
+    return (np.count_nonzero(crosses, axis=1) % 2) == 1
+
+def assign_objects_to_zones(all_objects, zone_index):
+    """
+    Devuelve ``(center_in_zone, overlap)``, dos matrices (Z, N): si el centro
+    de cada objeto cae en cada zona y qué fracción de su bbox se solapa con ella.
+    """
+    zone_count = len(zone_index)
+    object_count = len(all_objects)
+    center_in_zone = np.zeros((zone_count, object_count), dtype=bool)
+    overlap = np.zeros((zone_count, object_count), dtype=np.float64)
+    if zone_count == 0 or object_count == 0:
+        return center_in_zone, overlap
+
+    centers = np.array([obj['center'] for obj in all_objects], dtype=np.float64)
+    bboxes = np.array([obj['bbox'] for obj in all_objects], dtype=np.float64)
+
+    zone_ids, object_ids = np.nonzero(candidate_pairs(zone_index.arrays["bboxes"], bboxes))
+    if len(zone_ids) == 0:
+        return center_in_zone, overlap
+
+    center_in_zone[zone_ids, object_ids] = points_in_zones(zone_index, zone_ids, centers[object_ids])
+    for z, o in zip(zone_ids.tolist(), object_ids.tolist()):
+        overlap[z, o] = calculate_overlap_percentage(all_objects[o]['bbox'], zone_index[z].points_f32)
+
+    return center_in_zone, overlap
+
+def best_object_for_zone(center_in_zone, overlap, overlap_threshold=0.15):
+    """
+    Índice del objeto que ocupa la zona (o None) y su overlap. Mismo criterio
+    que el bucle original: entre los objetos con el centro dentro o con más del
+    umbral de overlap gana el primero con mayor overlap, si es mayor que 0.
+    """
+    eligible = center_in_zone | (overlap > overlap_threshold)
+    if not eligible.any():
+        return None, 0
+    scores = np.where(eligible, overlap, -1.0)
+    best = int(np.argmax(scores))
+    if scores[best] <= 0:
+        return None, 0
+    return best, float(overlap[best])
@@ -0,0 +1,257 @@
+# backend/zone_geometry.py
+"""
+Geometría precompilada de las zonas de estacionamiento.
+
+Para un mismo archivo de zonas y un mismo tamaño de frame la geometría no
+cambia, así que se compila una sola vez por (hash del contenido, alto, ancho):
+polígonos como arrays de NumPy, rectángulos envolventes, máscaras recortadas,
+área en píxeles y vectores de arista. Las etapas color, fuse y annotate
+reutilizan el mismo ``ZoneIndex``.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+ZONE_CACHE_SIZE = int(os.getenv("ZONE_CACHE_SIZE", "32"))
+
+# Margen alrededor de cada zona para que Canny vea el mismo borde
+# (píxeles en cero) que en el frame completo
+ROI_MARGIN = 2
+
+
+class ParkingZones(list):
+    """Lista de zonas (formato de bounding_boxes.json) con su versión de contenido"""
+
+    def __init__(self, zones=(), version=None):
+        super().__init__(zones)
+        self.version = version or zones_version(self)
+
+
+def zones_version(parking_zones):
+    """Hash estable del contenido de las zonas"""
+    version = getattr(parking_zones, "version", None)
+    if version:
+        return version
+    payload = json.dumps([zone["points"] for zone in parking_zones], sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class CompiledZone:
+    """Geometría de una zona para un tamaño de frame concreto"""
+
+    __slots__ = ("index", "points", "points_f64", "points_f32", "contour", "bbox",
+                 "roi", "mask", "mask_bool", "area", "edges")
+
+    def __init__(self, index, points, shape):
+        height, width = shape[:2]
+        self.index = index
+        # Coordenadas originales (float64) y sus versiones para OpenCV
+        self.points_f64 = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self.points_f32 = self.points_f64.astype(np.float32)
+        self.points = self.points_f64.astype(np.int32)
+        self.contour = self.points.reshape((-1, 1, 2))
+        # Vector de cada arista p[i] -> p[i+1] (cerrando el polígono)
+        self.edges = np.roll(self.points_f64, -1, axis=0) - self.points_f64
+
+        # Rectángulo envolvente (x1, y1, x2, y2) sin recortar, en coordenadas de imagen
+        fx1, fy1 = self.points_f64.min(axis=0)
+        fx2, fy2 = self.points_f64.max(axis=0)
+        self.bbox = (float(fx1), float(fy1), float(fx2), float(fy2))
+        x1, y1 = self.points.min(axis=0)
+        x2, y2 = self.points.max(axis=0)
+
+        # ROI recortada a la imagen, con margen, y su máscara
+        rx1 = int(max(0, min(width, x1 - ROI_MARGIN)))
+        ry1 = int(max(0, min(height, y1 - ROI_MARGIN)))
+        rx2 = int(max(0, min(width, x2 + 1 + ROI_MARGIN)))
+        ry2 = int(max(0, min(height, y2 + 1 + ROI_MARGIN)))
+        self.roi = (rx1, ry1, rx2, ry2)
+        self.mask = np.zeros((ry2 - ry1, rx2 - rx1), dtype=np.uint8)
+        if self.mask.size:
+            cv2.fillPoly(self.mask, [self.points - np.array([rx1, ry1], dtype=np.int32)], 255)
+        self.mask_bool = self.mask > 0
+        self.area = int(cv2.countNonZero(self.mask)) if self.mask.size else 0
+
+    @classmethod
+    def precompiled(cls, index, points, roi, mask, area, mask_bool=None):
+        """Zona con ROI y máscara ya calculadas (artefacto de calibración)"""
+        zone = cls.__new__(cls)
+        zone.index = index
+        zone.points_f64 = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        zone.points_f32 = zone.points_f64.astype(np.float32)
+        zone.points = zone.points_f64.astype(np.int32)
+        zone.contour = zone.points.reshape((-1, 1, 2))
+        zone.edges = np.roll(zone.points_f64, -1, axis=0) - zone.points_f64
+        fx1, fy1 = zone.points_f64.min(axis=0)
+        fx2, fy2 = zone.points_f64.max(axis=0)
+        zone.bbox = (float(fx1), float(fy1), float(fx2), float(fy2))
+        zone.roi = tuple(int(v) for v in roi)
+        zone.mask = mask
+        zone.mask_bool = mask > 0 if mask_bool is None else mask_bool
+        zone.area = int(area)
+        return zone
+
+    @property
+    def roi_slice(self):
+        rx1, ry1, rx2, ry2 = self.roi
+        return slice(ry1, ry2), slice(rx1, rx2)
+
+    def roi_slice_in(self, origin):
+        """ROI relativa a un recorte que empieza en ``origin`` (x, y)"""
+        rx1, ry1, rx2, ry2 = self.roi
+        ox, oy = origin
+        return slice(ry1 - oy, ry2 - oy), slice(rx1 - ox, rx2 - ox)
+
+
+class ZoneIndex:
+    """Todas las zonas compiladas para un (versión, alto, ancho)"""
+
+    def __init__(self, parking_zones, shape, zones=None):
+        self.version = zones_version(parking_zones)
+        self.shape = tuple(shape[:2])
+        if zones is None:
+            zones = [CompiledZone(i, zone["points"], self.shape) for i, zone in enumerate(parking_zones)]
+        self.zones = zones
+        self._arrays = None
+
+        # Rectángulo que cubre todas las ROIs: fuera de él no hay nada que analizar
+        rois = [z.roi for z in self.zones if z.mask.size]
+        if rois:
+            self.union_roi = (min(r[0] for r in rois), min(r[1] for r in rois),
+                              max(r[2] for r in rois), max(r[3] for r in rois))
+        else:
+            self.union_roi = (0, 0, 0, 0)
+
+    def __len__(self):
+        return len(self.zones)
+
+    def subset(self, indices):
+        """Índice con solo las zonas ``indices`` (reutiliza su geometría compilada)"""
+        zones = [self.zones[i] for i in indices]
+        return ZoneIndex([{"points": z.points_f64.tolist()} for z in zones], self.shape, zones=zones)
+
+    def __iter__(self):
+        return iter(self.zones)
+
+    def __getitem__(self, i):
+        return self.zones[i]
+
+    @property
+    def contours(self):
+        return [zone.contour for zone in self.zones]
+
+    @property
+    def arrays(self):
+        """
+        Polígonos apilados para operaciones vectorizadas:
+        ``bboxes`` (Z, 4), ``p1``/``p2`` (Z, Vmax, 2) con los extremos de cada
+        arista y ``valid`` (Z, Vmax) que marca las aristas reales (no relleno).
+        """
+        if self._arrays is None:
+            count = len(self.zones)
+            vmax = max((len(z.points_f64) for z in self.zones), default=0)
+            p1 = np.zeros((count, vmax, 2), dtype=np.float64)
+            p2 = np.zeros((count, vmax, 2), dtype=np.float64)
+            valid = np.zeros((count, vmax), dtype=bool)
+            bboxes = np.zeros((count, 4), dtype=np.float64)
+            for i, zone in enumerate(self.zones):
+                n = len(zone.points_f64)
+                p1[i, :n] = zone.points_f64
+                p2[i, :n] = np.roll(zone.points_f64, -1, axis=0)
+                valid[i, :n] = True
+                bboxes[i] = zone.bbox
+            self._arrays = {"bboxes": bboxes, "p1": p1, "p2": p2, "valid": valid}
+        return self._arrays
+
+
+class ZoneIndexCache:
+    """Caché LRU de ZoneIndex por (versión de zonas, alto, ancho)"""
+
+    def __init__(self, max_entries=ZONE_CACHE_SIZE):
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, parking_zones, shape):
+        key = (zones_version(parking_zones), int(shape[0]), int(shape[1]))
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return index
+
+        index = ZoneIndex(parking_zones, shape)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = index
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+    def put(self, index):
+        """Registra un ZoneIndex ya compilado (p. ej. cargado de un artefacto)"""
+        key = (index.version, int(index.shape[0]), int(index.shape[1]))
+        with self._lock:
+            self._entries[key] = index
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+zone_index_cache = ZoneIndexCache()
+
+
+def get_zone_index(parking_zones, shape):
+    """ZoneIndex compilado (o cacheado) para estas zonas y este tamaño de frame"""
+    return zone_index_cache.get(parking_zones, shape)
+
+
+_scaled_zones = OrderedDict()
+_scaled_zones_lock = threading.Lock()
+
+
+def scale_zones(parking_zones, sx, sy):
+    """
+    Zonas llevadas al espacio de una imagen escalada por (sx, sy). La versión
+    incluye la escala, así que cada resolución tiene su propio ZoneIndex.
+    """
+    if sx == 1 and sy == 1:
+        return parking_zones
+    key = (zones_version(parking_zones), round(sx, 6), round(sy, 6))
+    with _scaled_zones_lock:
+        scaled = _scaled_zones.get(key)
+        if scaled is not None:
+            _scaled_zones.move_to_end(key)
+            return scaled
+
+    scaled = ParkingZones(
+        [{**zone, "points": [[x * sx, y * sy] for x, y in zone["points"]]} for zone in parking_zones],
+        version=f"{key[0]}@{key[1]:.6f}x{key[2]:.6f}",
+    )
+    with _scaled_zones_lock:
+        _scaled_zones[key] = scaled
+        while len(_scaled_zones) > ZONE_CACHE_SIZE:
+            _scaled_zones.popitem(last=False)
+    return scaled
@@ -0,0 +1,250 @@
+# backend/zone_registry.py
+"""
+Registro en memoria de las zonas de cada estacionamiento.
+
+Las zonas salen de ``cajones.coordenadas`` (un JSON por cajón). Se leen de la
+base una sola vez, se validan y se guardan ya parseadas por estacionamiento,
+con el id de cada cajón, así que una detección solo hace una búsqueda en un
+dict. ``cajon_router`` invalida el estacionamiento cuando escribe cajones.
+
+Si un estacionamiento no tiene cajones con coordenadas válidas se devuelve
+None y la detección usa las zonas globales de ``bounding_boxes.json``.
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+
+from zone_geometry import ParkingZones
+
+# Segundos antes de reintentar si la base de datos no está disponible
+ZONE_REGISTRY_RETRY = float(os.getenv("ZONE_REGISTRY_RETRY", "30"))
+
+
+def parse_coordenadas(raw):
+    """
+    Convierte ``Cajon.coordenadas`` en una lista de puntos ``[[x, y], ...]``.
+
+    Acepta un JSON (o el objeto ya decodificado) con una lista de pares
+    ``[x, y]``, una lista de ``{"x": .., "y": ..}`` o ``{"points": [...]}``.
+    Lanza ValueError si no es un polígono válido.
+    """
+    if raw is None or raw == "":
+        raise ValueError("sin coordenadas")
+    data = json.loads(raw) if isinstance(raw, (str, bytes)) else raw
+    if isinstance(data, dict):
+        data = data.get("points", data.get("puntos"))
+    if not isinstance(data, list):
+        raise ValueError("las coordenadas deben ser una lista de puntos")
+
+    points = []
+    for point in data:
+        if isinstance(point, dict):
+            point = (point.get("x"), point.get("y"))
+        if not isinstance(point, (list, tuple)) or len(point) != 2:
+            raise ValueError(f"punto inválido: {point!r}")
+        x, y = point
+        if isinstance(x, bool) or isinstance(y, bool) or not isinstance(x, (int, float)) or not isinstance(y, (int, float)):
+            raise ValueError(f"punto inválido: {point!r}")
+        if not (math.isfinite(x) and math.isfinite(y)) or x < 0 or y < 0:
+            raise ValueError(f"punto fuera de rango: {point!r}")
+        points.append([x, y])
+
+    if len(points) < 3:
+        raise ValueError("un polígono necesita al menos 3 puntos")
+    # Área de Gauss: descarta polígonos degenerados (puntos repetidos o alineados)
+    area = 0.0
+    for (x1, y1), (x2, y2) in zip(points, points[1:] + points[:1]):
+        area += x1 * y2 - x2 * y1
+    if abs(area) / 2 < 1:
+        raise ValueError("polígono sin área")
+    return points
+
+
+def build_lot_zones(cajones):
+    """ParkingZones de un estacionamiento a partir de sus cajones (ordenados por id)"""
+    zones = []
+    invalid = 0
+    for cajon in sorted(cajones, key=lambda c: c.id):
+        try:
+            points = parse_coordenadas(cajon.coordenadas)
+        except (ValueError, TypeError) as e:
+            invalid += 1
+            print(f"⚠️ Cajón {cajon.id} ({cajon.numero_cajon}) con coordenadas inválidas: {e}")
+            continue
+        zones.append({"points": points, "cajon_id": cajon.id, "numero_cajon": cajon.numero_cajon})
+    if not zones:
+        return None, invalid
+    payload = json.dumps([[z["cajon_id"], z["points"]] for z in zones])
+    return ParkingZones(zones, version=hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]), invalid
+
+
+class ZoneRegistry:
+    """Zonas parseadas por estacionamiento, cargadas desde la tabla cajones"""
+
+    # Qué se carga, para los mensajes (las subclases cargan otras tablas)
+    label = "zonas"
+    source = "cajones"
+    table = "cajones"
+
+    def __init__(self, session_factory=None):
+        self._session_factory = session_factory
+        self._lots = {}          # estacionamiento_id -> ParkingZones
+        self._stale = set()      # estacionamientos a recargar en el próximo acceso
+        self._complete = False   # True tras una carga completa exitosa
+        self._retry_at = 0.0
+        self._lock = threading.RLock()
+        self.loads = 0
+        self.invalid_cajones = 0
+        self.last_error = None
+
+    def _session(self):
+        if self._session_factory is None:
+            # Import diferido: database.py exige DATABASE_URL al importarse
+            from database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    def _query(self, db, estacionamiento_id=None):
+        from models.cajon import Cajon
+        query = db.query(Cajon).filter(Cajon.coordenadas.isnot(None))
+        if estacionamiento_id is not None:
+            query = query.filter(Cajon.estacionamiento_id == estacionamiento_id)
+        return query.all()
+
+    def _build(self, rows):
+        """Estructura en memoria de un estacionamiento: (valor o None, inválidos)"""
+        return build_lot_zones(rows)
+
+    def _with_db(self, db, fn):
+        if db is not None:
+            return fn(db)
+        session = self._session()
+        try:
+            return fn(session)
+        finally:
+            session.close()
+
+    def _table_missing(self):
+        """True si la tabla de origen no existe (esquema sin migrar): no hay nada que cargar"""
+        from sqlalchemy import inspect
+        try:
+            session = self._session()
+            try:
+                return not inspect(session.get_bind()).has_table(self.table)
+            finally:
+                session.close()
+        except Exception:
+            return False
+
+    def load_all(self, db=None):
+        """Carga las zonas de todos los estacionamientos con una sola consulta"""
+        try:
+            cajones = self._with_db(db, self._query)
+        except Exception as e:
+            if not self._table_missing():
+                self._failed(e)
+                return False
+            # Sin tabla no hay zonas: no se reintenta hasta que se invalide
+            print(f"⚠️ La tabla {self.table} no existe: sin {self.label} registradas")
+            cajones = []
+
+        by_lot = {}
+        for cajon in cajones:
+            if cajon.estacionamiento_id is not None:
+                by_lot.setdefault(cajon.estacionamiento_id, []).append(cajon)
+
+        lots = {}
+        invalid = 0
+        for estacionamiento_id, lot_cajones in by_lot.items():
+            zones, bad = self._build(lot_cajones)
+            invalid += bad
+            if zones is not None:
+                lots[estacionamiento_id] = zones
+
+        with self._lock:
+            self._lots = lots
+            self._stale.clear()
+            self._complete = True
+            self.loads += 1
+            self.invalid_cajones = invalid
+            self.last_error = None
+        print(f"✓ {self.label.capitalize()} cargadas para {len(lots)} estacionamientos desde {self.source}")
+        return True
+
+    def reload(self, estacionamiento_id, db=None):
+        """Vuelve a leer los cajones de un estacionamiento"""
+        try:
+            cajones = self._with_db(db, lambda session: self._query(session, estacionamiento_id))
+        except Exception as e:
+            if not self._table_missing():
+                self._failed(e)
+                return None
+            cajones = []
+
+        zones, _ = self._build(cajones)
+        with self._lock:
+            if zones is None:
+                self._lots.pop(estacionamiento_id, None)
+            else:
+                self._lots[estacionamiento_id] = zones
+            self._stale.discard(estacionamiento_id)
+            self.loads += 1
+        return zones
+
+    def _failed(self, error):
+        with self._lock:
+            self.last_error = str(error)
+            self._retry_at = time.monotonic() + ZONE_REGISTRY_RETRY
+        print(f"⚠️ No se pudieron cargar las {self.label} desde {self.source}: {error}")
+
+    def invalidate(self, estacionamiento_id=None, db=None):
+        """
+        Marca un estacionamiento (o todos) para recargarse. Con ``db`` la
+        recarga es inmediata, dentro de la misma sesión que escribió.
+        """
+        with self._lock:
+            if estacionamiento_id is None:
+                self._lots.clear()
+                self._complete = False
+                self._retry_at = 0.0
+                return
+            self._lots.pop(estacionamiento_id, None)
+            self._stale.add(estacionamiento_id)
+        if db is not None:
+            self.reload(estacionamiento_id, db)
+
+    def get(self, estacionamiento_id):
+        """ParkingZones del estacionamiento o None si no tiene cajones válidos"""
+        with self._lock:
+            zones = self._lots.get(estacionamiento_id)
+            if zones is not None:
+                return zones
+            if self._complete and estacionamiento_id not in self._stale:
+                return None
+            if time.monotonic() < self._retry_at:
+                return None
+            complete = self._complete
+        if not complete:
+            self.load_all()
+            with self._lock:
+                if estacionamiento_id not in self._stale:
+                    return self._lots.get(estacionamiento_id)
+        return self.reload(estacionamiento_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "lots": len(self._lots),
+                "zones": sum(len(z) for z in self._lots.values()),
+                "complete": self._complete,
+                "stale": len(self._stale),
+                "loads": self.loads,
+                "invalid_cajones": self.invalid_cajones,
+                "last_error": self.last_error,
+            }
+
+
+zone_registry = ZoneRegistry()
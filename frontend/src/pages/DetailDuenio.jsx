@@ -81,8 +81,12 @@ const ParkingOwnerDetail = ({ onBack }) => {
         
         console.log('📊 Respuesta de detección:', data);
         
-        if (data.image_annotated) {
-          // La imagen ya viene como data URI completo
+        if (data.image_url) {
+          // La imagen se descarga aparte (cacheable por ETag)
+          setImageWithDetections(`http://localhost:8000${data.image_url}`);
+          console.log('✅ Imagen anotada cargada correctamente');
+        } else if (data.image_annotated) {
+          // Modo compatibilidad: data URI completo
           setImageWithDetections(data.image_annotated);
           console.log('✅ Imagen anotada cargada correctamente');
         } else {
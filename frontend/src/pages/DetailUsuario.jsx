@@ -206,7 +206,9 @@ export default function DetalleEstacionamiento() {
         console.log('✅ Respuesta YOLO:', data);
         
         // Guardar imagen anotada
-        if (data.image_annotated) {
+        if (data.image_url) {
+          setImagenConDetecciones(`http://localhost:8000${data.image_url}`);
+        } else if (data.image_annotated) {
           setImagenConDetecciones(data.image_annotated);
         }
         
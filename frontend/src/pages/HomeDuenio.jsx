@@ -127,12 +127,41 @@ const HomeDuenio = () => {
     try {
       const nuevosEspaciosYolo = {};
       
-      // Detect spaces for each parking lot
+      // Read the latest occupancy kept fresh by the server-side scanner
+      const snapshotResponse = await fetch('http://localhost:8000/detect/estacionamientos/ocupacion');
+      if (snapshotResponse.ok) {
+        const snapshotData = await snapshotResponse.json();
+        for (const snapshot of snapshotData.estacionamientos) {
+          nuevosEspaciosYolo[snapshot.estacionamiento_id] = snapshot.available;
+        }
+      }
+
+      // Only lots the scanner has not seen yet go through a detection
+      const pendientes = estacionamientosData
+        .map((e) => e.id)
+        .filter((id) => nuevosEspaciosYolo[id] === undefined);
+
+      if (pendientes.length > 0) {
+        console.log(`🤖 Detectando espacios para ${pendientes.length} estacionamientos`);
+        const response = await fetch('http://localhost:8000/detect/estacionamientos/batch', {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({
+            estacionamiento_ids: pendientes,
+            annotate: 'false',
+          }),
+        });
+        if (!response.ok) {
+          throw new Error(`Error del servidor: ${response.status}`);
+        }
+        const data = await response.json();
+        for (const resultado of data.results) {
+          nuevosEspaciosYolo[resultado.estacionamiento_id] = resultado.success ? resultado.available : 0;
+        }
+      }
+
       for (const estacionamiento of estacionamientosData) {
-        console.log(`🤖 Detectando espacios para: ${estacionamiento.nombre}`);
-        const espacios = await detectarEspaciosIndividual(estacionamiento.id);
-        nuevosEspaciosYolo[estacionamiento.id] = espacios;
-        console.log(`✅ ${estacionamiento.nombre}: ${espacios} espacios detectados`);
+        console.log(`✅ ${estacionamiento.nombre}: ${nuevosEspaciosYolo[estacionamiento.id]} espacios detectados`);
       }
       
       console.log('🎯 Actualizando estado con YOLO:', nuevosEspaciosYolo);
@@ -148,7 +177,7 @@ const HomeDuenio = () => {
 
   const detectarEspaciosIndividual = async (estacionamientoId) => {
   try {
-    const response = await fetch('http://localhost:8000/detect/estacionamiento/', {
+    const response = await fetch('http://localhost:8000/detect/estacionamiento/?annotate=false', {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify(estacionamientoId), // Solo envía el ID